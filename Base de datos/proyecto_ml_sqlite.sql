@@ -22,6 +22,17 @@ CREATE TABLE IF NOT EXISTS usuarios (
 -- Índice para búsquedas por correo
 CREATE INDEX IF NOT EXISTS idx_correo ON usuarios(correo);
 
+-- --------------------------------------------------------
+--
+-- Estructura de tabla para la tabla `catalogo_mensajes`
+-- (recomendaciones y factores de riesgo distintos, guardados una sola vez)
+--
+
+CREATE TABLE IF NOT EXISTS catalogo_mensajes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    contenido TEXT NOT NULL UNIQUE
+);
+
 -- --------------------------------------------------------
 --
 -- Estructura de tabla para la tabla `resultados`
@@ -32,12 +43,62 @@ CREATE TABLE IF NOT EXISTS resultados (
     usuario_id INTEGER NOT NULL,
     nivel_prediccion VARCHAR(20) NOT NULL,
     puntaje_prediccion DECIMAL(5,2) NOT NULL,
-    datos_formulario TEXT NOT NULL,
-    recomendaciones TEXT NOT NULL,
-    factores_riesgo TEXT NOT NULL,
+    -- Respuestas del formulario
+    daily_usage REAL,
+    sleephours REAL,
+    academic_perf REAL,
+    exercise REAL,
+    screen_before_bed REAL,
+    checks_per_day INTEGER,
+    apps_daily TEXT,              -- JSON: lista de apps o valor suelto
+    time_social_media REAL,
+    time_gaming REAL,
+    time_education REAL,
+    purpose TEXT,
+    weekend_usage REAL,
+    datos_extra TEXT,             -- JSON con claves fuera del formulario (opcional)
+    -- IDs de catalogo_mensajes separados por comas, en orden
+    recomendaciones_ids TEXT NOT NULL,
+    factores_ids TEXT NOT NULL,
+    version_modelo VARCHAR(40),   -- versión del modelo que produjo el resultado
     fecha_creacion TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (usuario_id) REFERENCES usuarios(id) ON DELETE CASCADE
 );
 
 -- Índice compuesto para búsquedas por usuario y fecha
 CREATE INDEX IF NOT EXISTS idx_usuario_fecha ON resultados(usuario_id, fecha_creacion);
+
+-- --------------------------------------------------------
+--
+-- Estructura de tabla para la tabla `estadisticas_usuario`
+-- (resumen por usuario, se actualiza al guardar cada resultado;
+--  reconstruir con database/migrations/004_estadisticas_usuario.py)
+--
+
+CREATE TABLE IF NOT EXISTS estadisticas_usuario (
+    usuario_id INTEGER PRIMARY KEY,
+    total_evaluaciones INTEGER NOT NULL DEFAULT 0,
+    suma_puntaje REAL NOT NULL DEFAULT 0,
+    puntaje_minimo REAL,
+    puntaje_maximo REAL,
+    ultimo_puntaje REAL,
+    ultima_evaluacion TIMESTAMP,
+    FOREIGN KEY (usuario_id) REFERENCES usuarios(id) ON DELETE CASCADE
+);
+
+-- --------------------------------------------------------
+--
+-- Estructura de tabla para la tabla `trabajos`
+-- (predicciones encoladas con PREDICCION_ASINCRONA=1; se borran al
+--  consultarlas o al pasar PREDICCION_COLA_TTL segundos)
+--
+
+CREATE TABLE IF NOT EXISTS trabajos (
+    id VARCHAR(32) PRIMARY KEY,
+    usuario_id INTEGER NOT NULL,
+    estado VARCHAR(10) NOT NULL,
+    resultado_id INTEGER,
+    fecha_creacion TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    fecha_fin TIMESTAMP,
+    FOREIGN KEY (usuario_id) REFERENCES usuarios(id) ON DELETE CASCADE
+);
@@ -10,20 +10,24 @@ import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
-from pathlib import Path
+
+sys.path.insert(0, 'ml')
+from cargador_datos import memoria_mb
+from almacen_features import cargar_dataset_o_almacen
 
 # Configuracion de visualizacion
 sns.set_style("whitegrid")
 plt.rcParams['figure.figsize'] = (12, 8)
 
 def cargar_datos():
-    """Carga el dataset de adiccion al celular"""
-    ruta_dataset = Path("app/static/dataset/teen_phone_addiction_dataset.csv")
-    df = pd.read_csv(ruta_dataset)
+    """Carga el dataset de adiccion al celular (sin ID, Name ni Location)"""
+    df, desde_almacen = cargar_dataset_o_almacen()
     print("=" * 80)
     print("DATASET CARGADO EXITOSAMENTE")
     print("=" * 80)
-    print(f"\nDimensiones: {df.shape[0]} filas x {df.shape[1]} columnas\n")
+    print(f"\nDimensiones: {df.shape[0]} filas x {df.shape[1]} columnas")
+    print(f"Memoria: {memoria_mb(df):.2f} MB")
+    print(f"Origen: {'almacen de features' if desde_almacen else 'CSV'}\n")
     return df
 
 def analisis_basico(df):
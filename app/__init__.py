@@ -1,7 +1,12 @@
 from flask import Flask
 import os
+import sys
+from pathlib import Path
 from dotenv import load_dotenv
 
+# Los módulos de ml (predictor, histogramas) se importan por su nombre
+sys.path.insert(0, str(Path(__file__).parent.parent / 'ml'))
+
 # Cargar variables de entorno
 load_dotenv()
 
@@ -11,4 +16,31 @@ app = Flask(__name__)
 # Configuración
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-secret-key-change-in-production')
 
-from app import routes
\ No newline at end of file
+# Cada petición devuelve su conexión al pool de la base de datos al terminar
+from app.database import db
+db.init_app(app)
+
+# Tiempos por petición (base de datos, modelo, plantillas, sesión) para /metrics;
+# se conecta antes que las rutas para que su before_request sea el primero
+from app.metricas import metricas_peticiones
+if metricas_peticiones is not None:
+    metricas_peticiones.init_app(app)
+
+from app import routes
+
+
+@app.cli.command('init-db')
+def init_db():
+    """Crea las tablas de la base de datos si no existen"""
+    db.inicializar_esquema()
+
+
+def precargar():
+    """
+    Carga el modelo en el proceso actual
+
+    Con preload_app de gunicorn se llama en el proceso maestro, antes de crear
+    los workers, para que compartan el modelo en memoria (copy-on-write).
+    """
+    from predict import predictor
+    return predictor.asegurar_cargado()
@@ -0,0 +1,277 @@
+"""
+Cola local de predicciones atendida por un pool de procesos de trabajo
+
+Con PREDICCION_ASINCRONA=1, /procesar_formulario encola la evaluación y
+redirige de inmediato; un proceso de trabajo ejecuta el predictor y guarda el
+resultado. /resultados espera unos segundos por el trabajo y, si no terminó,
+muestra una página que vuelve a consultar.
+
+Cada proceso de gunicorn tiene su propia cola y su propio pool, pero el
+estado de los trabajos de usuarios registrados se guarda también en la tabla
+trabajos: el proceso de trabajo anota ahí el resultado_id al terminar, así
+/resultados lo encuentra aunque la consulta llegue a otro proceso web. Los
+trabajos de usuarios de prueba no guardan resultado y solo los resuelve el
+proceso que los recibió.
+"""
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FuturoTimeoutError
+
+from app.models import Resultado, Trabajo
+
+PENDIENTE = 'pendiente'
+LISTO = 'listo'
+ERROR = 'error'
+
+# Segundos entre lecturas de la tabla trabajos al esperar un trabajo de otro proceso
+INTERVALO_CONSULTA = 0.1
+
+
+class ColaLlenaError(RuntimeError):
+    """La cola alcanzó su límite de trabajos pendientes"""
+
+
+def _iniciar_proceso():
+    """Carga el predictor al arrancar cada proceso de trabajo"""
+    from app import precargar
+    precargar()
+
+
+def _procesar_trabajo(trabajo_id, usuario_id, datos_formulario, datos_cuenta):
+    """
+    Se ejecuta en un proceso de trabajo: predice, guarda el resultado y anota
+    el trabajo como terminado en la tabla trabajos
+
+    Returns:
+        tuple: (resultado, resultado_id, segundos de proceso); resultado_id es
+            None para los usuarios de prueba o si no se pudo guardar
+    """
+    from predict import predictor
+
+    inicio = time.perf_counter()
+    resultado = predictor.predecir(datos_formulario, datos_cuenta)
+
+    resultado_id = None
+    if usuario_id and usuario_id != 0:
+        resultado_id = Resultado.guardar_resultado(
+            usuario_id=usuario_id,
+            nivel_prediccion=resultado['nivel'],
+            puntaje_prediccion=resultado['prediccion'],
+            datos_formulario=datos_formulario,
+            recomendaciones=resultado['recomendaciones'],
+            factores_riesgo=resultado['factores_riesgo'],
+            version_modelo=resultado.get('version_modelo')
+        )
+        Trabajo.terminar(trabajo_id, LISTO if resultado_id else ERROR, resultado_id)
+
+    return resultado, resultado_id, time.perf_counter() - inicio
+
+
+class ColaPredicciones:
+    """Cola acotada de trabajos de predicción sobre un ProcessPoolExecutor"""
+
+    def __init__(self, workers=2, maximo_pendientes=100, ttl=600):
+        """
+        Args:
+            workers (int): Procesos de trabajo
+            maximo_pendientes (int): Trabajos sin terminar admitidos a la vez;
+                por encima de este número enviar() lanza ColaLlenaError
+            ttl (float): Segundos que se conserva un trabajo terminado que
+                nadie ha consultado
+        """
+        self.workers = workers
+        self.maximo_pendientes = maximo_pendientes
+        self.ttl = ttl
+
+        self._executor = None
+        self._trabajos = {}
+        self._lock = threading.Lock()
+        self._ultima_purga = time.monotonic()
+
+        self.enviados = 0
+        self.completados = 0
+        self.fallidos = 0
+        self.rechazados = 0
+        self.max_pendientes = 0
+        self.tiempo_total = 0.0
+        self.tiempo_proceso_total = 0.0
+
+    @classmethod
+    def desde_entorno(cls):
+        """Crea la cola según las variables de entorno, o None si está desactivada"""
+        if os.getenv('PREDICCION_ASINCRONA', '0').lower() not in ('1', 'true'):
+            return None
+        return cls(
+            workers=int(os.getenv('PREDICCION_WORKERS', 2)),
+            maximo_pendientes=int(os.getenv('PREDICCION_COLA_MAXIMA', 100)),
+            ttl=float(os.getenv('PREDICCION_COLA_TTL', 600))
+        )
+
+    @property
+    def pendientes(self):
+        return self.enviados - self.completados - self.fallidos
+
+    def _obtener_executor(self):
+        # Se crea con el primer trabajo, ya dentro del proceso web definitivo
+        # (después del fork de gunicorn). 'spawn' evita heredar las conexiones
+        # SQLite y los hilos del proceso padre.
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_iniciar_proceso
+            )
+        return self._executor
+
+    def enviar(self, usuario_id, datos_formulario, datos_cuenta=None):
+        """
+        Encola una predicción
+
+        Returns:
+            str: ID del trabajo
+
+        Raises:
+            ColaLlenaError: Si ya hay maximo_pendientes trabajos sin terminar
+        """
+        with self._lock:
+            self._purgar_vencidos()
+            if self.pendientes >= self.maximo_pendientes:
+                self.rechazados += 1
+                raise ColaLlenaError(
+                    f"Hay {self.pendientes} predicciones pendientes (máximo {self.maximo_pendientes})"
+                )
+
+            trabajo_id = uuid.uuid4().hex
+            if usuario_id and usuario_id != 0:
+                Trabajo.crear(trabajo_id, usuario_id, PENDIENTE)
+            futuro = self._obtener_executor().submit(
+                _procesar_trabajo, trabajo_id, usuario_id, datos_formulario, datos_cuenta
+            )
+            self._trabajos[trabajo_id] = {
+                'futuro': futuro,
+                'usuario_id': usuario_id,
+                'enviado': time.monotonic(),
+                'terminado': None,
+            }
+            self.enviados += 1
+            self.max_pendientes = max(self.max_pendientes, self.pendientes)
+
+        futuro.add_done_callback(lambda f: self._al_terminar(trabajo_id, f))
+        return trabajo_id
+
+    def _al_terminar(self, trabajo_id, futuro):
+        with self._lock:
+            trabajo = self._trabajos.get(trabajo_id)
+            ahora = time.monotonic()
+            if futuro.exception() is None:
+                self.completados += 1
+                self.tiempo_proceso_total += futuro.result()[2]
+            else:
+                self.fallidos += 1
+            if trabajo is not None:
+                trabajo['terminado'] = ahora
+                self.tiempo_total += ahora - trabajo['enviado']
+        if futuro.exception() is not None and trabajo is not None and trabajo['usuario_id']:
+            # El proceso de trabajo falló antes de anotar el final
+            Trabajo.terminar(trabajo_id, ERROR)
+
+    def _purgar_vencidos(self):
+        """Descarta trabajos terminados que nadie consultó (con el lock tomado)"""
+        ahora = time.monotonic()
+        limite = ahora - self.ttl
+        vencidos = [clave for clave, trabajo in self._trabajos.items()
+                    if trabajo['terminado'] is not None and trabajo['terminado'] < limite]
+        for clave in vencidos:
+            del self._trabajos[clave]
+
+        # La tabla la comparten todos los procesos: basta con limpiarla de vez en cuando
+        if ahora - self._ultima_purga >= min(self.ttl, 60):
+            self._ultima_purga = ahora
+            Trabajo.purgar(self.ttl)
+
+    def obtener(self, trabajo_id, usuario_id, espera=0):
+        """
+        Consulta un trabajo, esperando hasta `espera` segundos si no ha terminado
+
+        Un trabajo terminado se entrega una sola vez y sale de la cola. Si lo
+        encoló otro proceso web se consulta su fila en la tabla trabajos.
+
+        Returns:
+            tuple: (estado, salida) con estado PENDIENTE, LISTO o ERROR y salida
+                (resultado, resultado_id) cuando está LISTO (resultado es None
+                si el trabajo lo atendió otro proceso); (None, None) si el
+                trabajo no existe o es de otro usuario
+        """
+        with self._lock:
+            trabajo = self._trabajos.get(trabajo_id)
+        if trabajo is None:
+            return self._obtener_de_base(trabajo_id, usuario_id, espera)
+        if trabajo['usuario_id'] != usuario_id:
+            return None, None
+
+        try:
+            resultado, resultado_id, _ = trabajo['futuro'].result(timeout=espera)
+        except FuturoTimeoutError:
+            return PENDIENTE, None
+        except Exception as e:
+            print(f"Error en trabajo de predicción {trabajo_id}: {e}")
+            estado, salida = ERROR, None
+        else:
+            estado, salida = LISTO, (resultado, resultado_id)
+
+        with self._lock:
+            self._trabajos.pop(trabajo_id, None)
+        if usuario_id and usuario_id != 0:
+            Trabajo.eliminar(trabajo_id)
+        return estado, salida
+
+    def _obtener_de_base(self, trabajo_id, usuario_id, espera):
+        """Consulta un trabajo de otro proceso web, cada INTERVALO_CONSULTA segundos"""
+        limite = time.monotonic() + espera
+        while True:
+            trabajo = Trabajo.obtener(trabajo_id, usuario_id)
+            if trabajo is None:
+                return None, None
+            if trabajo['estado'] != PENDIENTE:
+                break
+            restante = limite - time.monotonic()
+            if restante <= 0:
+                return PENDIENTE, None
+            time.sleep(min(INTERVALO_CONSULTA, restante))
+
+        Trabajo.eliminar(trabajo_id)
+        if trabajo['estado'] == LISTO:
+            return LISTO, (None, trabajo['resultado_id'])
+        print(f"Error en trabajo de predicción {trabajo_id}")
+        return ERROR, None
+
+    def metricas(self):
+        """Profundidad de la cola y contadores de trabajos"""
+        with self._lock:
+            terminados = self.completados + self.fallidos
+            return {
+                'workers': self.workers,
+                'maximo_pendientes': self.maximo_pendientes,
+                'pendientes': self.pendientes,
+                'max_pendientes': self.max_pendientes,
+                'sin_consultar': len(self._trabajos),
+                'enviados': self.enviados,
+                'completados': self.completados,
+                'fallidos': self.fallidos,
+                'rechazados': self.rechazados,
+                'tiempo_promedio': self.tiempo_total / terminados if terminados else 0.0,
+                'tiempo_proceso_promedio': (self.tiempo_proceso_total / self.completados
+                                            if self.completados else 0.0),
+            }
+
+    def cerrar(self):
+        """Detiene los procesos de trabajo esperando a los trabajos en curso"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+cola_predicciones = ColaPredicciones.desde_entorno()
@@ -1,6 +1,237 @@
 import sqlite3
 import os
+import queue
+import threading
+import time
 from contextlib import contextmanager
+from flask import g, has_app_context
+
+from app.trazas import tramo
+
+# Perfiles de PRAGMAs de SQLite, se eligen con la variable DATABASE_PROFILE.
+# Se aplican en cada conexión nueva, además de foreign_keys = ON.
+PERFILES_SQLITE = {
+    # Configuración por defecto de SQLite (rollback journal, fsync completo)
+    'basico': {},
+    # WAL: los lectores no bloquean al escritor; fsync solo en los checkpoints
+    'rendimiento': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size': -20000,        # en KiB (~20 MB por conexión)
+        'mmap_size': 268435456,      # 256 MB
+        'temp_store': 'MEMORY',
+        'busy_timeout': 5000,        # ms esperando el bloqueo de escritura
+    },
+    # WAL conservando fsync en cada commit
+    'seguro': {
+        'journal_mode': 'WAL',
+        'synchronous': 'FULL',
+        'temp_store': 'MEMORY',
+        'busy_timeout': 5000,
+    },
+}
+
+# Catálogo de recomendaciones y factores de riesgo distintos, guardados una
+# sola vez como JSON
+SQL_CREAR_CATALOGO_MENSAJES = """
+    CREATE TABLE IF NOT EXISTS catalogo_mensajes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        contenido TEXT NOT NULL UNIQUE
+    )
+"""
+
+# Resultados: respuestas del formulario en columnas tipadas y
+# recomendaciones/factores como listas de IDs de catalogo_mensajes
+SQL_CREAR_RESULTADOS = """
+    CREATE TABLE IF NOT EXISTS resultados (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        usuario_id INTEGER NOT NULL,
+        nivel_prediccion VARCHAR(20) NOT NULL,
+        puntaje_prediccion DECIMAL(5,2) NOT NULL,
+        daily_usage REAL,
+        sleephours REAL,
+        academic_perf REAL,
+        exercise REAL,
+        screen_before_bed REAL,
+        checks_per_day INTEGER,
+        apps_daily TEXT,
+        time_social_media REAL,
+        time_gaming REAL,
+        time_education REAL,
+        purpose TEXT,
+        weekend_usage REAL,
+        datos_extra TEXT,
+        recomendaciones_ids TEXT NOT NULL,
+        factores_ids TEXT NOT NULL,
+        version_modelo VARCHAR(40),
+        fecha_creacion TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (usuario_id) REFERENCES usuarios(id) ON DELETE CASCADE
+    )
+"""
+
+SQL_CREAR_INDICE_RESULTADOS = """
+    CREATE INDEX IF NOT EXISTS idx_usuario_fecha
+    ON resultados(usuario_id, fecha_creacion)
+"""
+
+# Resumen de los resultados de cada usuario, mantenido en la misma
+# transacción que los inserta (ver Resultado.guardar_resultado)
+SQL_CREAR_ESTADISTICAS_USUARIO = """
+    CREATE TABLE IF NOT EXISTS estadisticas_usuario (
+        usuario_id INTEGER PRIMARY KEY,
+        total_evaluaciones INTEGER NOT NULL DEFAULT 0,
+        suma_puntaje REAL NOT NULL DEFAULT 0,
+        puntaje_minimo REAL,
+        puntaje_maximo REAL,
+        ultimo_puntaje REAL,
+        ultima_evaluacion TIMESTAMP,
+        FOREIGN KEY (usuario_id) REFERENCES usuarios(id) ON DELETE CASCADE
+    )
+"""
+
+# Trabajos de la cola de predicciones (app/cola_predicciones.py): cualquier
+# proceso web puede consultar el estado de un trabajo encolado por otro
+SQL_CREAR_TRABAJOS = """
+    CREATE TABLE IF NOT EXISTS trabajos (
+        id VARCHAR(32) PRIMARY KEY,
+        usuario_id INTEGER NOT NULL,
+        estado VARCHAR(10) NOT NULL,
+        resultado_id INTEGER,
+        fecha_creacion TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        fecha_fin TIMESTAMP,
+        FOREIGN KEY (usuario_id) REFERENCES usuarios(id) ON DELETE CASCADE
+    )
+"""
+
+# PRAGMAs que se muestran en el reporte de configuración
+PRAGMAS_REPORTE = ['journal_mode', 'synchronous', 'cache_size', 'mmap_size',
+                   'temp_store', 'busy_timeout', 'foreign_keys']
+
+
+class CursorMedido(sqlite3.Cursor):
+    """Cursor que anota cada execute en el tramo 'db' de la traza de la petición"""
+
+    def execute(self, sql, parametros=()):
+        with tramo('db'):
+            return super().execute(sql, parametros)
+
+    def executemany(self, sql, parametros):
+        with tramo('db'):
+            return super().executemany(sql, parametros)
+
+
+class PoolAgotadoError(sqlite3.OperationalError):
+    """No se obtuvo una conexión libre dentro del tiempo de espera del pool"""
+
+
+class PoolConexiones:
+    """Pool acotado de conexiones SQLite reutilizables entre hilos"""
+
+    def __init__(self, fabrica, tamano=5, timeout=10.0):
+        """
+        Args:
+            fabrica (callable): Crea una conexión nueva ya configurada
+            tamano (int): Número máximo de conexiones prestadas a la vez
+            timeout (float): Segundos a esperar por una conexión libre
+        """
+        self._fabrica = fabrica
+        self.tamano = tamano
+        self.timeout = timeout
+
+        # LIFO: se reutiliza primero la conexión usada más recientemente
+        self._libres = queue.LifoQueue()
+        self._cupos = threading.BoundedSemaphore(tamano)
+        self._lock = threading.Lock()
+
+        self.creadas = 0
+        self.en_uso = 0
+        self.max_en_uso = 0
+        self.prestamos = 0
+        self.esperas = 0
+        self.tiempo_espera_total = 0.0
+        self.agotados = 0
+
+    def obtener(self):
+        """Presta una conexión, esperando hasta `timeout` si el pool está lleno"""
+        espera = 0.0
+        if not self._cupos.acquire(blocking=False):
+            inicio = time.perf_counter()
+            obtenido = self._cupos.acquire(timeout=self.timeout)
+            espera = time.perf_counter() - inicio
+
+            with self._lock:
+                self.esperas += 1
+                self.tiempo_espera_total += espera
+                if not obtenido:
+                    self.agotados += 1
+
+            if not obtenido:
+                raise PoolAgotadoError(
+                    f"No hay conexiones libres tras esperar {self.timeout}s "
+                    f"(tamaño del pool: {self.tamano})"
+                )
+
+        try:
+            conexion = self._libres.get_nowait()
+        except queue.Empty:
+            try:
+                conexion = self._fabrica()
+            except Exception:
+                self._cupos.release()
+                raise
+            with self._lock:
+                self.creadas += 1
+
+        with self._lock:
+            self.prestamos += 1
+            self.en_uso += 1
+            self.max_en_uso = max(self.max_en_uso, self.en_uso)
+
+        return conexion
+
+    def devolver(self, conexion):
+        """Devuelve una conexión al pool deshaciendo cualquier transacción abierta"""
+        try:
+            if conexion.in_transaction:
+                conexion.rollback()
+            self._libres.put(conexion)
+        except sqlite3.Error:
+            # Conexión inutilizable: se descarta y se creará otra cuando haga falta
+            conexion.close()
+            with self._lock:
+                self.creadas -= 1
+        finally:
+            with self._lock:
+                self.en_uso -= 1
+            self._cupos.release()
+
+    def cerrar(self):
+        """Cierra las conexiones libres del pool"""
+        while True:
+            try:
+                conexion = self._libres.get_nowait()
+            except queue.Empty:
+                break
+            conexion.close()
+            with self._lock:
+                self.creadas -= 1
+
+    def metricas(self):
+        """Estado y contadores del pool"""
+        with self._lock:
+            return {
+                'tamano': self.tamano,
+                'creadas': self.creadas,
+                'en_uso': self.en_uso,
+                'max_en_uso': self.max_en_uso,
+                'libres': self._libres.qsize(),
+                'prestamos': self.prestamos,
+                'esperas': self.esperas,
+                'tiempo_espera_total': self.tiempo_espera_total,
+                'tiempo_espera_promedio': self.tiempo_espera_total / self.esperas if self.esperas else 0.0,
+                'agotados': self.agotados,
+            }
+
 
 class Database:
     """Clase para gestionar la conexión a la base de datos SQLite"""
@@ -9,21 +240,40 @@ class Database:
         # Obtener ruta de la base de datos desde variable de entorno o usar valor por defecto
         self.db_path = os.getenv('DATABASE_URL', 'instance/proyecto_ml.db')
 
+        # Perfil de PRAGMAs de rendimiento
+        self.perfil = os.getenv('DATABASE_PROFILE', 'basico')
+        if self.perfil not in PERFILES_SQLITE:
+            raise ValueError(
+                f"DATABASE_PROFILE desconocido: {self.perfil} "
+                f"(opciones: {', '.join(PERFILES_SQLITE)})"
+            )
+        self.pragmas = PERFILES_SQLITE[self.perfil]
+
         # Crear directorio si no existe
         db_dir = os.path.dirname(self.db_path)
         if db_dir and not os.path.exists(db_dir):
             os.makedirs(db_dir)
 
-        self.connection = None
-        self._init_db()
+        # Pool de conexiones: cada petición de Flask toma una y la devuelve al terminar
+        self.pool = PoolConexiones(
+            self.connect,
+            tamano=int(os.getenv('DB_POOL_SIZE', '5')),
+            timeout=float(os.getenv('DB_POOL_TIMEOUT', '10'))
+        )
+        # Las tablas se crean aparte con inicializar_esquema() (flask init-db,
+        # main.py o el hook de gunicorn), no al importar el módulo
+
+    def init_app(self, app):
+        """Registra la devolución de la conexión de cada petición al pool"""
+        app.teardown_appcontext(self.liberar_conexion)
 
-    def _init_db(self):
+    def inicializar_esquema(self):
         """Inicializa la base de datos creando las tablas si no existen"""
         conn = None
         try:
             # Crear una conexión temporal solo para la inicialización
             conn = sqlite3.connect(self.db_path)
-            conn.execute("PRAGMA foreign_keys = ON")
+            self._aplicar_pragmas(conn)
             cursor = conn.cursor()
 
             # Crear tabla usuarios
@@ -47,30 +297,38 @@ class Database:
                 CREATE INDEX IF NOT EXISTS idx_correo ON usuarios(correo)
             """)
 
-            # Crear tabla resultados
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS resultados (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    usuario_id INTEGER NOT NULL,
-                    nivel_prediccion VARCHAR(20) NOT NULL,
-                    puntaje_prediccion DECIMAL(5,2) NOT NULL,
-                    datos_formulario TEXT NOT NULL,
-                    recomendaciones TEXT NOT NULL,
-                    factores_riesgo TEXT NOT NULL,
-                    fecha_creacion TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (usuario_id) REFERENCES usuarios(id) ON DELETE CASCADE
-                )
-            """)
+            # Crear tablas de resultados
+            cursor.execute(SQL_CREAR_CATALOGO_MENSAJES)
+            cursor.execute(SQL_CREAR_RESULTADOS)
+
+            # Las bases creadas antes de la migración 003 guardan JSON en texto
+            columnas = [fila[1] for fila in cursor.execute("PRAGMA table_info(resultados)")]
+            if 'datos_formulario' in columnas:
+                print("Aviso: la tabla resultados usa el formato JSON anterior. "
+                      "Ejecuta: python database/migrations/003_resultados_compactos.py")
+            elif 'version_modelo' not in columnas:
+                # Versión del modelo que produjo cada resultado (columna opcional)
+                cursor.execute("ALTER TABLE resultados ADD COLUMN version_modelo VARCHAR(40)")
 
             # Crear índice compuesto
-            cursor.execute("""
-                CREATE INDEX IF NOT EXISTS idx_usuario_fecha
-                ON resultados(usuario_id, fecha_creacion)
-            """)
+            cursor.execute(SQL_CREAR_INDICE_RESULTADOS)
+
+            # Tabla de estadísticas; si se crea sobre resultados existentes hay
+            # que reconstruirla una vez
+            existia = cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'estadisticas_usuario'"
+            ).fetchone()
+            cursor.execute(SQL_CREAR_ESTADISTICAS_USUARIO)
+            if not existia and cursor.execute("SELECT 1 FROM resultados LIMIT 1").fetchone():
+                print("Aviso: la tabla estadisticas_usuario está vacía. "
+                      "Ejecuta: python database/migrations/004_estadisticas_usuario.py")
+
+            cursor.execute(SQL_CREAR_TRABAJOS)
 
             conn.commit()
             cursor.close()
             print("Base de datos SQLite inicializada correctamente")
+            print(self.reporte_configuracion(conn))
         except sqlite3.Error as e:
             print(f"Error al inicializar la base de datos: {e}")
         finally:
@@ -80,59 +338,148 @@ class Database:
             # La conexión de instancia se creará cuando sea necesaria
 
     def connect(self):
-        """Establece la conexión con la base de datos"""
-        try:
-            # Habilitar foreign keys y row factory para diccionarios
-            self.connection = sqlite3.connect(self.db_path, check_same_thread=False)
-            self.connection.execute("PRAGMA foreign_keys = ON")
-            self.connection.row_factory = sqlite3.Row
-            return self.connection
-        except sqlite3.Error as e:
-            print(f"Error al conectar a SQLite: {e}")
-            return None
+        """Crea una conexión nueva con la base de datos (la usa el pool)"""
+        # La conexión puede pasar de un hilo a otro a través del pool, pero
+        # nunca la usan dos hilos a la vez
+        connection = sqlite3.connect(self.db_path, check_same_thread=False)
+        # Habilitar foreign keys, PRAGMAs del perfil y row factory para diccionarios
+        self._aplicar_pragmas(connection)
+        connection.row_factory = sqlite3.Row
+        return connection
+
+    def _aplicar_pragmas(self, connection):
+        """Aplica foreign_keys y los PRAGMAs del perfil activo a una conexión"""
+        connection.execute("PRAGMA foreign_keys = ON")
+        for nombre, valor in self.pragmas.items():
+            connection.execute(f"PRAGMA {nombre} = {valor}")
+
+    def configuracion_activa(self, connection=None):
+        """
+        Lee de SQLite los valores efectivos de los PRAGMAs del reporte
+
+        Returns:
+            dict: {pragma: valor}
+        """
+        if connection is None:
+            with self.conexion() as connection:
+                return self.configuracion_activa(connection)
+
+        return {
+            nombre: connection.execute(f"PRAGMA {nombre}").fetchone()[0]
+            for nombre in PRAGMAS_REPORTE
+        }
+
+    def reporte_configuracion(self, connection=None):
+        """Texto con el perfil activo y los valores efectivos de sus PRAGMAs"""
+        valores = self.configuracion_activa(connection)
+        detalle = ', '.join(f"{nombre}={valor}" for nombre, valor in valores.items())
+        return f"Perfil SQLite '{self.perfil}' en {self.db_path}: {detalle}"
 
     def disconnect(self):
-        """Cierra la conexión con la base de datos"""
-        if self.connection:
-            self.connection.close()
+        """Cierra las conexiones libres del pool"""
+        self.pool.cerrar()
+
+    @contextmanager
+    def conexion(self):
+        """
+        Context manager para obtener una conexión
+
+        Dentro de una petición de Flask la conexión se toma del pool una sola vez
+        y se devuelve en el teardown del contexto de aplicación. Fuera de Flask
+        (scripts, migraciones) se presta solo durante el bloque.
+        """
+        if has_app_context():
+            if 'db_conexion' not in g:
+                g.db_conexion = self.pool.obtener()
+            yield g.db_conexion
+        else:
+            connection = self.pool.obtener()
+            try:
+                yield connection
+            finally:
+                self.pool.devolver(connection)
+
+    def liberar_conexion(self, exc=None):
+        """Devuelve al pool la conexión de la petición actual"""
+        connection = g.pop('db_conexion', None)
+        if connection is not None:
+            self.pool.devolver(connection)
 
     @contextmanager
     def get_cursor(self):
         """Context manager para obtener un cursor"""
-        if not self.connection:
-            self.connect()
-        cursor = self.connection.cursor()
+        with self.conexion() as connection:
+            cursor = connection.cursor(CursorMedido)
+            try:
+                yield cursor
+            finally:
+                cursor.close()
+
+    @contextmanager
+    def transaccion(self, inmediata=True):
+        """
+        Context manager para una transacción explícita
+
+        Hace commit al salir del bloque y rollback si se produce una excepción.
+        Con inmediata=True se toma el bloqueo de escritura al empezar (BEGIN
+        IMMEDIATE), de modo que ningún otro escritor se intercala. Si la conexión
+        ya tiene una transacción abierta, el bloque se une a ella.
+
+        Dentro del bloque se debe usar el cursor recibido: execute_query hace
+        commit por su cuenta y cerraría la transacción antes de tiempo.
+        """
+        with self.get_cursor() as cursor:
+            connection = cursor.connection
+            propia = not connection.in_transaction
+            if propia:
+                cursor.execute("BEGIN IMMEDIATE" if inmediata else "BEGIN")
+            try:
+                yield cursor
+                if propia:
+                    connection.commit()
+            except BaseException:
+                if propia:
+                    connection.rollback()
+                raise
+
+    def execute_many(self, query, seq_params):
+        """
+        Ejecuta una consulta INSERT, UPDATE o DELETE para cada juego de
+        parámetros dentro de una sola transacción
+
+        Returns:
+            int: Número de filas afectadas, o None si hubo un error (no se aplica ninguna)
+        """
         try:
-            yield cursor
-        finally:
-            cursor.close()
+            with self.transaccion() as cursor:
+                cursor.executemany(query, seq_params)
+                return cursor.rowcount
+        except sqlite3.Error as e:
+            print(f"Error al ejecutar query: {e}")
+            return None
 
     def execute_query(self, query, params=None):
         """Ejecuta una consulta INSERT, UPDATE o DELETE"""
         try:
-            if not self.connection:
-                self.connect()
-
             with self.get_cursor() as cursor:
-                if params:
-                    cursor.execute(query, params)
-                else:
-                    cursor.execute(query)
+                try:
+                    if params:
+                        cursor.execute(query, params)
+                    else:
+                        cursor.execute(query)
 
-                self.connection.commit()
-                return cursor.lastrowid
+                    cursor.connection.commit()
+                    return cursor.lastrowid
+                except sqlite3.Error:
+                    cursor.connection.rollback()
+                    raise
         except sqlite3.Error as e:
             print(f"Error al ejecutar query: {e}")
-            if self.connection:
-                self.connection.rollback()
             return None
 
     def fetch_query(self, query, params=None):
         """Ejecuta una consulta SELECT y retorna los resultados"""
         try:
-            if not self.connection:
-                self.connect()
-
             with self.get_cursor() as cursor:
                 if params:
                     cursor.execute(query, params)
@@ -0,0 +1,206 @@
+"""
+Métricas por petición y exportación en formato de texto de Prometheus
+
+Cada petición lleva una traza (app/trazas.py) que se abre en before_request y
+se cierra en teardown_request, después de guardar la sesión. Los tramos que se
+miden son:
+  - db: cada cursor.execute de Database (tiempo y número de consultas)
+  - prediccion: predictor.predecir completo (features, cache, modelo, reglas)
+  - modelo: solo la llamada al bosque (con micro-lotes, la del lote completo)
+  - plantilla: render de plantillas Jinja (señales de Flask)
+  - sesion: serialización y firma de la cookie de sesión
+
+Por endpoint se guarda un histograma acumulado de la latencia total y de cada
+tramo (para Prometheus) y uno deslizante de la latencia de los últimos
+METRICAS_VENTANA_SEGUNDOS, del que salen p50/p95/p99. Cada proceso de gunicorn
+tiene sus propias métricas: /metrics muestra las del worker que responde.
+"""
+import os
+import threading
+
+from flask import request, template_rendered, before_render_template
+from flask.sessions import SecureCookieSessionInterface
+
+from app import trazas
+from app.trazas import tramo
+from histogramas import Histograma, HistogramaDeslizante
+from predict import predictor
+
+# Cubetas de latencia en segundos
+LIMITES_LATENCIA = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+LIMITES_CONSULTAS = [0, 1, 2, 3, 5, 10, 20, 50, 100]
+
+TRAMOS = ('db', 'prediccion', 'modelo', 'plantilla', 'sesion')
+PERCENTILES = (50, 95, 99)
+
+PREFIJO = 'proyecto_ml'
+
+
+class MetricasEndpoint:
+    """Histogramas y contadores de un endpoint"""
+
+    def __init__(self, ventana):
+        self.latencia = Histograma(LIMITES_LATENCIA)
+        self.latencia_reciente = HistogramaDeslizante(LIMITES_LATENCIA, ventana)
+        self.consultas = Histograma(LIMITES_CONSULTAS)
+        self.tramos = {nombre: Histograma(LIMITES_LATENCIA) for nombre in TRAMOS}
+        self.operaciones = {nombre: 0 for nombre in TRAMOS}
+        self.status = {}
+        self._lock = threading.Lock()
+
+    def registrar(self, traza, duracion):
+        self.latencia.observar(duracion)
+        self.latencia_reciente.observar(duracion)
+        self.consultas.observar(traza.conteos.get('db', 0))
+        for nombre, segundos in traza.tiempos.items():
+            histograma = self.tramos.get(nombre)
+            if histograma is not None:
+                histograma.observar(segundos)
+        with self._lock:
+            for nombre, conteo in traza.conteos.items():
+                if nombre in self.operaciones:
+                    self.operaciones[nombre] += conteo
+            self.status[traza.status] = self.status.get(traza.status, 0) + 1
+
+    def contadores(self):
+        """Copia de (peticiones por status, operaciones por tramo)"""
+        with self._lock:
+            return dict(self.status), dict(self.operaciones)
+
+
+class MetricasPeticiones:
+    """Registro de métricas de todos los endpoints del proceso"""
+
+    def __init__(self, ventana=60.0, server_timing=False):
+        self.ventana = ventana
+        self.server_timing = server_timing
+        self.endpoints = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def desde_entorno(cls):
+        """Crea el registro según las variables de entorno, o None si está desactivado"""
+        if os.getenv('METRICAS_ACTIVAS', '1').lower() in ('0', 'false'):
+            return None
+        return cls(
+            ventana=float(os.getenv('METRICAS_VENTANA_SEGUNDOS', 60)),
+            server_timing=os.getenv('METRICAS_SERVER_TIMING', '0').lower() in ('1', 'true')
+        )
+
+    def init_app(self, app):
+        """
+        Conecta los hooks de la petición, las señales de plantillas, la sesión
+        y las trazas del predictor
+        """
+        predictor.trazas = trazas
+        app.before_request(self._antes)
+        app.after_request(self._despues)
+        app.teardown_request(self._terminar)
+        before_render_template.connect(self._antes_plantilla, app, weak=False)
+        template_rendered.connect(self._despues_plantilla, app, weak=False)
+        app.session_interface = SesionMedida()
+
+    def _antes(self):
+        trazas.iniciar()
+
+    def _despues(self, response):
+        traza = trazas.actual()
+        if traza is not None:
+            traza.status = response.status_code
+            if self.server_timing:
+                response.headers['Server-Timing'] = ', '.join(
+                    f"{nombre};dur={segundos * 1000:.2f}" for nombre, segundos in traza.tiempos.items()
+                )
+        return response
+
+    def _terminar(self, exc=None):
+        traza = trazas.terminar()
+        if traza is None:
+            return
+        if traza.status is None:
+            traza.status = 500
+        endpoint = request.endpoint or 'sin_ruta'
+        metricas = self.endpoints.get(endpoint)
+        if metricas is None:
+            with self._lock:
+                metricas = self.endpoints.setdefault(endpoint, MetricasEndpoint(self.ventana))
+        metricas.registrar(traza, traza.duracion())
+
+    @staticmethod
+    def _antes_plantilla(sender, template, context, **extra):
+        traza = trazas.actual()
+        if traza is not None:
+            traza.abrir('plantilla')
+
+    @staticmethod
+    def _despues_plantilla(sender, template, context, **extra):
+        traza = trazas.actual()
+        if traza is not None:
+            traza.cerrar('plantilla')
+
+    def exportar(self):
+        """Métricas en el formato de texto de Prometheus (versión 0.0.4)"""
+        with self._lock:
+            endpoints = sorted(self.endpoints.items())
+        contadores = {e: m.contadores() for e, m in endpoints}
+
+        lineas = []
+
+        def cabecera(nombre, tipo, descripcion):
+            lineas.append(f"# HELP {PREFIJO}_{nombre} {descripcion}")
+            lineas.append(f"# TYPE {PREFIJO}_{nombre} {tipo}")
+
+        def histograma(nombre, descripcion, series):
+            cabecera(nombre, 'histogram', descripcion)
+            for etiquetas, h in series:
+                # Cubetas, total y suma de la misma lectura del histograma
+                resumen = h.resumen()
+                acumulado = 0
+                for limite, conteo in resumen['cubetas'].items():
+                    acumulado += conteo
+                    lineas.append(f'{PREFIJO}_{nombre}_bucket{{{etiquetas},le="{limite}"}} {acumulado}')
+                lineas.append(f'{PREFIJO}_{nombre}_sum{{{etiquetas}}} {resumen["suma"]}')
+                lineas.append(f'{PREFIJO}_{nombre}_count{{{etiquetas}}} {resumen["total"]}')
+
+        def valores(nombre, tipo, descripcion, series):
+            cabecera(nombre, tipo, descripcion)
+            for etiquetas, valor in series:
+                lineas.append(f'{PREFIJO}_{nombre}{{{etiquetas}}} {valor}')
+
+        histograma('peticion_segundos', 'Latencia total de la peticion',
+                   [(f'endpoint="{e}"', m.latencia) for e, m in endpoints])
+
+        recientes = []
+        for e, m in endpoints:
+            combinado = m.latencia_reciente.combinado()
+            for p in PERCENTILES:
+                valor = combinado.percentil(p)
+                recientes.append((f'endpoint="{e}",quantile="{p / 100:g}"', 'NaN' if valor is None else valor))
+        valores('peticion_segundos_reciente', 'gauge',
+                f'Percentiles de latencia de los ultimos {self.ventana:g} s (limite de la cubeta)', recientes)
+
+        valores('peticiones_total', 'counter', 'Peticiones atendidas por status', [
+            (f'endpoint="{e}",status="{status}"', n)
+            for e, _ in endpoints for status, n in sorted(contadores[e][0].items())
+        ])
+        histograma('tramo_segundos', 'Tiempo por tramo en las peticiones que lo usan', [
+            (f'endpoint="{e}",tramo="{t}"', h) for e, m in endpoints for t, h in m.tramos.items() if h.total
+        ])
+        valores('tramo_operaciones_total', 'counter', 'Operaciones medidas por tramo (db = consultas)', [
+            (f'endpoint="{e}",tramo="{t}"', n) for e, _ in endpoints for t, n in contadores[e][1].items() if n
+        ])
+        histograma('consultas_por_peticion', 'Consultas a la base de datos por peticion',
+                   [(f'endpoint="{e}"', m.consultas) for e, m in endpoints])
+        return '\n'.join(lineas) + '\n'
+
+
+class SesionMedida(SecureCookieSessionInterface):
+    """Sesión por cookie firmada que anota el tiempo de guardarla"""
+
+    def save_session(self, app, session, response):
+        with tramo('sesion'):
+            super().save_session(app, session, response)
+
+
+# Registro del proceso; None con METRICAS_ACTIVAS=0
+metricas_peticiones = MetricasPeticiones.desde_entorno()
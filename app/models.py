@@ -1,3 +1,7 @@
+import json
+import sqlite3
+from datetime import datetime
+from itertools import islice
 from app.database import db
 from werkzeug.security import generate_password_hash, check_password_hash
 
@@ -177,11 +181,272 @@ class Usuario:
             return False, "Error al actualizar la contraseña"
 
 
+class CatalogoMensajes:
+    """
+    Tabla de búsqueda para recomendaciones y factores de riesgo
+
+    Cada entrada distinta se guarda una sola vez en catalogo_mensajes como JSON
+    y los resultados solo guardan la lista de IDs ("3,7,12"). Las entradas ya
+    conocidas se mantienen en memoria en ambos sentidos.
+    """
+
+    _ids = {}        # contenido JSON -> id (solo entradas confirmadas)
+    _entradas = {}   # id -> dict decodificado
+
+    @staticmethod
+    def serializar(entrada):
+        """JSON compacto; conserva el orden de las claves del dict"""
+        return json.dumps(entrada, ensure_ascii=False, separators=(',', ':'))
+
+    @classmethod
+    def codificar(cls, cursor, entradas, nuevos):
+        """
+        Convierte una lista de entradas en su lista de IDs
+
+        Args:
+            cursor: Cursor de la transacción en curso
+            entradas (list): Recomendaciones o factores de riesgo
+            nuevos (dict): Acumula contenido -> id de las entradas consultadas o
+                creadas en esta transacción; se pasa a confirmar() tras el commit
+
+        Returns:
+            str: IDs separados por comas ('' si no hay entradas)
+        """
+        ids = []
+        for entrada in entradas:
+            contenido = cls.serializar(entrada)
+            id_mensaje = cls._ids.get(contenido) or nuevos.get(contenido)
+            if id_mensaje is None:
+                cursor.execute(
+                    "INSERT OR IGNORE INTO catalogo_mensajes (contenido) VALUES (?)",
+                    (contenido,)
+                )
+                id_mensaje = cursor.execute(
+                    "SELECT id FROM catalogo_mensajes WHERE contenido = ?",
+                    (contenido,)
+                ).fetchone()[0]
+                nuevos[contenido] = id_mensaje
+            ids.append(str(id_mensaje))
+        return ','.join(ids)
+
+    @classmethod
+    def confirmar(cls, nuevos):
+        """Agrega a la memoria los IDs de una transacción ya confirmada"""
+        cls._ids.update(nuevos)
+
+    @classmethod
+    def decodificar(cls, texto_ids):
+        """
+        Convierte una lista de IDs en las entradas originales
+
+        Args:
+            texto_ids (str): IDs separados por comas
+
+        Returns:
+            list: Lista de dicts (copias, se pueden modificar)
+        """
+        if not texto_ids:
+            return []
+
+        ids = [int(i) for i in texto_ids.split(',')]
+        faltantes = [i for i in ids if i not in cls._entradas]
+        if faltantes:
+            cls._cargar(faltantes)
+
+        return [dict(cls._entradas[i]) for i in ids]
+
+    @classmethod
+    def limpiar(cls):
+        """Olvida las entradas en memoria (p. ej. si se borró la tabla)"""
+        cls._ids.clear()
+        cls._entradas.clear()
+
+    @classmethod
+    def precargar(cls):
+        """Carga en memoria todo el catálogo"""
+        filas = db.fetch_query("SELECT id FROM catalogo_mensajes") or []
+        if filas:
+            cls._cargar([fila['id'] for fila in filas])
+
+    @classmethod
+    def _cargar(cls, ids):
+        """Carga en memoria las entradas del catálogo indicadas"""
+        ids = list(set(ids))
+        marcadores = ','.join('?' * len(ids))
+        filas = db.fetch_query(
+            f"SELECT id, contenido FROM catalogo_mensajes WHERE id IN ({marcadores})",
+            ids
+        ) or []
+        for fila in filas:
+            cls._entradas[fila['id']] = json.loads(fila['contenido'])
+            cls._ids.setdefault(fila['contenido'], fila['id'])
+
+
+class FilaResultado(dict):
+    """
+    Resultado leído de la base de datos con decodificación diferida
+
+    Los campos pesados (datos_formulario, recomendaciones, factores_riesgo) se
+    decodifican la primera vez que se accede a ellos, con fila['campo'],
+    fila.get('campo') o resultado.campo en las plantillas. Recorrer la fila
+    completa (keys(), items(), values(), dict(fila), tojson o jsonify)
+    decodifica antes los pendientes, así que lo que se ve de la fila no
+    depende de qué campos se usaron primero.
+    """
+
+    __slots__ = ('_pendientes',)
+
+    def __init__(self, valores, pendientes):
+        """
+        Args:
+            valores (dict): Campos ya decodificados
+            pendientes (dict): campo -> (función, argumento) para decodificarlo
+        """
+        super().__init__(valores)
+        self._pendientes = pendientes
+
+    def __missing__(self, clave):
+        if clave not in self._pendientes:
+            raise KeyError(clave)
+        funcion, argumento = self._pendientes.pop(clave)
+        valor = funcion(argumento)
+        self[clave] = valor
+        return valor
+
+    def __contains__(self, clave):
+        return dict.__contains__(self, clave) or clave in self._pendientes
+
+    def get(self, clave, defecto=None):
+        try:
+            return self[clave]
+        except KeyError:
+            return defecto
+
+    def _decodificar_pendientes(self):
+        for clave in list(self._pendientes):
+            self[clave]
+
+    def __len__(self):
+        return dict.__len__(self) + len(self._pendientes)
+
+    def __iter__(self):
+        self._decodificar_pendientes()
+        return dict.__iter__(self)
+
+    def keys(self):
+        self._decodificar_pendientes()
+        return dict.keys(self)
+
+    def items(self):
+        self._decodificar_pendientes()
+        return dict.items(self)
+
+    def values(self):
+        self._decodificar_pendientes()
+        return dict.values(self)
+
+    def copy(self):
+        self._decodificar_pendientes()
+        return dict(dict.items(self))
+
+    def __eq__(self, otro):
+        self._decodificar_pendientes()
+        if isinstance(otro, FilaResultado):
+            otro._decodificar_pendientes()
+        return dict.__eq__(self, otro)
+
+    def __ne__(self, otro):
+        self._decodificar_pendientes()
+        if isinstance(otro, FilaResultado):
+            otro._decodificar_pendientes()
+        return dict.__ne__(self, otro)
+
+    __hash__ = None
+
+    def __repr__(self):
+        self._decodificar_pendientes()
+        return dict.__repr__(self)
+
+
 class Resultado:
     """Modelo para gestionar resultados de predicciones en la base de datos"""
 
+    # Respuestas del formulario guardadas como columnas tipadas
+    CAMPOS_FORMULARIO = [
+        ('daily_usage', float),
+        ('sleephours', float),
+        ('academic_perf', float),
+        ('exercise', float),
+        ('screen_before_bed', float),
+        ('checks_per_day', int),
+        ('apps_daily', list),
+        ('time_social_media', float),
+        ('time_gaming', float),
+        ('time_education', float),
+        ('purpose', str),
+        ('weekend_usage', float),
+    ]
+
+    _QUERY_INSERTAR = """
+        INSERT INTO resultados (usuario_id, nivel_prediccion, puntaje_prediccion,
+                               {campos}, datos_extra,
+                               recomendaciones_ids, factores_ids, version_modelo)
+        VALUES (?, ?, ?, {marcadores}, ?, ?, ?, ?)
+    """.format(
+        campos=', '.join(nombre for nombre, _ in CAMPOS_FORMULARIO),
+        marcadores=', '.join('?' * len(CAMPOS_FORMULARIO))
+    )
+
+    # Suma a estadisticas_usuario los resultados con id en [?, ?]; el último
+    # puntaje es el del resultado más reciente del rango por usuario
+    _QUERY_ACTUALIZAR_ESTADISTICAS = """
+        INSERT INTO estadisticas_usuario (usuario_id, total_evaluaciones, suma_puntaje,
+                                          puntaje_minimo, puntaje_maximo,
+                                          ultimo_puntaje, ultima_evaluacion)
+        SELECT r.usuario_id, COUNT(*), SUM(r.puntaje_prediccion),
+               MIN(r.puntaje_prediccion), MAX(r.puntaje_prediccion),
+               (SELECT u.puntaje_prediccion FROM resultados u
+                WHERE u.usuario_id = r.usuario_id AND u.id BETWEEN :desde AND :hasta
+                ORDER BY u.fecha_creacion DESC, u.id DESC LIMIT 1),
+               MAX(r.fecha_creacion)
+        FROM resultados r
+        WHERE r.id BETWEEN :desde AND :hasta
+        GROUP BY r.usuario_id
+        ON CONFLICT(usuario_id) DO UPDATE SET
+            total_evaluaciones = total_evaluaciones + excluded.total_evaluaciones,
+            suma_puntaje = suma_puntaje + excluded.suma_puntaje,
+            puntaje_minimo = MIN(COALESCE(puntaje_minimo, excluded.puntaje_minimo), excluded.puntaje_minimo),
+            puntaje_maximo = MAX(COALESCE(puntaje_maximo, excluded.puntaje_maximo), excluded.puntaje_maximo),
+            ultimo_puntaje = CASE
+                WHEN ultima_evaluacion IS NULL OR excluded.ultima_evaluacion >= ultima_evaluacion
+                THEN excluded.ultimo_puntaje ELSE ultimo_puntaje END,
+            ultima_evaluacion = MAX(COALESCE(ultima_evaluacion, excluded.ultima_evaluacion),
+                                    excluded.ultima_evaluacion)
+    """
+
+    # Campos que devuelven las consultas y columnas de la tabla que necesita cada uno
+    COLUMNAS_POR_CAMPO = {
+        'id': ['id'],
+        'nivel_prediccion': ['nivel_prediccion'],
+        'puntaje_prediccion': ['puntaje_prediccion'],
+        'datos_formulario': [nombre for nombre, _ in CAMPOS_FORMULARIO] + ['datos_extra'],
+        'recomendaciones': ['recomendaciones_ids'],
+        'factores_riesgo': ['factores_ids'],
+        'version_modelo': ['version_modelo'],
+        'fecha_creacion': ['fecha_creacion'],
+    }
+    CAMPOS = list(COLUMNAS_POR_CAMPO)
+
+    # Campos que se decodifican solo cuando se usan (ver FilaResultado)
+    CAMPOS_DIFERIDOS = ('datos_formulario', 'recomendaciones', 'factores_riesgo')
+
+    _COLUMNAS_CONSULTA = ', '.join(
+        columna for columnas in COLUMNAS_POR_CAMPO.values() for columna in columnas
+    )
+
     @staticmethod
-    def guardar_resultado(usuario_id, nivel_prediccion, puntaje_prediccion, datos_formulario, recomendaciones, factores_riesgo):
+    def guardar_resultado(usuario_id, nivel_prediccion, puntaje_prediccion, datos_formulario, recomendaciones, factores_riesgo,
+                          version_modelo=None):
         """
         Guarda un resultado de predicción en la base de datos
 
@@ -189,49 +454,275 @@ class Resultado:
             usuario_id (int): ID del usuario
             nivel_prediccion (str): Nivel de riesgo (Bajo, Moderado, Alto)
             puntaje_prediccion (float): Puntaje de la predicción
-            datos_formulario (dict): Datos del formulario en formato JSON
+            datos_formulario (dict): Respuestas del formulario
             recomendaciones (list): Lista de recomendaciones
             factores_riesgo (list): Lista de factores de riesgo
+            version_modelo (str): Versión del modelo que produjo la predicción
 
         Returns:
             int: ID del resultado creado, o None si hubo un error
         """
-        import json
+        nuevos = {}
+        try:
+            with db.transaccion() as cursor:
+                params = Resultado._parametros_insercion(
+                    cursor, nuevos, usuario_id, nivel_prediccion, puntaje_prediccion,
+                    datos_formulario, recomendaciones, factores_riesgo, version_modelo
+                )
+                cursor.execute(Resultado._QUERY_INSERTAR, params)
+                resultado_id = cursor.lastrowid
+                Resultado._actualizar_estadisticas(cursor, resultado_id, resultado_id)
+        except sqlite3.Error as e:
+            print(f"Error al guardar resultado: {e}")
+            return None
+
+        CatalogoMensajes.confirmar(nuevos)
+        return resultado_id
 
-        query = """
-            INSERT INTO resultados (usuario_id, nivel_prediccion, puntaje_prediccion,
-                                   datos_formulario, recomendaciones, factores_riesgo)
-            VALUES (?, ?, ?, ?, ?, ?)
+    @staticmethod
+    def _actualizar_estadisticas(cursor, desde, hasta):
+        """Acumula en estadisticas_usuario los resultados con id entre desde y hasta"""
+        cursor.execute(Resultado._QUERY_ACTUALIZAR_ESTADISTICAS, {'desde': desde, 'hasta': hasta})
+
+    @staticmethod
+    def reconstruir_estadisticas():
         """
-        params = (
+        Recalcula estadisticas_usuario desde cero a partir de la tabla resultados
+
+        Returns:
+            int: Número de usuarios con estadísticas, o None si hubo un error
+        """
+        try:
+            with db.transaccion() as cursor:
+                cursor.execute("DELETE FROM estadisticas_usuario")
+                rango = cursor.execute("SELECT MIN(id), MAX(id) FROM resultados").fetchone()
+                if rango[0] is not None:
+                    Resultado._actualizar_estadisticas(cursor, rango[0], rango[1])
+                return cursor.execute("SELECT COUNT(*) FROM estadisticas_usuario").fetchone()[0]
+        except sqlite3.Error as e:
+            print(f"Error al reconstruir estadísticas: {e}")
+            return None
+
+    @staticmethod
+    def _parametros_insercion(cursor, nuevos, usuario_id, nivel_prediccion, puntaje_prediccion,
+                              datos_formulario, recomendaciones, factores_riesgo, version_modelo=None):
+        """Convierte un resultado en la tupla de parámetros del INSERT"""
+        datos = dict(datos_formulario or {})
+        campos = [Resultado._codificar_campo(datos.pop(nombre, None), tipo)
+                  for nombre, tipo in Resultado.CAMPOS_FORMULARIO]
+
+        # Claves fuera del formulario web (por ejemplo en importaciones)
+        datos_extra = json.dumps(datos) if datos else None
+
+        return (
             usuario_id,
             nivel_prediccion,
             puntaje_prediccion,
-            json.dumps(datos_formulario),
-            json.dumps(recomendaciones),
-            json.dumps(factores_riesgo)
+            *campos,
+            datos_extra,
+            CatalogoMensajes.codificar(cursor, recomendaciones, nuevos),
+            CatalogoMensajes.codificar(cursor, factores_riesgo, nuevos),
+            version_modelo
         )
 
-        return db.execute_query(query, params)
+    @staticmethod
+    def _codificar_campo(valor, tipo):
+        """Convierte una respuesta del formulario al tipo de su columna"""
+        if valor is None:
+            return None
+        if tipo is list:
+            # JSON conserva si era una lista o un valor suelto ("10" no es ["10"])
+            return json.dumps(valor if isinstance(valor, list) else str(valor), ensure_ascii=False)
+        if tipo is str:
+            return str(valor)
+        try:
+            return tipo(valor)
+        except (TypeError, ValueError):
+            # Valor no numérico: SQLite lo guarda como texto tal cual
+            return valor
+
+    @staticmethod
+    def _columnas_consulta(campos):
+        """
+        Columnas del SELECT para una proyección
+
+        Args:
+            campos (iterable): Campos a devolver, o None para todos
+
+        Returns:
+            str: Lista de columnas separadas por comas
+        """
+        if campos is None:
+            return Resultado._COLUMNAS_CONSULTA
+
+        desconocidos = set(campos) - set(Resultado.COLUMNAS_POR_CAMPO)
+        if desconocidos:
+            raise ValueError(f"Campos de resultado desconocidos: {sorted(desconocidos)}")
+
+        return ', '.join(
+            columna for campo in Resultado.CAMPOS if campo in campos
+            for columna in Resultado.COLUMNAS_POR_CAMPO[campo]
+        )
+
+    @staticmethod
+    def _decodificar_fila(fila):
+        """
+        Convierte una fila de resultados al formato de diccionario de la aplicación
+
+        Solo incluye los campos cuyas columnas vienen en la fila; los campos
+        pesados quedan pendientes hasta que se accede a ellos.
+        """
+        valores = {}
+        pendientes = {}
+
+        for campo in ('id', 'nivel_prediccion', 'puntaje_prediccion', 'version_modelo'):
+            if campo in fila:
+                valores[campo] = fila[campo]
+
+        if 'daily_usage' in fila:
+            columnas = {columna: fila[columna] for columna in Resultado.COLUMNAS_POR_CAMPO['datos_formulario']}
+            pendientes['datos_formulario'] = (Resultado._decodificar_formulario, columnas)
+        if 'recomendaciones_ids' in fila:
+            pendientes['recomendaciones'] = (CatalogoMensajes.decodificar, fila['recomendaciones_ids'])
+        if 'factores_ids' in fila:
+            pendientes['factores_riesgo'] = (CatalogoMensajes.decodificar, fila['factores_ids'])
+
+        if 'fecha_creacion' in fila:
+            valores['fecha_creacion'] = Resultado._convertir_fecha(fila['fecha_creacion'])
+
+        return FilaResultado(valores, pendientes)
+
+    @staticmethod
+    def _decodificar_formulario(columnas):
+        """Reconstruye el dict de respuestas a partir de las columnas tipadas"""
+        datos_formulario = {}
+        for nombre, tipo in Resultado.CAMPOS_FORMULARIO:
+            valor = columnas[nombre]
+            if valor is None:
+                continue
+            if tipo is list:
+                if valor[:1] in ('[', '"'):
+                    valor = json.loads(valor)
+                else:
+                    # Formato anterior: lista unida con comas
+                    valor = valor.split(',') if valor else []
+            datos_formulario[nombre] = valor
+
+        if columnas['datos_extra']:
+            datos_formulario.update(json.loads(columnas['datos_extra']))
+
+        return datos_formulario
+
+    @staticmethod
+    def _convertir_fecha(fecha):
+        """Convierte fecha_creacion de string a datetime"""
+        if isinstance(fecha, str):
+            try:
+                return datetime.strptime(fecha, '%Y-%m-%d %H:%M:%S')
+            except ValueError:
+                try:
+                    return datetime.strptime(fecha, '%Y-%m-%d %H:%M:%S.%f')
+                except ValueError:
+                    pass
+        return fecha
+
+    @staticmethod
+    def guardar_lote(resultados, tamano_lote=1000):
+        """
+        Guarda muchos resultados con executemany dentro de una sola transacción
+
+        Args:
+            resultados (iterable): dicts con las mismas claves que los argumentos
+                de guardar_resultado (usuario_id, nivel_prediccion, ...)
+            tamano_lote (int): Filas enviadas en cada executemany
+
+        Returns:
+            list: IDs asignados en el mismo orden de entrada, o None si hubo un
+                error (en ese caso no se guarda ninguna fila)
+        """
+        ids = []
+        nuevos = {}
+
+        try:
+            # BEGIN IMMEDIATE: nadie más inserta mientras tanto, así que los IDs
+            # de cada lote son consecutivos y terminan en last_insert_rowid()
+            with db.transaccion() as cursor:
+                filas = (Resultado._parametros_insercion(cursor, nuevos, **r) for r in resultados)
+                while True:
+                    lote = list(islice(filas, tamano_lote))
+                    if not lote:
+                        break
+                    cursor.executemany(Resultado._QUERY_INSERTAR, lote)
+                    ultimo_id = cursor.execute("SELECT last_insert_rowid()").fetchone()[0]
+                    ids.extend(range(ultimo_id - len(lote) + 1, ultimo_id + 1))
+
+                if ids:
+                    Resultado._actualizar_estadisticas(cursor, ids[0], ids[-1])
+        except sqlite3.Error as e:
+            print(f"Error al guardar lote de resultados: {e}")
+            return None
+
+        CatalogoMensajes.confirmar(nuevos)
+        return ids
 
     @staticmethod
-    def obtener_por_usuario(usuario_id, limite=10):
+    def actualizar_predicciones(resultados):
+        """
+        Reemplaza la predicción de resultados ya guardados (re-puntuación)
+
+        No actualiza estadisticas_usuario: al terminar de re-puntuar se debe
+        llamar a reconstruir_estadisticas(), porque mínimos y máximos no se
+        pueden corregir de forma incremental.
+
+        Args:
+            resultados (iterable): dicts con id, nivel_prediccion,
+                puntaje_prediccion, recomendaciones, factores_riesgo y version_modelo
+
+        Returns:
+            int: Filas actualizadas, o None si hubo un error (no se actualiza ninguna)
+        """
+        query = """
+            UPDATE resultados
+            SET nivel_prediccion = ?, puntaje_prediccion = ?, recomendaciones_ids = ?,
+                factores_ids = ?, version_modelo = ?
+            WHERE id = ?
+        """
+        nuevos = {}
+
+        try:
+            with db.transaccion() as cursor:
+                parametros = [(
+                    r['nivel_prediccion'],
+                    r['puntaje_prediccion'],
+                    CatalogoMensajes.codificar(cursor, r['recomendaciones'], nuevos),
+                    CatalogoMensajes.codificar(cursor, r['factores_riesgo'], nuevos),
+                    r['version_modelo'],
+                    r['id']
+                ) for r in resultados]
+                cursor.executemany(query, parametros)
+                actualizadas = cursor.rowcount
+        except sqlite3.Error as e:
+            print(f"Error al actualizar predicciones: {e}")
+            return None
+
+        CatalogoMensajes.confirmar(nuevos)
+        return actualizadas
+
+    @staticmethod
+    def obtener_por_usuario(usuario_id, limite=10, campos=None):
         """
         Obtiene los resultados de un usuario ordenados por fecha (más recientes primero)
 
         Args:
             usuario_id (int): ID del usuario
             limite (int): Número máximo de resultados a devolver
+            campos (iterable): Campos a devolver (ver Resultado.CAMPOS); None para todos
 
         Returns:
-            list: Lista de resultados
+            list: Lista de resultados (FilaResultado)
         """
-        import json
-        from datetime import datetime
-
-        query = """
-            SELECT id, nivel_prediccion, puntaje_prediccion,
-                   datos_formulario, recomendaciones, factores_riesgo, fecha_creacion
+        query = f"""
+            SELECT {Resultado._columnas_consulta(campos)}
             FROM resultados
             WHERE usuario_id = ?
             ORDER BY fecha_creacion DESC
@@ -241,46 +732,46 @@ class Resultado:
 
         resultados = db.fetch_query(query, params)
 
-        # Decodificar JSON y convertir fechas
-        if resultados:
-            for resultado in resultados:
-                resultado['datos_formulario'] = json.loads(resultado['datos_formulario'])
-                resultado['recomendaciones'] = json.loads(resultado['recomendaciones'])
-                resultado['factores_riesgo'] = json.loads(resultado['factores_riesgo'])
-
-                # Convertir fecha_creacion de string a datetime
-                if isinstance(resultado['fecha_creacion'], str):
-                    try:
-                        resultado['fecha_creacion'] = datetime.strptime(
-                            resultado['fecha_creacion'], '%Y-%m-%d %H:%M:%S'
-                        )
-                    except ValueError:
-                        try:
-                            resultado['fecha_creacion'] = datetime.strptime(
-                                resultado['fecha_creacion'], '%Y-%m-%d %H:%M:%S.%f'
-                            )
-                        except ValueError:
-                            pass
-
-        return resultados if resultados else []
+        # Decodificar columnas y convertir fechas
+        return [Resultado._decodificar_fila(r) for r in resultados] if resultados else []
 
     @staticmethod
-    def obtener_ultimos_7_dias(usuario_id):
+    def obtener_por_id(resultado_id, usuario_id, campos=None):
+        """
+        Obtiene un resultado por su ID, solo si pertenece al usuario
+
+        Args:
+            resultado_id (int): ID del resultado
+            usuario_id (int): ID del usuario dueño del resultado
+            campos (iterable): Campos a devolver (ver Resultado.CAMPOS); None para todos
+
+        Returns:
+            FilaResultado: El resultado, o None si no existe
+        """
+        query = f"""
+            SELECT {Resultado._columnas_consulta(campos)}
+            FROM resultados
+            WHERE id = ? AND usuario_id = ?
+        """
+        params = (resultado_id, usuario_id)
+
+        resultado = db.fetch_query(query, params)
+        return Resultado._decodificar_fila(resultado[0]) if resultado else None
+
+    @staticmethod
+    def obtener_ultimos_7_dias(usuario_id, campos=None):
         """
         Obtiene los resultados de los últimos 7 días para un usuario
 
         Args:
             usuario_id (int): ID del usuario
+            campos (iterable): Campos a devolver (ver Resultado.CAMPOS); None para todos
 
         Returns:
-            list: Lista de resultados de la última semana
+            list: Lista de resultados de la última semana (FilaResultado)
         """
-        import json
-        from datetime import datetime
-
-        query = """
-            SELECT id, nivel_prediccion, puntaje_prediccion,
-                   datos_formulario, recomendaciones, factores_riesgo, fecha_creacion
+        query = f"""
+            SELECT {Resultado._columnas_consulta(campos)}
             FROM resultados
             WHERE usuario_id = ?
               AND fecha_creacion >= datetime('now', '-7 days')
@@ -290,34 +781,81 @@ class Resultado:
 
         resultados = db.fetch_query(query, params)
 
-        # Decodificar JSON y convertir fechas
-        if resultados:
-            for resultado in resultados:
-                resultado['datos_formulario'] = json.loads(resultado['datos_formulario'])
-                resultado['recomendaciones'] = json.loads(resultado['recomendaciones'])
-                resultado['factores_riesgo'] = json.loads(resultado['factores_riesgo'])
-
-                # Convertir fecha_creacion de string a datetime
-                if isinstance(resultado['fecha_creacion'], str):
-                    try:
-                        resultado['fecha_creacion'] = datetime.strptime(
-                            resultado['fecha_creacion'], '%Y-%m-%d %H:%M:%S'
-                        )
-                    except ValueError:
-                        try:
-                            resultado['fecha_creacion'] = datetime.strptime(
-                                resultado['fecha_creacion'], '%Y-%m-%d %H:%M:%S.%f'
-                            )
-                        except ValueError:
-                            pass
-
-        return resultados if resultados else []
+        # Decodificar columnas y convertir fechas
+        return [Resultado._decodificar_fila(r) for r in resultados] if resultados else []
+
+    @staticmethod
+    def obtener_para_entrenamiento(desde_id, limite=1000, columna_etiqueta=None):
+        """
+        Obtiene un bloque de resultados posteriores a `desde_id`, en orden de ID,
+        con el formulario y los datos de cuenta que usa el predictor
+
+        Se pagina por ID (WHERE id > ?) para recorrer la tabla completa sin
+        OFFSET, que recorrería otra vez las filas ya leídas.
+
+        Args:
+            desde_id (int): Último ID ya procesado
+            limite (int): Máximo de resultados del bloque
+            columna_etiqueta (str): Columna de resultados con el valor observado;
+                si se indica, solo se devuelven las filas que lo tienen, con
+                la clave 'etiqueta'. Debe existir (ver columnas_tabla)
+
+        Returns:
+            list: dicts con id, puntaje_prediccion, version_modelo,
+            datos_formulario y datos_cuenta
+        """
+        columnas_formulario = ', '.join(f"r.{nombre}" for nombre, _ in Resultado.CAMPOS_FORMULARIO)
+        etiqueta = filtro = ''
+        if columna_etiqueta is not None:
+            if columna_etiqueta not in Resultado.columnas_tabla():
+                raise ValueError(f"La tabla resultados no tiene la columna {columna_etiqueta}")
+            etiqueta = f", r.{columna_etiqueta} AS etiqueta"
+            filtro = f"AND r.{columna_etiqueta} IS NOT NULL"
+        query = f"""
+            SELECT r.id, r.puntaje_prediccion, r.version_modelo, {columnas_formulario},
+                   r.datos_extra, u.edad, u.genero, u.grado_escolaridad{etiqueta}
+            FROM resultados r
+            JOIN usuarios u ON u.id = r.usuario_id
+            WHERE r.id > ? {filtro}
+            ORDER BY r.id
+            LIMIT ?
+        """
+        filas = db.fetch_query(query, (desde_id, limite)) or []
+
+        bloque = [{
+            'id': fila['id'],
+            'puntaje_prediccion': float(fila['puntaje_prediccion']),
+            'version_modelo': fila['version_modelo'],
+            'datos_formulario': Resultado._decodificar_formulario(fila),
+            'datos_cuenta': {
+                'edad': fila['edad'],
+                'genero': fila['genero'],
+                'grado_escolaridad': fila['grado_escolaridad']
+            }
+        } for fila in filas]
+        if columna_etiqueta is not None:
+            for salida, fila in zip(bloque, filas):
+                salida['etiqueta'] = float(fila['etiqueta'])
+        return bloque
+
+    @staticmethod
+    def columnas_tabla():
+        """
+        Columnas de la tabla resultados
+
+        Returns:
+            list: Nombres de columna
+        """
+        filas = db.fetch_query("PRAGMA table_info(resultados)") or []
+        return [fila['name'] for fila in filas]
 
     @staticmethod
     def obtener_estadisticas_usuario(usuario_id):
         """
         Obtiene estadísticas resumidas de los resultados de un usuario
 
+        Se leen de estadisticas_usuario con una búsqueda por clave primaria.
+
         Args:
             usuario_id (int): ID del usuario
 
@@ -325,16 +863,86 @@ class Resultado:
             dict: Estadísticas del usuario
         """
         query = """
-            SELECT
-                COUNT(*) as total_evaluaciones,
-                AVG(puntaje_prediccion) as promedio_puntaje,
-                MAX(puntaje_prediccion) as puntaje_maximo,
-                MIN(puntaje_prediccion) as puntaje_minimo,
-                MAX(fecha_creacion) as ultima_evaluacion
-            FROM resultados
+            SELECT total_evaluaciones, suma_puntaje, puntaje_maximo, puntaje_minimo,
+                   ultimo_puntaje, ultima_evaluacion
+            FROM estadisticas_usuario
             WHERE usuario_id = ?
         """
         params = (usuario_id,)
 
         resultado = db.fetch_query(query, params)
+        if resultado is None:
+            return None
+
+        # Mismo formato que el agregado sobre resultados: total 0 y el resto None
+        fila = resultado[0] if resultado else {'total_evaluaciones': 0, 'suma_puntaje': 0,
+                                               'puntaje_maximo': None, 'puntaje_minimo': None,
+                                               'ultimo_puntaje': None, 'ultima_evaluacion': None}
+        total = fila.pop('total_evaluaciones')
+        suma = fila.pop('suma_puntaje')
+        return {
+            'total_evaluaciones': total,
+            'promedio_puntaje': suma / total if total else None,
+            **fila
+        }
+
+
+class Trabajo:
+    """Estado de las predicciones encoladas, compartido entre procesos"""
+
+    @staticmethod
+    def crear(trabajo_id, usuario_id, estado):
+        """
+        Registra un trabajo recién encolado
+
+        Returns:
+            int: rowid del trabajo, o None si hubo un error
+        """
+        query = "INSERT INTO trabajos (id, usuario_id, estado) VALUES (?, ?, ?)"
+        return db.execute_query(query, (trabajo_id, usuario_id, estado))
+
+    @staticmethod
+    def terminar(trabajo_id, estado, resultado_id=None):
+        """
+        Anota el final de un trabajo (lo llama el proceso de trabajo)
+
+        Args:
+            trabajo_id (str): ID del trabajo
+            estado (str): Estado final
+            resultado_id (int): ID del resultado guardado, si lo hay
+        """
+        query = """
+            UPDATE trabajos
+            SET estado = ?, resultado_id = ?, fecha_fin = CURRENT_TIMESTAMP
+            WHERE id = ?
+        """
+        return db.execute_query(query, (estado, resultado_id, trabajo_id))
+
+    @staticmethod
+    def obtener(trabajo_id, usuario_id):
+        """
+        Obtiene un trabajo del usuario
+
+        Returns:
+            dict: estado y resultado_id, o None si no existe o es de otro usuario
+        """
+        query = "SELECT estado, resultado_id FROM trabajos WHERE id = ? AND usuario_id = ?"
+        resultado = db.fetch_query(query, (trabajo_id, usuario_id))
         return resultado[0] if resultado else None
+
+    @staticmethod
+    def eliminar(trabajo_id):
+        """Borra un trabajo ya entregado"""
+        return db.execute_query("DELETE FROM trabajos WHERE id = ?", (trabajo_id,))
+
+    @staticmethod
+    def purgar(ttl):
+        """
+        Borra los trabajos que nadie consultó en `ttl` segundos desde que
+        terminaron, o desde que se encolaron si su proceso nunca los terminó
+        """
+        query = """
+            DELETE FROM trabajos
+            WHERE COALESCE(fecha_fin, fecha_creacion) < datetime('now', ?)
+        """
+        return db.execute_query(query, (f'-{int(ttl)} seconds',))
@@ -1,13 +1,45 @@
-from flask import render_template, request, redirect, url_for, flash, session
+from flask import render_template, request, redirect, url_for, flash, session, jsonify
 from app import app
 from app.models import Usuario, Resultado
+from app.cola_predicciones import cola_predicciones, ColaLlenaError, PENDIENTE, LISTO
+from app.metricas import metricas_peticiones
 from functools import wraps
+import hmac
+import os
 import sys
+import threading
+import uuid
 from pathlib import Path
 
 # Agregar la carpeta ml al path para importar el predictor
 sys.path.insert(0, str(Path(__file__).parent.parent / 'ml'))
 from predict import predictor
+from cache_predicciones import CacheLRU
+from micro_lotes import MicroLoteador
+from versiones_modelo import VigilanteModelo, activar_version, version_activa, listar_versiones
+
+# Con PREDICCION_MICROLOTES=1 las predicciones concurrentes se agrupan en una
+# sola llamada al bosque; si no, se llama directamente al predictor
+micro_lotes = MicroLoteador.desde_entorno(predictor)
+
+# Con MODELO_VIGILAR_SEGUNDOS > 0 cada proceso recarga el modelo cuando
+# cambia ml/models/ACTUAL
+vigilante_modelo = VigilanteModelo.desde_entorno(predictor)
+
+# Resultados recientes en memoria del proceso. La sesión solo guarda una
+# referencia: ('bd', id) para resultados guardados en la tabla resultados, que
+# se releen de la base si ya no están aquí, o ('memoria', clave) para los
+# usuarios de prueba, que solo existen en este almacén hasta que vencen.
+resultados_recientes = CacheLRU(
+    tamano_maximo=int(os.getenv('RESULTADOS_CACHE_TAMANO', 512)),
+    ttl=float(os.getenv('RESULTADOS_CACHE_TTL', 1800))
+)
+
+@app.before_request
+def iniciar_vigilante_modelo():
+    # El hilo se inicia en cada worker (no sobrevive al fork del maestro)
+    if vigilante_modelo is not None:
+        vigilante_modelo.iniciar()
 
 # Decorador para rutas que requieren login
 def login_required(f):
@@ -75,8 +107,13 @@ def index():
     # Obtener datos del usuario y sus resultados
     if usuario_id and usuario_id != 0:
         usuario = Usuario.obtener_por_id(usuario_id)
-        # Obtener últimos 5 resultados para mostrar en el dashboard
-        ultimos_resultados = Resultado.obtener_por_usuario(usuario_id, limite=5)
+        # Obtener últimos 5 resultados para mostrar en el dashboard; la gráfica
+        # de radar lee las respuestas del formulario del más reciente
+        ultimos_resultados = Resultado.obtener_por_usuario(
+            usuario_id, limite=5,
+            campos=('id', 'nivel_prediccion', 'puntaje_prediccion', 'datos_formulario',
+                    'recomendaciones', 'fecha_creacion')
+        )
         estadisticas = Resultado.obtener_estadisticas_usuario(usuario_id)
 
         # Calcular tendencia y generar insights
@@ -222,8 +259,11 @@ def cuenta(seccion='datos-personales'):
 
         # Obtener resultados si estamos en la sección de resultados
         if seccion == 'resultados':
-            resultados = Resultado.obtener_por_usuario(usuario_id, limite=5)
-            resultados_semana = Resultado.obtener_ultimos_7_dias(usuario_id)
+            # La página no muestra las respuestas del formulario
+            campos = ('id', 'nivel_prediccion', 'puntaje_prediccion',
+                      'recomendaciones', 'factores_riesgo', 'fecha_creacion')
+            resultados = Resultado.obtener_por_usuario(usuario_id, limite=5, campos=campos)
+            resultados_semana = Resultado.obtener_ultimos_7_dias(usuario_id, campos=campos)
             estadisticas = Resultado.obtener_estadisticas_usuario(usuario_id)
         else:
             resultados = []
@@ -339,22 +379,36 @@ def procesar_formulario():
                     'grado_escolaridad': usuario.get('grado_escolaridad')
                 }
 
+        # Modo asíncrono: la predicción se hace en un proceso de trabajo
+        if cola_predicciones is not None:
+            try:
+                trabajo_id = cola_predicciones.enviar(usuario_id, datos_formulario, datos_cuenta)
+            except ColaLlenaError as e:
+                print(f"Predicción rechazada: {e}")
+                flash('Hay muchas evaluaciones en proceso. Intenta nuevamente en unos segundos.', 'warning')
+                return redirect(url_for('formulario'))
+
+            session['ultimo_resultado'] = ['trabajo', trabajo_id]
+            return redirect(url_for('resultados'))
+
         # Realizar prediccion
-        resultado = predictor.predecir(datos_formulario, datos_cuenta)
+        resultado = (micro_lotes or predictor).predecir(datos_formulario, datos_cuenta)
 
         # Guardar resultado en la base de datos (solo para usuarios reales, no de prueba)
+        resultado_id = None
         if usuario_id and usuario_id != 0:
-            Resultado.guardar_resultado(
+            resultado_id = Resultado.guardar_resultado(
                 usuario_id=usuario_id,
                 nivel_prediccion=resultado['nivel'],
                 puntaje_prediccion=resultado['prediccion'],
                 datos_formulario=datos_formulario,
                 recomendaciones=resultado['recomendaciones'],
-                factores_riesgo=resultado['factores_riesgo']
+                factores_riesgo=resultado['factores_riesgo'],
+                version_modelo=resultado.get('version_modelo')
             )
 
-        # Guardar resultado en sesion para mostrarlo
-        session['ultimo_resultado'] = resultado
+        # La sesión solo guarda la referencia al resultado
+        session['ultimo_resultado'] = recordar_resultado(usuario_id, resultado, resultado_id)
 
         return redirect(url_for('resultados'))
 
@@ -365,11 +419,95 @@ def procesar_formulario():
         flash('Error al procesar el formulario. Intenta nuevamente.', 'error')
         return redirect(url_for('formulario'))
 
+def recordar_resultado(usuario_id, resultado, resultado_id=None, clave=None):
+    """
+    Guarda un resultado recién calculado en resultados_recientes
+
+    Returns:
+        list: Referencia para la sesión (['bd', id] o ['memoria', clave])
+    """
+    if resultado_id is not None:
+        referencia = ['bd', resultado_id]
+    else:
+        referencia = ['memoria', clave or uuid.uuid4().hex]
+    resultados_recientes.guardar((usuario_id, *referencia), resultado)
+    return referencia
+
+def cargar_ultimo_resultado(usuario_id, referencia):
+    """
+    Obtiene el resultado al que apunta la referencia guardada en la sesión
+
+    Args:
+        usuario_id (int): ID del usuario en sesión
+        referencia (list): ['bd', id] o ['memoria', clave]
+
+    Returns:
+        dict: Resultado en el formato de predictor.predecir, o None
+    """
+    if not isinstance(referencia, (list, tuple)) or len(referencia) != 2:
+        return None
+
+    origen, valor = referencia
+    resultado = resultados_recientes.obtener((usuario_id, origen, valor))
+    if resultado is not None or origen != 'bd':
+        return resultado
+
+    # Resultado de otro proceso o ya desalojado: se reconstruye desde la base
+    fila = Resultado.obtener_por_id(valor, usuario_id)
+    if fila is None:
+        return None
+
+    # Las columnas tipadas devuelven 6.0 donde el formulario decía "6"
+    datos_formulario = {
+        clave: int(dato) if isinstance(dato, float) and dato.is_integer() else dato
+        for clave, dato in fila['datos_formulario'].items()
+    }
+    puntaje = float(fila['puntaje_prediccion'])
+    _, color, descripcion = predictor.clasificar_nivel(puntaje)
+    resultado = predictor.completar_resultado({
+        'prediccion': round(puntaje, 2),
+        'nivel': fila['nivel_prediccion'],
+        'color': color,
+        'descripcion': descripcion,
+        'recomendaciones': fila['recomendaciones'],
+        'factores_riesgo': fila['factores_riesgo']
+    }, datos_formulario)
+    resultado['version_modelo'] = fila['version_modelo']
+
+    resultados_recientes.guardar((usuario_id, origen, valor), resultado)
+    return resultado
+
 @app.route('/resultados')
 @login_required
 def resultados():
     """Muestra los resultados de la prediccion"""
-    resultado = session.get('ultimo_resultado')
+    usuario_id = session.get('usuario_id')
+    referencia = session.get('ultimo_resultado')
+    # Las cookies anteriores guardaban el resultado completo como dict
+    if not isinstance(referencia, (list, tuple)) or len(referencia) != 2:
+        referencia = None
+
+    # Predicción encolada: se espera un poco y si no terminó se vuelve a consultar
+    if cola_predicciones is not None and referencia and referencia[0] == 'trabajo':
+        estado, salida = cola_predicciones.obtener(
+            referencia[1], usuario_id, espera=float(os.getenv('PREDICCION_ESPERA', 5))
+        )
+        if estado == PENDIENTE:
+            return render_template('procesando.html')
+        if estado == LISTO:
+            resultado, resultado_id = salida
+            if resultado is None:
+                # Lo atendió otro proceso web: se lee de la base
+                referencia = ['bd', resultado_id]
+            else:
+                referencia = recordar_resultado(usuario_id, resultado, resultado_id, clave=referencia[1])
+            session['ultimo_resultado'] = referencia
+        elif estado is not None:
+            session.pop('ultimo_resultado', None)
+            flash('Error al procesar el formulario. Intenta nuevamente.', 'error')
+            return redirect(url_for('formulario'))
+
+    resultado = cargar_ultimo_resultado(usuario_id, referencia)
 
     if not resultado:
         flash('No hay resultados disponibles. Completa el formulario primero.', 'warning')
@@ -377,6 +515,80 @@ def resultados():
 
     return render_template('resultados.html', resultado=resultado)
 
+def token_admin_valido():
+    """Compara la cabecera X-Admin-Token con MODELO_ADMIN_TOKEN"""
+    esperado = os.getenv('MODELO_ADMIN_TOKEN')
+    recibido = request.headers.get('X-Admin-Token', '')
+    return bool(esperado) and hmac.compare_digest(recibido.encode('utf-8'), esperado.encode('utf-8'))
+
+@app.route('/admin/modelo')
+def admin_modelo():
+    """Versión activa del modelo en este proceso y versiones disponibles"""
+    if not token_admin_valido():
+        return jsonify({'error': 'No autorizado'}), 403
+    return jsonify({
+        **predictor.info_modelo(),
+        'version_publicada': version_activa(),
+        'versiones': listar_versiones()
+    })
+
+@app.route('/admin/modelo/recargar', methods=['POST'])
+def admin_recargar_modelo():
+    """
+    Recarga el modelo en segundo plano; con 'version' además la publica en
+    ml/models/ACTUAL para que los demás procesos la tomen con su vigilante
+    """
+    if not token_admin_valido():
+        return jsonify({'error': 'No autorizado'}), 403
+
+    version = request.values.get('version')
+    if version:
+        try:
+            activar_version(version)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 404
+
+    threading.Thread(target=predictor.recargar, name='recarga-modelo', daemon=True).start()
+    return jsonify({
+        'estado': 'recargando',
+        'version_actual': predictor.version_modelo,
+        'version_solicitada': version_activa()
+    }), 202
+
+@app.route('/prediccion/metricas')
+def metricas_prediccion():
+    """Cache de resultados del predictor e histogramas de micro-lotes"""
+    if not token_admin_valido():
+        return jsonify({'error': 'No autorizado'}), 403
+    return jsonify({
+        'cache': predictor.estadisticas_cache(),
+        'micro_lotes': micro_lotes.metricas() if micro_lotes is not None else None
+    })
+
+@app.route('/cola/metricas')
+def metricas_cola():
+    """Profundidad y contadores de la cola de predicciones (modo asíncrono)"""
+    if not token_admin_valido():
+        return jsonify({'error': 'No autorizado'}), 403
+    if cola_predicciones is None:
+        return jsonify({'activa': False})
+    return jsonify({'activa': True, **cola_predicciones.metricas()})
+
+@app.route('/metrics')
+def metricas():
+    """
+    Latencias por endpoint y por tramo en formato de texto de Prometheus
+
+    Con METRICAS_TOKEN se exige la cabecera Authorization: Bearer <token>
+    """
+    if metricas_peticiones is None:
+        return 'Métricas desactivadas (METRICAS_ACTIVAS=0)\n', 404, {'Content-Type': 'text/plain; charset=utf-8'}
+    esperado = os.getenv('METRICAS_TOKEN')
+    recibido = request.headers.get('Authorization', '')
+    if esperado and not hmac.compare_digest(recibido.encode('utf-8'), f'Bearer {esperado}'.encode('utf-8')):
+        return 'No autorizado\n', 403, {'Content-Type': 'text/plain; charset=utf-8'}
+    return metricas_peticiones.exportar(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
 @app.route('/cambiar_contrasena', methods=['POST'])
 @login_required
 def cambiar_contrasena():
@@ -0,0 +1,105 @@
+"""
+Trazas por petición: tiempo acumulado y número de operaciones por tramo
+
+Un tramo es una categoría de trabajo dentro de la petición (base de datos,
+predicción, modelo, plantillas, sesión). La traza activa vive en un
+ContextVar, así cada hilo anota en la de su propia petición. Fuera de una
+petición instrumentada (scripts, pruebas, hilos de fondo) no hay traza y
+tramo() solo lee el ContextVar.
+
+El predictor de ml/ no importa este módulo: app/metricas.py se lo asigna
+(predictor.trazas) al activar las métricas.
+"""
+import contextvars
+import time
+
+_traza_actual = contextvars.ContextVar('traza_actual', default=None)
+
+
+class Traza:
+    """Tiempos de una petición"""
+
+    __slots__ = ('inicio', 'tiempos', 'conteos', 'abiertos', 'status', '_token')
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.tiempos = {}
+        self.conteos = {}
+        # tramo -> inicio, de los tramos que estan midiendo ahora
+        self.abiertos = {}
+        self.status = None
+        self._token = None
+
+    def abrir(self, nombre):
+        """
+        Empieza a medir un tramo; False si ya estaba abierto (un tramo anidado
+        del mismo tipo no se cuenta dos veces)
+        """
+        if nombre in self.abiertos:
+            return False
+        self.abiertos[nombre] = time.perf_counter()
+        return True
+
+    def cerrar(self, nombre):
+        inicio = self.abiertos.pop(nombre, None)
+        if inicio is not None:
+            self.tiempos[nombre] = self.tiempos.get(nombre, 0.0) + time.perf_counter() - inicio
+            self.conteos[nombre] = self.conteos.get(nombre, 0) + 1
+
+    def sumar(self, nombre, segundos, conteo=1):
+        """Anota un tiempo medido fuera de la petición (p. ej. en otro hilo)"""
+        self.tiempos[nombre] = self.tiempos.get(nombre, 0.0) + segundos
+        self.conteos[nombre] = self.conteos.get(nombre, 0) + conteo
+
+    def duracion(self):
+        return time.perf_counter() - self.inicio
+
+
+def iniciar():
+    """Crea la traza de la petición actual"""
+    traza = Traza()
+    traza._token = _traza_actual.set(traza)
+    return traza
+
+
+def actual():
+    """Traza de la petición actual, o None"""
+    return _traza_actual.get()
+
+
+def terminar():
+    """Quita la traza actual y la devuelve (None si no había)"""
+    traza = _traza_actual.get()
+    if traza is None:
+        return None
+    try:
+        _traza_actual.reset(traza._token)
+    except ValueError:
+        # Se termina desde otro contexto que el que la inició
+        _traza_actual.set(None)
+    return traza
+
+
+class _Tramo:
+    """Context manager de tramo() (una clase cuesta menos que @contextmanager)"""
+
+    __slots__ = ('nombre', 'traza')
+
+    def __init__(self, nombre):
+        self.nombre = nombre
+        self.traza = None
+
+    def __enter__(self):
+        traza = _traza_actual.get()
+        if traza is not None and traza.abrir(self.nombre):
+            self.traza = traza
+
+    def __exit__(self, *exc):
+        if self.traza is not None:
+            self.traza.cerrar(self.nombre)
+        return False
+
+
+def tramo(nombre):
+    """Suma la duración del bloque `with` al tramo `nombre` de la traza actual"""
+    return _Tramo(nombre)
@@ -0,0 +1,373 @@
+"""
+Benchmarks reproducibles de la aplicacion
+
+Micro-benchmarks del predictor (preparar_datos_formulario, predecir,
+recomendaciones y factores de riesgo), de la base de datos (fetch_query,
+execute_query y Resultado.obtener_por_usuario con historiales de distinto
+tamano) y benchmarks de extremo a extremo con el cliente de pruebas de Flask
+(/index, /cuenta/resultados y /procesar_formulario).
+
+Todo corre sobre una base SQLite temporal sembrada con formularios generados
+con una semilla fija. Cada benchmark se calienta, calibra cuantas iteraciones
+caben en una ronda y mide varias rondas con el recolector de basura apagado;
+se reporta la mediana por iteracion. La cache del predictor se desactiva para
+que cada prediccion pase por el modelo (salvo en 'predictor.predecir_cache').
+
+--guardar escribe los resultados en un JSON de linea base; --comparar los mide
+de nuevo y marca como regresion todo benchmark cuya mediana empeore mas de
+--umbral respecto a la linea base (el proceso termina con codigo 1).
+
+Uso:
+    python benchmarks.py --guardar benchmarks_base.json
+    python benchmarks.py --comparar benchmarks_base.json --umbral 0.2
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from itertools import cycle
+
+sys.path.insert(0, 'ml')
+
+HISTORIALES = (10, 1000, 100_000)
+
+# Usuario de los benchmarks de extremo a extremo (historial de 1000 resultados)
+CORREO_E2E = 'benchmark@proyecto-ml.local'
+CLAVE_E2E = 'benchmark123'
+
+SEMILLA = 42
+FORMULARIOS_DISTINTOS = 256
+
+
+def configurar_entorno(directorio):
+    """
+    Base temporal y configuracion fija; se llama antes de importar la app
+
+    La cache, los micro-lotes y la prediccion asincrona cambian lo que se mide
+    segun el orden y la cantidad de iteraciones, por eso se desactivan.
+    """
+    os.environ['DATABASE_URL'] = os.path.join(directorio, 'benchmarks.db')
+    os.environ['PREDICCION_CACHE_TAMANO'] = '0'
+    os.environ['PREDICCION_MICROLOTES'] = '0'
+    os.environ['PREDICCION_ASINCRONA'] = '0'
+    os.environ['MODELO_VIGILAR_SEGUNDOS'] = '0'
+
+
+def generar_formularios(n, semilla=SEMILLA):
+    """Formularios con respuestas en los rangos del formulario, reproducibles"""
+    rng = random.Random(semilla)
+    apps = ['whatsapp', 'instagram', 'tiktok', 'youtube', 'facebook', 'juegos']
+    propositos = ['redes', 'educacion', 'juegos', 'entretenimiento', 'otro']
+    formularios = []
+    for _ in range(n):
+        formularios.append({
+            'daily_usage': str(rng.randint(1, 12)),
+            'sleephours': str(rng.randint(4, 10)),
+            'academic_perf': str(rng.randint(1, 5)),
+            'exercise': str(rng.randint(0, 7)),
+            'screen_before_bed': str(rng.choice([0, 0.5, 1, 1.5, 2, 3])),
+            'checks_per_day': str(rng.randint(10, 250)),
+            'apps_daily': rng.sample(apps, rng.randint(1, 4)),
+            'time_social_media': str(round(rng.uniform(0, 6), 1)),
+            'time_gaming': str(round(rng.uniform(0, 4), 1)),
+            'time_education': str(round(rng.uniform(0, 4), 1)),
+            'purpose': rng.choice(propositos),
+            'weekend_usage': str(rng.randint(1, 14)),
+        })
+    return formularios
+
+
+def sembrar_historial(usuario_id, n, formularios, resultados):
+    """Guarda n resultados para un usuario reutilizando predicciones ya hechas"""
+    from app.models import Resultado
+
+    filas = (
+        {
+            'usuario_id': usuario_id,
+            'nivel_prediccion': resultado['nivel'],
+            'puntaje_prediccion': resultado['prediccion'],
+            'datos_formulario': datos,
+            'recomendaciones': resultado['recomendaciones'],
+            'factores_riesgo': resultado['factores_riesgo'],
+            'version_modelo': resultado['version_modelo'],
+        }
+        for _, datos, resultado in zip(range(n), cycle(formularios), cycle(resultados))
+    )
+    if Resultado.guardar_lote(filas) is None:
+        raise RuntimeError(f"No se pudo sembrar el historial de {n} resultados")
+
+
+def preparar_base(formularios, historiales):
+    """
+    Crea el esquema, un usuario por tamano de historial y el usuario e2e
+
+    Returns:
+        dict: tamano de historial -> usuario_id, mas 'e2e'
+    """
+    from app.database import db
+    from app.models import Usuario
+    from predict import predictor
+
+    db.inicializar_esquema()
+    resultados = predictor.predecir_lote(formularios)
+
+    usuarios = {}
+    for n in historiales:
+        usuarios[n] = Usuario.crear_usuario('Bench', f'H{n}', 16, 'F', f'historial{n}@proyecto-ml.local', CLAVE_E2E)
+        sembrar_historial(usuarios[n], n, formularios, resultados)
+    usuarios['e2e'] = Usuario.crear_usuario('Bench', 'E2E', 16, 'F', CORREO_E2E, CLAVE_E2E)
+    sembrar_historial(usuarios['e2e'], 1000, formularios, resultados)
+    return usuarios
+
+
+def _ronda(funcion, iteraciones):
+    inicio = time.perf_counter()
+    for _ in range(iteraciones):
+        funcion()
+    return time.perf_counter() - inicio
+
+
+def medir(funcion, rondas=7, tiempo_ronda=0.1):
+    """
+    Mide una funcion sin argumentos
+
+    Args:
+        funcion: Operacion a medir
+        rondas (int): Rondas medidas despues de calibrar
+        tiempo_ronda (float): Segundos minimos por ronda; fija las iteraciones
+
+    Returns:
+        dict con mediana, minimo y desviacion por iteracion (en us), iteraciones y rondas
+    """
+    funcion()  # calentamiento: imports perezosos, caches de SQLite, plantillas
+
+    gc.collect()
+    reactivar_gc = gc.isenabled()
+    gc.disable()
+    try:
+        iteraciones = 1
+        while True:
+            duracion = _ronda(funcion, iteraciones)
+            if duracion >= tiempo_ronda or iteraciones >= 1_000_000:
+                break
+            iteraciones = min(1_000_000, max(iteraciones * 2, int(iteraciones * tiempo_ronda / max(duracion, 1e-9))))
+
+        por_iteracion = [_ronda(funcion, iteraciones) / iteraciones * 1e6 for _ in range(rondas)]
+    finally:
+        if reactivar_gc:
+            gc.enable()
+
+    return {
+        'mediana_us': statistics.median(por_iteracion),
+        'minimo_us': min(por_iteracion),
+        'desviacion_us': statistics.stdev(por_iteracion) if rondas > 1 else 0.0,
+        'iteraciones': iteraciones,
+        'rondas': rondas,
+    }
+
+
+def benchmarks_predictor(formularios):
+    from predict import ProcrastinationPredictor, predictor
+
+    predictor.asegurar_cargado()
+    con_cache = ProcrastinationPredictor(tamano_cache=1024)
+    con_cache.asegurar_cargado()
+
+    siguientes = cycle(formularios).__next__
+    datos = formularios[0]
+    prediccion = predictor.predecir(datos)['prediccion']
+
+    yield 'predictor.preparar_datos_formulario', lambda: predictor.preparar_datos_formulario(siguientes())
+    yield 'predictor.predecir', lambda: predictor.predecir(siguientes())
+    yield 'predictor.predecir_cache', lambda: con_cache.predecir(datos)
+    yield 'predictor.generar_recomendaciones', lambda: predictor.generar_recomendaciones(datos, prediccion)
+    yield 'predictor.identificar_factores_riesgo', lambda: predictor.identificar_factores_riesgo(datos)
+
+
+def benchmarks_base(usuarios, historiales):
+    from app.database import db
+    from app.models import Resultado
+
+    usuario_id = usuarios['e2e']
+    yield 'db.fetch_query', lambda: db.fetch_query(
+        "SELECT id, nombre, correo FROM usuarios WHERE id = ?", (usuario_id,))
+    yield 'db.execute_query', lambda: db.execute_query(
+        "UPDATE usuarios SET grado_escolaridad = ? WHERE id = ?", ('10', usuario_id))
+    for n in historiales:
+        yield f'resultado.obtener_por_usuario[{n}]', lambda u=usuarios[n]: Resultado.obtener_por_usuario(u)
+
+
+def benchmarks_e2e(formularios):
+    from app import app
+
+    cliente = app.test_client()
+    respuesta = cliente.post('/login', data={'username': CORREO_E2E, 'password': CLAVE_E2E})
+    if respuesta.status_code != 302:
+        raise RuntimeError(f"Login del usuario de benchmarks fallo ({respuesta.status_code})")
+
+    def peticion(metodo, url, esperado, datos=None):
+        def funcion():
+            respuesta = getattr(cliente, metodo)(url, data=datos() if datos else None)
+            if respuesta.status_code != esperado:
+                raise RuntimeError(f"{metodo.upper()} {url} devolvio {respuesta.status_code}")
+        return funcion
+
+    siguientes = cycle(formularios).__next__
+    # Los GET van primero: el POST agrega resultados al historial del usuario
+    yield 'http.GET /index', peticion('get', '/index', 200)
+    yield 'http.GET /cuenta/resultados', peticion('get', '/cuenta/resultados', 200)
+    yield 'http.POST /procesar_formulario', peticion('post', '/procesar_formulario', 302, siguientes)
+
+
+def info_entorno(historiales):
+    import numpy
+    import sklearn
+    from app.database import db
+    from predict import predictor
+
+    return {
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'cpus': os.cpu_count(),
+        'numpy': numpy.__version__,
+        'sklearn': sklearn.__version__,
+        'version_modelo': predictor.version_modelo,
+        'configuracion_bd': db.configuracion_activa(),
+        'historiales': list(historiales),
+    }
+
+
+def ejecutar(historiales, filtro=None, rondas=7, tiempo_ronda=0.1):
+    """
+    Siembra la base temporal y corre los benchmarks cuyo nombre contiene `filtro`
+
+    Returns:
+        dict: {'fecha', 'entorno', 'resultados': nombre -> medicion}
+    """
+    formularios = generar_formularios(FORMULARIOS_DISTINTOS)
+
+    inicio = time.perf_counter()
+    usuarios = preparar_base(formularios, historiales)
+    print(f"Base sembrada en {time.perf_counter() - inicio:.1f}s "
+          f"(historiales: {', '.join(str(n) for n in historiales)})\n")
+
+    grupos = (benchmarks_predictor(formularios), benchmarks_base(usuarios, historiales),
+              benchmarks_e2e(formularios))
+    resultados = {}
+    for grupo in grupos:
+        for nombre, funcion in grupo:
+            if filtro and filtro not in nombre:
+                continue
+            resultados[nombre] = medir(funcion, rondas, tiempo_ronda)
+            r = resultados[nombre]
+            print(f"  {nombre:<42} {formatear_us(r['mediana_us']):>10}  "
+                  f"(min {formatear_us(r['minimo_us'])}, ±{formatear_us(r['desviacion_us'])}, "
+                  f"{r['iteraciones']} it x {r['rondas']})")
+
+    return {
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'entorno': info_entorno(historiales),
+        'resultados': resultados,
+    }
+
+
+def formatear_us(microsegundos):
+    if microsegundos >= 1000:
+        return f"{microsegundos / 1000:.2f} ms"
+    return f"{microsegundos:.1f} us"
+
+
+def comparar(base, actual, umbral):
+    """
+    Compara las medianas contra la linea base
+
+    Returns:
+        list de nombres con regresion (mediana actual > base * (1 + umbral))
+    """
+    regresiones = []
+    print(f"\n{'benchmark':<42} {'base':>10} {'actual':>10} {'cambio':>8}")
+    print("-" * 74)
+    for nombre, medicion in actual['resultados'].items():
+        anterior = base['resultados'].get(nombre)
+        if anterior is None:
+            print(f"{nombre:<42} {'-':>10} {formatear_us(medicion['mediana_us']):>10}   (nuevo)")
+            continue
+        cambio = medicion['mediana_us'] / anterior['mediana_us'] - 1
+        marca = ''
+        if cambio > umbral:
+            marca = '  ✗ REGRESION'
+            regresiones.append(nombre)
+        elif cambio < -umbral:
+            marca = '  ✓ mejora'
+        print(f"{nombre:<42} {formatear_us(anterior['mediana_us']):>10} "
+              f"{formatear_us(medicion['mediana_us']):>10} {cambio:+7.1%}{marca}")
+
+    faltantes = [nombre for nombre in base['resultados'] if nombre not in actual['resultados']]
+    if faltantes:
+        print(f"\nSin medir en esta corrida: {', '.join(faltantes)}")
+
+    diferencias = {
+        clave: (base['entorno'].get(clave), valor)
+        for clave, valor in actual['entorno'].items()
+        if base['entorno'].get(clave) != valor
+    }
+    if diferencias:
+        print("\nAtencion: el entorno es distinto al de la linea base:")
+        for clave, (antes, ahora) in diferencias.items():
+            print(f"  {clave}: {antes} -> {ahora}")
+    return regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks reproducibles del predictor, la base y las rutas")
+    parser.add_argument('--guardar', metavar='RUTA', help='Escribe los resultados como linea base (JSON)')
+    parser.add_argument('--comparar', metavar='RUTA', help='Compara contra una linea base guardada')
+    parser.add_argument('--umbral', type=float, default=0.20,
+                        help='Empeoramiento relativo de la mediana considerado regresion')
+    parser.add_argument('--filtro', help='Solo los benchmarks cuyo nombre contiene este texto')
+    parser.add_argument('--historiales', default=','.join(str(n) for n in HISTORIALES),
+                        help='Tamanos de historial para obtener_por_usuario, separados por coma')
+    parser.add_argument('--rondas', type=int, default=7, help='Rondas medidas por benchmark')
+    parser.add_argument('--tiempo-ronda', type=float, default=0.1, help='Segundos minimos por ronda')
+    args = parser.parse_args()
+
+    historiales = tuple(int(n) for n in args.historiales.split(',') if n.strip())
+
+    base = None
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as f:
+            base = json.load(f)
+
+    print("=" * 60)
+    print("BENCHMARKS")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as directorio:
+        configurar_entorno(directorio)
+        actual = ejecutar(historiales, args.filtro, args.rondas, args.tiempo_ronda)
+
+        from app.database import db
+        db.disconnect()
+
+    if args.guardar:
+        with open(args.guardar, 'w', encoding='utf-8') as f:
+            json.dump(actual, f, indent=2, ensure_ascii=False)
+        print(f"\n✓ Linea base guardada en {args.guardar}")
+
+    if base is not None:
+        regresiones = comparar(base, actual, args.umbral)
+        if regresiones:
+            print(f"\n✗ {len(regresiones)} regresiones de mas de {args.umbral:.0%}: {', '.join(regresiones)}")
+            sys.exit(1)
+        print(f"\n✓ Sin regresiones de mas de {args.umbral:.0%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,198 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Migracion 003: Formato compacto para la tabla resultados (SQLite)
+- Las respuestas del formulario pasan de JSON a columnas tipadas
+- Recomendaciones y factores de riesgo se guardan una sola vez en
+  catalogo_mensajes y cada resultado guarda la lista de IDs
+Fecha: 2026-10-18
+"""
+
+import sys
+import os
+import json
+
+# Agregar el directorio raiz al path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from app.database import (db, SQL_CREAR_CATALOGO_MENSAJES, SQL_CREAR_RESULTADOS,
+                          SQL_CREAR_INDICE_RESULTADOS)
+from app.models import Resultado, CatalogoMensajes
+
+TAMANO_LOTE = 1000
+
+# Esquema anterior (datos_formulario, recomendaciones y factores_riesgo en JSON)
+SQL_CREAR_RESULTADOS_JSON = """
+    CREATE TABLE resultados (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        usuario_id INTEGER NOT NULL,
+        nivel_prediccion VARCHAR(20) NOT NULL,
+        puntaje_prediccion DECIMAL(5,2) NOT NULL,
+        datos_formulario TEXT NOT NULL,
+        recomendaciones TEXT NOT NULL,
+        factores_riesgo TEXT NOT NULL,
+        fecha_creacion TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (usuario_id) REFERENCES usuarios(id) ON DELETE CASCADE
+    )
+"""
+
+
+def _columnas_resultados(cursor):
+    return [fila[1] for fila in cursor.execute("PRAGMA table_info(resultados)")]
+
+
+def _tamano_base():
+    return os.path.getsize(db.db_path) if os.path.exists(db.db_path) else 0
+
+
+def _vacuum():
+    """Compacta el archivo para liberar el espacio de la tabla anterior"""
+    with db.conexion() as conn:
+        conn.execute("VACUUM")
+
+
+def ejecutar_migracion():
+    """Convierte la tabla resultados del formato JSON al formato compacto"""
+
+    print("Ejecutando migracion 003: Formato compacto para resultados...")
+    tamano_inicial = _tamano_base()
+
+    campos = [nombre for nombre, _ in Resultado.CAMPOS_FORMULARIO]
+    query_insertar = f"""
+        INSERT INTO resultados (id, fecha_creacion, usuario_id, nivel_prediccion,
+                               puntaje_prediccion, {', '.join(campos)}, datos_extra,
+                               recomendaciones_ids, factores_ids, version_modelo)
+        VALUES (?, ?, ?, ?, ?, {', '.join('?' * len(campos))}, ?, ?, ?, ?)
+    """
+
+    nuevos = {}
+    total = 0
+    try:
+        with db.transaccion() as cursor:
+            if 'datos_formulario' not in _columnas_resultados(cursor):
+                print("La tabla 'resultados' ya usa el formato compacto")
+                return True
+
+            cursor.execute("ALTER TABLE resultados RENAME TO resultados_json")
+            cursor.execute("DROP INDEX IF EXISTS idx_usuario_fecha")
+            cursor.execute(SQL_CREAR_CATALOGO_MENSAJES)
+            cursor.execute(SQL_CREAR_RESULTADOS)
+            cursor.execute(SQL_CREAR_INDICE_RESULTADOS)
+
+            lectura = cursor.connection.cursor()
+            lectura.execute("""
+                SELECT id, fecha_creacion, usuario_id, nivel_prediccion, puntaje_prediccion,
+                       datos_formulario, recomendaciones, factores_riesgo
+                FROM resultados_json
+                ORDER BY id
+            """)
+            while True:
+                filas = lectura.fetchmany(TAMANO_LOTE)
+                if not filas:
+                    break
+
+                lote = []
+                for fila in filas:
+                    params = Resultado._parametros_insercion(
+                        cursor, nuevos,
+                        usuario_id=fila['usuario_id'],
+                        nivel_prediccion=fila['nivel_prediccion'],
+                        puntaje_prediccion=fila['puntaje_prediccion'],
+                        datos_formulario=json.loads(fila['datos_formulario']),
+                        recomendaciones=json.loads(fila['recomendaciones']),
+                        factores_riesgo=json.loads(fila['factores_riesgo'])
+                    )
+                    lote.append((fila['id'], fila['fecha_creacion']) + params)
+
+                cursor.executemany(query_insertar, lote)
+                total += len(lote)
+            lectura.close()
+
+            cursor.execute("DROP TABLE resultados_json")
+    except Exception as e:
+        print(f"Error al migrar la tabla 'resultados': {e}")
+        return False
+
+    CatalogoMensajes.confirmar(nuevos)
+    _vacuum()
+
+    print(f"Filas convertidas: {total}")
+    print(f"Mensajes distintos en el catalogo: {len(nuevos)}")
+    print(f"Tamano de la base: {tamano_inicial / 1024:.1f} KB -> {_tamano_base() / 1024:.1f} KB")
+    print("Tabla 'resultados' migrada exitosamente!")
+    return True
+
+
+def revertir_migracion():
+    """Vuelve a guardar los resultados como JSON en texto"""
+
+    print("Revirtiendo migracion 003...")
+
+    # Se lee el catalogo antes de tomar el bloqueo de escritura
+    CatalogoMensajes.precargar()
+
+    total = 0
+    try:
+        with db.transaccion() as cursor:
+            if 'datos_formulario' in _columnas_resultados(cursor):
+                print("La tabla 'resultados' ya usa el formato JSON")
+                return True
+
+            cursor.execute("ALTER TABLE resultados RENAME TO resultados_compactos")
+            cursor.execute("DROP INDEX IF EXISTS idx_usuario_fecha")
+            cursor.execute(SQL_CREAR_RESULTADOS_JSON)
+            cursor.execute(SQL_CREAR_INDICE_RESULTADOS)
+
+            lectura = cursor.connection.cursor()
+            lectura.execute(f"""
+                SELECT usuario_id, {Resultado._COLUMNAS_CONSULTA}
+                FROM resultados_compactos
+                ORDER BY id
+            """)
+            while True:
+                filas = lectura.fetchmany(TAMANO_LOTE)
+                if not filas:
+                    break
+
+                lote = []
+                for fila in filas:
+                    fila = dict(fila)
+                    usuario_id = fila.pop('usuario_id')
+                    fecha = fila['fecha_creacion']
+                    resultado = Resultado._decodificar_fila(fila)
+                    lote.append((
+                        resultado['id'], usuario_id, resultado['nivel_prediccion'],
+                        resultado['puntaje_prediccion'],
+                        json.dumps(resultado['datos_formulario']),
+                        json.dumps(resultado['recomendaciones']),
+                        json.dumps(resultado['factores_riesgo']),
+                        fecha
+                    ))
+
+                cursor.executemany("""
+                    INSERT INTO resultados (id, usuario_id, nivel_prediccion, puntaje_prediccion,
+                                           datos_formulario, recomendaciones, factores_riesgo,
+                                           fecha_creacion)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """, lote)
+                total += len(lote)
+            lectura.close()
+
+            cursor.execute("DROP TABLE resultados_compactos")
+            cursor.execute("DROP TABLE IF EXISTS catalogo_mensajes")
+    except Exception as e:
+        print(f"Error al revertir la tabla 'resultados': {e}")
+        return False
+
+    # Los IDs en memoria ya no existen; una migración posterior los vuelve a crear
+    CatalogoMensajes.limpiar()
+    _vacuum()
+    print(f"Filas convertidas: {total}")
+    print("Tabla 'resultados' revertida exitosamente!")
+    return True
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == '--revert':
+        revertir_migracion()
+    else:
+        ejecutar_migracion()
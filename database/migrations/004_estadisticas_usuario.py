@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Migracion 004: Tabla estadisticas_usuario (SQLite)
+- Resumen por usuario (total, suma, minimo, maximo, ultimo puntaje y fecha)
+  que se actualiza al guardar cada resultado
+- Este script crea la tabla y la reconstruye a partir de los resultados
+  existentes; se puede volver a ejecutar en cualquier momento para recalcularla
+Fecha: 2026-10-18
+"""
+
+import sys
+import os
+
+# Agregar el directorio raiz al path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from app.database import db, SQL_CREAR_ESTADISTICAS_USUARIO
+from app.models import Resultado
+
+
+def ejecutar_migracion():
+    """Crea (si hace falta) y reconstruye la tabla estadisticas_usuario"""
+
+    print("Ejecutando migracion 004: Estadisticas por usuario...")
+
+    if db.execute_query(SQL_CREAR_ESTADISTICAS_USUARIO) is None:
+        print("Error al crear la tabla 'estadisticas_usuario'")
+        return False
+
+    usuarios = Resultado.reconstruir_estadisticas()
+    if usuarios is None:
+        return False
+
+    print(f"Usuarios con estadisticas: {usuarios}")
+    print("Tabla 'estadisticas_usuario' reconstruida exitosamente!")
+    return True
+
+
+def revertir_migracion():
+    """Elimina la tabla estadisticas_usuario"""
+
+    print("Revirtiendo migracion 004...")
+
+    if db.execute_query("DROP TABLE IF EXISTS estadisticas_usuario") is None:
+        print("Error al eliminar la tabla 'estadisticas_usuario'")
+        return False
+
+    print("Tabla 'estadisticas_usuario' eliminada exitosamente!")
+    return True
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == '--revert':
+        revertir_migracion()
+    else:
+        ejecutar_migracion()
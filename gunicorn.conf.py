@@ -0,0 +1,24 @@
+"""
+Configuracion de gunicorn
+
+Uso: gunicorn -c gunicorn.conf.py app:app
+
+Con preload_app la aplicacion se importa una sola vez en el proceso maestro;
+when_ready crea el esquema de la base de datos y carga el modelo antes de
+crear los workers, que heredan ambos por fork (copy-on-write).
+"""
+import os
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.getenv('GUNICORN_WORKERS', '2'))
+threads = int(os.getenv('GUNICORN_THREADS', '4'))
+preload_app = True
+
+
+def when_ready(server):
+    from app import precargar
+    from app.database import db
+
+    db.inicializar_esquema()
+    if not precargar():
+        server.log.warning("No se pudo cargar el modelo; se reintentara en el primer uso")
@@ -1,4 +1,6 @@
 from app import app
+from app.database import db
 
 if __name__ == "__main__":
+    db.inicializar_esquema()
     app.run(debug=True)
\ No newline at end of file
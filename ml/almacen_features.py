@@ -0,0 +1,185 @@
+"""
+Almacen de features preprocesadas
+
+Guarda la matriz X ya codificada, el objetivo y, las clases de los encoders y
+los indices de la division train/test en ml/models/features/<clave>/, un .npy
+por array. La clave combina el hash del contenido del CSV con la configuracion
+del preprocesamiento (esquema, columnas, division), asi que cualquier cambio en
+los datos o en el preprocesamiento crea una entrada nueva. Los arrays se abren
+con mmap: entrenamiento, validacion cruzada y EDA reutilizan la misma copia sin
+volver a parsear el CSV.
+"""
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+
+import numpy as np
+
+from cargador_datos import (
+    RUTA_DATASET, ESQUEMA, COLUMNAS_IGNORADAS, CATEGORICAS, COLUMNA_OBJETIVO, cargar_dataset
+)
+from versiones_modelo import hash_archivo
+
+FEATURES_DIR = Path("ml/models/features")
+
+# Cambiar al modificar el formato de lo guardado
+FORMATO = 1
+
+TEST_SIZE = 0.2
+RANDOM_STATE = 42
+
+
+def clave_features(ruta=RUTA_DATASET, test_size=TEST_SIZE, random_state=RANDOM_STATE):
+    """
+    Clave del almacen: hash del contenido del dataset + configuracion
+
+    Returns:
+        tuple: (clave, dict con el hash del dataset y la configuracion)
+    """
+    config = {
+        'formato': FORMATO,
+        'hash_dataset': hash_archivo(ruta),
+        'esquema': ESQUEMA,
+        'ignoradas': list(COLUMNAS_IGNORADAS),
+        'categoricas': list(CATEGORICAS),
+        'objetivo': COLUMNA_OBJETIVO,
+        'test_size': test_size,
+        'random_state': random_state,
+    }
+    serializada = json.dumps(config, sort_keys=True).encode('utf-8')
+    return hashlib.sha256(serializada).hexdigest()[:16], config
+
+
+class AlmacenFeatures:
+    """Features de un dataset abiertas desde el almacen (arrays con mmap)"""
+
+    def __init__(self, directorio, X, y, indices_train, indices_test, meta):
+        self.directorio = Path(directorio)
+        self.X = X
+        self.y = y
+        self.indices_train = indices_train
+        self.indices_test = indices_test
+        self.meta = meta
+
+    @property
+    def feature_names(self):
+        return self.meta['feature_names']
+
+    @classmethod
+    def abrir(cls, clave):
+        """Abre la entrada `clave`, o None si no existe o esta incompleta"""
+        directorio = FEATURES_DIR / clave
+        ruta_meta = directorio / "meta.json"
+        if not ruta_meta.exists():
+            return None
+        try:
+            with open(ruta_meta, encoding='utf-8') as f:
+                meta = json.load(f)
+            arrays = {
+                nombre: np.load(directorio / f"{nombre}.npy", mmap_mode='r')
+                for nombre in ('X', 'y', 'indices_train', 'indices_test')
+            }
+        except (OSError, ValueError) as e:
+            print(f"No se pudo abrir el almacen de features {directorio}: {e}")
+            return None
+        return cls(directorio, meta=meta, **arrays)
+
+    @classmethod
+    def guardar(cls, clave, config, X, y, label_encoders, indices_train, indices_test):
+        """
+        Escribe una entrada nueva y la devuelve abierta con mmap
+
+        Args:
+            X (pd.DataFrame): Features ya codificadas
+            y (pd.Series): Objetivo
+            label_encoders (dict): LabelEncoder por columna categorica
+            indices_train, indices_test: Posiciones de cada conjunto en X
+        """
+        FEATURES_DIR.mkdir(parents=True, exist_ok=True)
+        temporal = FEATURES_DIR / f".nueva-{os.getpid()}"
+        temporal.mkdir(exist_ok=True)
+
+        # Los arboles de sklearn entrenan en float32: es el tipo de la matriz
+        np.save(temporal / "X.npy", X.to_numpy(dtype=np.float32))
+        np.save(temporal / "y.npy", np.asarray(y, dtype=np.float64))
+        np.save(temporal / "indices_train.npy", np.asarray(indices_train, dtype=np.int64))
+        np.save(temporal / "indices_test.npy", np.asarray(indices_test, dtype=np.int64))
+
+        meta = dict(config)
+        meta['feature_names'] = list(X.columns)
+        meta['dtypes'] = {columna: str(dtype) for columna, dtype in X.dtypes.items()}
+        meta['encoders'] = {col: [str(c) for c in le.classes_] for col, le in label_encoders.items()}
+        with open(temporal / "meta.json", 'w', encoding='utf-8') as f:
+            json.dump(meta, f, indent=2, ensure_ascii=False)
+
+        # Una entrada anterior con la misma clave se reemplaza (recalculo forzado).
+        # Si otro proceso la escribe a la vez, su copia es equivalente y se conserva
+        directorio = FEATURES_DIR / clave
+        if directorio.exists():
+            shutil.rmtree(directorio, ignore_errors=True)
+        try:
+            os.rename(temporal, directorio)
+        except OSError:
+            shutil.rmtree(temporal, ignore_errors=True)
+        return cls.abrir(clave)
+
+    def label_encoders(self):
+        """LabelEncoder por columna categorica, reconstruidos desde sus clases"""
+        from sklearn.preprocessing import LabelEncoder
+
+        encoders = {}
+        for col, clases in self.meta['encoders'].items():
+            le = LabelEncoder()
+            le.classes_ = np.asarray(clases, dtype=object)
+            encoders[col] = le
+        return encoders
+
+    def dataframes(self):
+        """X como DataFrame (con nombres de columnas) e y como Series"""
+        import pandas as pd
+
+        X = pd.DataFrame(self.X, columns=self.feature_names, copy=False)
+        y = pd.Series(self.y, name=COLUMNA_OBJETIVO, copy=False)
+        return X, y
+
+    def division(self):
+        """(X_train, X_test, y_train, y_test) segun los indices guardados"""
+        X, y = self.dataframes()
+        return (X.iloc[self.indices_train], X.iloc[self.indices_test],
+                y.iloc[self.indices_train], y.iloc[self.indices_test])
+
+    def dataset(self):
+        """
+        DataFrame como el de cargar_dataset: categorias decodificadas y cada
+        columna con su tipo original
+        """
+        import pandas as pd
+
+        X, y = self.dataframes()
+        columnas = {}
+        for nombre in self.feature_names:
+            if nombre in self.meta['encoders']:
+                columnas[nombre] = pd.Categorical.from_codes(
+                    X[nombre].to_numpy(dtype=np.int8), self.meta['encoders'][nombre]
+                )
+            else:
+                columnas[nombre] = X[nombre].astype(self.meta['dtypes'][nombre])
+        columnas[COLUMNA_OBJETIVO] = y
+        return pd.DataFrame(columnas)
+
+
+def cargar_dataset_o_almacen(ruta=RUTA_DATASET):
+    """
+    Dataset para analisis: desde el almacen si ya hay una entrada para este
+    contenido y configuracion, si no parseando el CSV
+
+    Returns:
+        tuple: (pd.DataFrame, bool indicando si vino del almacen)
+    """
+    clave, _ = clave_features(ruta)
+    almacen = AlmacenFeatures.abrir(clave)
+    if almacen is not None:
+        return almacen.dataset(), True
+    return cargar_dataset(ruta), False
@@ -0,0 +1,232 @@
+"""
+Bosque Random Forest aplanado en arrays NumPy contiguos
+Formato compartido entre el entrenamiento (exportacion) y la prediccion (inferencia)
+"""
+from pathlib import Path
+
+import numpy as np
+
+# Valor que sklearn usa en children_left/right para marcar una hoja
+HOJA = -1
+
+# Filas recorridas a la vez; bloques pequenos mantienen los indices en cache
+TAMANO_BLOQUE = 64
+
+
+def aplanar_bosque(modelo):
+    """
+    Concatena los nodos de todos los arboles de un RandomForestRegressor
+
+    Los indices de hijos se desplazan para apuntar a posiciones globales,
+    de modo que todo el bosque queda en unos pocos arrays planos.
+
+    Args:
+        modelo: RandomForestRegressor entrenado
+
+    Returns:
+        dict con los arrays del bosque (ver BosquePlano)
+    """
+    izquierdo, derecho, feature, umbral, valor, raices = [], [], [], [], [], []
+    faltantes_izquierda = []
+    desplazamiento = 0
+    profundidad = 0
+
+    for estimador in modelo.estimators_:
+        arbol = estimador.tree_
+        izq = arbol.children_left.astype(np.int32)
+        der = arbol.children_right.astype(np.int32)
+
+        raices.append(desplazamiento)
+        izquierdo.append(np.where(izq == HOJA, HOJA, izq + desplazamiento))
+        derecho.append(np.where(der == HOJA, HOJA, der + desplazamiento))
+        feature.append(arbol.feature.astype(np.int32))
+        umbral.append(arbol.threshold.astype(np.float64))
+        valor.append(arbol.value[:, 0, 0].astype(np.float64))
+        # Direccion de los NaN en cada nodo (sklearn >= 1.3)
+        faltantes_izquierda.append(
+            np.asarray(getattr(arbol, 'missing_go_to_left', np.ones(arbol.node_count)), dtype=np.uint8)
+        )
+
+        desplazamiento += arbol.node_count
+        profundidad = max(profundidad, arbol.max_depth)
+
+    return {
+        'izquierdo': np.ascontiguousarray(np.concatenate(izquierdo), dtype=np.int32),
+        'derecho': np.ascontiguousarray(np.concatenate(derecho), dtype=np.int32),
+        'feature': np.ascontiguousarray(np.concatenate(feature), dtype=np.int32),
+        'umbral': np.ascontiguousarray(np.concatenate(umbral), dtype=np.float64),
+        'valor': np.ascontiguousarray(np.concatenate(valor), dtype=np.float64),
+        'faltantes_izquierda': np.concatenate(faltantes_izquierda),
+        'raices': np.asarray(raices, dtype=np.int32),
+        'profundidad': np.int32(profundidad),
+        'n_features': np.int32(modelo.n_features_in_),
+    }
+
+
+def guardar_bosque_plano(modelo, ruta):
+    """Aplana el bosque y lo guarda como archivo .npz sin comprimir"""
+    arrays = aplanar_bosque(modelo)
+    np.savez(ruta, **arrays)
+    return arrays
+
+
+def compilar_bosque(izquierdo, derecho, feature, umbral, faltantes_izquierda):
+    """
+    Arrays internos del recorrido de BosquePlano.predict
+
+    Las hojas apuntan a si mismas con umbral infinito, asi el recorrido
+    avanza siempre un nivel completo sin mascaras. Los hijos se intercalan
+    en un solo array: hijos[2*i] es el izquierdo y hijos[2*i + 1] el derecho.
+    """
+    hojas = izquierdo == HOJA
+    indices = np.arange(len(izquierdo), dtype=np.int64)
+
+    hijos = np.empty(2 * len(izquierdo), dtype=np.int64)
+    hijos[0::2] = np.where(hojas, indices, izquierdo)
+    hijos[1::2] = np.where(hojas, indices, derecho)
+
+    return {
+        'hijos': hijos,
+        'feature_recorrido': np.where(hojas, 0, feature).astype(np.int64),
+        'umbral_recorrido': np.where(hojas, np.inf, umbral),
+        'faltantes_derecha': faltantes_izquierda == 0,
+    }
+
+
+def guardar_bosque_mmap(modelo, directorio):
+    """
+    Guarda el bosque ya compilado como un archivo .npy por array
+
+    A diferencia del .npz, cada .npy se puede abrir con np.load(mmap_mode='r'):
+    los procesos que cargan el mismo directorio comparten las paginas del
+    archivo en la cache del sistema en lugar de tener cada uno su copia.
+    """
+    directorio = Path(directorio)
+    directorio.mkdir(parents=True, exist_ok=True)
+
+    arrays = aplanar_bosque(modelo)
+    compilado = compilar_bosque(arrays['izquierdo'], arrays['derecho'], arrays['feature'],
+                                arrays['umbral'], arrays['faltantes_izquierda'])
+    compilado['valor'] = arrays['valor']
+    compilado['raices'] = arrays['raices'].astype(np.int64)
+    compilado['dimensiones'] = np.array([arrays['profundidad'], arrays['n_features']], dtype=np.int64)
+
+    for nombre, array in compilado.items():
+        np.save(directorio / f"{nombre}.npy", np.ascontiguousarray(array))
+    return compilado
+
+
+class BosquePlano:
+    """
+    Motor de inferencia sobre un bosque aplanado
+
+    Recorre todos los arboles a la vez para todas las filas: en cada paso
+    avanza un nivel en la matriz (filas x arboles) de nodos actuales.
+    Expone predict(X) con la misma semantica que RandomForestRegressor.predict.
+    """
+
+    def __init__(self, izquierdo, derecho, feature, umbral, valor, raices,
+                 profundidad, n_features, faltantes_izquierda=None):
+        self.izquierdo = izquierdo
+        self.derecho = derecho
+        self.feature = feature
+        self.umbral = umbral
+        self.valor = valor
+        if faltantes_izquierda is None:
+            faltantes_izquierda = np.ones(len(izquierdo), dtype=np.uint8)
+        self.faltantes_izquierda = faltantes_izquierda
+        self.raices = raices
+        self.profundidad = int(profundidad)
+        self.n_features_in_ = int(n_features)
+        self.n_estimators = len(raices)
+        self._compilar()
+
+    def _compilar(self):
+        """Prepara los arrays internos del recorrido (ver compilar_bosque)"""
+        compilado = compilar_bosque(self.izquierdo, self.derecho, self.feature,
+                                    self.umbral, self.faltantes_izquierda)
+        self._asignar_compilado(compilado)
+
+    def _asignar_compilado(self, compilado):
+        self._hijos = compilado['hijos']
+        self._feature = compilado['feature_recorrido']
+        self._umbral = compilado['umbral_recorrido']
+        self._faltantes_derecha = compilado['faltantes_derecha']
+
+    @classmethod
+    def cargar(cls, ruta):
+        """Carga un bosque guardado con guardar_bosque_plano"""
+        with np.load(ruta) as datos:
+            return cls(**{clave: datos[clave] for clave in datos.files})
+
+    @classmethod
+    def cargar_mmap(cls, directorio):
+        """
+        Abre un bosque guardado con guardar_bosque_mmap sin copiarlo a memoria
+
+        Solo se cargan los arrays del recorrido; izquierdo, derecho, feature y
+        umbral quedan en None.
+        """
+        directorio = Path(directorio)
+        arrays = {ruta.stem: np.load(ruta, mmap_mode='r') for ruta in directorio.glob('*.npy')}
+
+        bosque = cls.__new__(cls)
+        bosque.izquierdo = bosque.derecho = bosque.feature = bosque.umbral = None
+        bosque.faltantes_izquierda = None
+        bosque.valor = arrays['valor']
+        bosque.raices = arrays['raices']
+        profundidad, n_features = (int(v) for v in arrays['dimensiones'])
+        bosque.profundidad = profundidad
+        bosque.n_features_in_ = n_features
+        bosque.n_estimators = len(bosque.raices)
+        bosque._asignar_compilado(arrays)
+        return bosque
+
+    @property
+    def n_nodos(self):
+        return len(self.valor)
+
+    def predict(self, X):
+        """
+        Predice el promedio de las hojas alcanzadas en cada arbol
+
+        Args:
+            X: array (n_filas, n_features)
+
+        Returns:
+            np.ndarray float64 de forma (n_filas,)
+        """
+        # sklearn compara en float32 contra umbrales float64; se replica
+        # el mismo redondeo para llegar exactamente a las mismas hojas
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.shape[1] != self.n_features_in_:
+            raise ValueError(
+                f"X tiene {X.shape[1]} features, el bosque espera {self.n_features_in_}"
+            )
+
+        resultado = np.empty(X.shape[0], dtype=np.float64)
+        for inicio in range(0, X.shape[0], TAMANO_BLOQUE):
+            bloque = X[inicio:inicio + TAMANO_BLOQUE]
+            resultado[inicio:inicio + len(bloque)] = self._predecir_bloque(bloque)
+        return resultado
+
+    def _predecir_bloque(self, X):
+        """Recorre el bosque para un bloque de filas float32"""
+        con_faltantes = bool(np.isnan(X).any())
+
+        # Indices planos para leer X[fila, feature] con una sola indexacion
+        base = (np.arange(X.shape[0]) * self.n_features_in_)[:, None]
+        X = np.ascontiguousarray(X).ravel()
+        nodos = np.repeat(self.raices[None, :].astype(np.int64), base.shape[0], axis=0)
+
+        for _ in range(self.profundidad):
+            x = X[base + self._feature[nodos]]
+            # ~(x <= umbral) manda los NaN a la derecha; se corrigen abajo
+            a_la_derecha = ~(x <= self._umbral[nodos])
+            if con_faltantes:
+                a_la_derecha = np.where(np.isnan(x), self._faltantes_derecha[nodos], a_la_derecha)
+            nodos = self._hijos[2 * nodos + a_la_derecha]
+
+        return self.valor[nodos].sum(axis=1) / self.n_estimators
@@ -0,0 +1,238 @@
+"""
+Busqueda de hiperparametros del Random Forest
+
+Evalua candidatos en paralelo (un proceso por nucleo) con dos objetivos:
+  - precision: R² promedio de validacion cruzada
+  - costo de servir: latencia de predict() en el motor que usa predict.py
+    (BosquePlano), con una sola fila y con un lote
+Estrategias: rejilla completa, muestreo aleatorio y halving sucesivo (todos los
+candidatos con pocas filas; los mejores pasan a la siguiente ronda con mas).
+El reporte guarda todos los candidatos y el frente de Pareto entre R² y latencia.
+"""
+import itertools
+import json
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+from bosque_plano import BosquePlano, aplanar_bosque
+
+ESPACIO_BUSQUEDA = {
+    'n_estimators': [25, 50, 100, 200],
+    'max_depth': [6, 10, 15, None],
+    'min_samples_split': [2, 5, 10],
+    'min_samples_leaf': [1, 2, 4],
+}
+
+ESTRATEGIAS = ('rejilla', 'aleatoria', 'sucesiva')
+
+RUTA_REPORTE = Path("ml/models/busqueda_hiperparametros.json")
+
+# Filas del lote con que se mide la latencia de predict_lote
+FILAS_LOTE = 256
+
+# Datos de entrenamiento de cada proceso, recibidos una sola vez al iniciarlo
+_X = None
+_y = None
+
+
+def generar_candidatos(estrategia, espacio=ESPACIO_BUSQUEDA, n_candidatos=20, semilla=42):
+    """
+    Combinaciones de hiperparametros a evaluar
+
+    Args:
+        estrategia (str): 'rejilla' (todas) o 'aleatoria'/'sucesiva' (muestra)
+        n_candidatos (int): Tamano de la muestra si no es rejilla
+
+    Returns:
+        list de dicts de hiperparametros
+    """
+    claves = list(espacio)
+    todas = [dict(zip(claves, valores)) for valores in itertools.product(*espacio.values())]
+    if estrategia == 'rejilla' or n_candidatos >= len(todas):
+        return todas
+    return random.Random(semilla).sample(todas, n_candidatos)
+
+
+def frente_pareto(resultados, objetivo_latencia='latencia_fila_ms'):
+    """
+    Candidatos no dominados: ningun otro tiene mayor R² y menor latencia a la vez
+
+    Returns:
+        list ordenada de mas rapido a mas lento
+    """
+    ordenados = sorted(resultados, key=lambda r: (r[objetivo_latencia], -r['cv_r2']))
+    frente, mejor_r2 = [], -np.inf
+    for resultado in ordenados:
+        if resultado['cv_r2'] > mejor_r2:
+            frente.append(resultado)
+            mejor_r2 = resultado['cv_r2']
+    return frente
+
+
+def elegir_candidato(frente, tolerancia_r2=0.005):
+    """
+    El candidato mas rapido del frente cuyo R² esta a `tolerancia_r2` del mejor
+    """
+    mejor_r2 = max(r['cv_r2'] for r in frente)
+    for resultado in frente:
+        if resultado['cv_r2'] >= mejor_r2 - tolerancia_r2:
+            return resultado
+
+
+def _iniciar_worker(X, y):
+    global _X, _y
+    _X, _y = X, y
+
+
+def _medir_latencia(bosque, X, repeticiones):
+    """Mediana en ms de predict() sobre X"""
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        bosque.predict(X)
+        tiempos.append(time.perf_counter() - inicio)
+    return float(np.median(tiempos)) * 1000
+
+
+def evaluar_candidato(parametros, n_filas=None, cv=5, semilla=42):
+    """
+    Valida un candidato y mide su latencia de inferencia (se ejecuta en un worker)
+
+    Args:
+        parametros (dict): Hiperparametros de RandomForestRegressor
+        n_filas (int): Filas de entrenamiento a usar (halving); None = todas
+
+    Returns:
+        dict con parametros, cv_r2, cv_std, latencias, nodos y tiempo de entrenamiento
+    """
+    from sklearn.ensemble import RandomForestRegressor
+    from sklearn.model_selection import cross_val_score
+
+    X, y = _X, _y
+    if n_filas is not None and n_filas < len(X):
+        indices = np.random.default_rng(semilla).permutation(len(X))[:n_filas]
+        X, y = X[indices], y[indices]
+
+    # Un solo hilo por candidato: el paralelismo esta en el pool de procesos
+    modelo = RandomForestRegressor(random_state=semilla, n_jobs=1, **parametros)
+    scores = cross_val_score(modelo, X, y, cv=cv, scoring='r2', n_jobs=1)
+
+    inicio = time.perf_counter()
+    modelo.fit(X, y)
+    segundos_entrenamiento = time.perf_counter() - inicio
+
+    bosque = BosquePlano(**aplanar_bosque(modelo))
+    lote = _X[np.arange(FILAS_LOTE) % len(_X)]
+    bosque.predict(lote)
+
+    return {
+        'parametros': parametros,
+        'filas': len(X),
+        'cv_r2': float(scores.mean()),
+        'cv_std': float(scores.std()),
+        'latencia_fila_ms': _medir_latencia(bosque, _X[:1], repeticiones=200),
+        'latencia_lote_ms': _medir_latencia(bosque, lote, repeticiones=20),
+        'nodos': int(bosque.n_nodos),
+        'entrenamiento_s': segundos_entrenamiento,
+    }
+
+
+class BuscadorHiperparametros:
+    """Ejecuta una estrategia de busqueda sobre un pool de procesos"""
+
+    def __init__(self, estrategia='sucesiva', espacio=ESPACIO_BUSQUEDA, n_candidatos=20,
+                 cv=5, workers=None, factor=3, semilla=42):
+        """
+        Args:
+            estrategia (str): Una de ESTRATEGIAS
+            n_candidatos (int): Candidatos muestreados (aleatoria y sucesiva)
+            workers (int): Procesos del pool; None = todos los nucleos
+            factor (int): En halving, fraccion 1/factor que pasa de ronda y
+                multiplicador de filas entre rondas
+        """
+        if estrategia not in ESTRATEGIAS:
+            raise ValueError(f"Estrategia desconocida: {estrategia}")
+        self.estrategia = estrategia
+        self.espacio = espacio
+        self.n_candidatos = n_candidatos
+        self.cv = cv
+        self.workers = workers or os.cpu_count() or 1
+        self.factor = factor
+        self.semilla = semilla
+        self.rondas = []
+
+    def buscar(self, X, y):
+        """
+        Evalua los candidatos y devuelve los resultados de la ultima ronda
+
+        Args:
+            X, y: Datos de entrenamiento (no incluir el conjunto de prueba)
+
+        Returns:
+            list de dicts (ver evaluar_candidato)
+        """
+        X = np.ascontiguousarray(X, dtype=np.float64)
+        y = np.ascontiguousarray(y, dtype=np.float64)
+        candidatos = generar_candidatos(self.estrategia, self.espacio, self.n_candidatos, self.semilla)
+
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=_iniciar_worker,
+                                 initargs=(X, y)) as pool:
+            if self.estrategia != 'sucesiva':
+                return self._ronda(pool, candidatos, None)
+
+            # Filas por ronda, multiplicadas por `factor`; la ultima usa todo el conjunto
+            n_rondas = max(1, int(np.ceil(np.log(len(candidatos)) / np.log(self.factor))))
+            filas_por_ronda = [max(self.cv * 20, len(X) // self.factor ** k)
+                               for k in reversed(range(n_rondas))]
+            for ronda, n_filas in enumerate(filas_por_ronda):
+                resultados = self._ronda(pool, candidatos, n_filas)
+                if ronda < n_rondas - 1:
+                    candidatos = self._sobrevivientes(resultados)
+            return resultados
+
+    def _sobrevivientes(self, resultados):
+        """
+        Los mejores 1/factor por R² mas el frente de Pareto de la ronda, para
+        que los candidatos rapidos lleguen a evaluarse con todas las filas
+        """
+        mejores = sorted(resultados, key=lambda r: -r['cv_r2'])[:max(1, len(resultados) // self.factor)]
+        elegidos = {id(r): r for r in mejores + frente_pareto(resultados)}
+        return [r['parametros'] for r in elegidos.values()]
+
+    def _ronda(self, pool, candidatos, n_filas):
+        inicio = time.perf_counter()
+        resultados = list(pool.map(evaluar_candidato, candidatos, itertools.repeat(n_filas),
+                                   itertools.repeat(self.cv), itertools.repeat(self.semilla)))
+        self.rondas.append({
+            'candidatos': len(candidatos),
+            'filas': resultados[0]['filas'] if resultados else 0,
+            'segundos': time.perf_counter() - inicio,
+        })
+        print(f"  Ronda {len(self.rondas)}: {len(candidatos)} candidatos, "
+              f"{self.rondas[-1]['filas']} filas, {self.rondas[-1]['segundos']:.1f}s")
+        return resultados
+
+
+def escribir_reporte(resultados, frente, elegido, buscador, ruta=RUTA_REPORTE):
+    """Guarda todos los candidatos, el frente de Pareto y el elegido en JSON"""
+    ruta = Path(ruta)
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    reporte = {
+        'creado': datetime.now().isoformat(timespec='seconds'),
+        'estrategia': buscador.estrategia,
+        'workers': buscador.workers,
+        'cv': buscador.cv,
+        'rondas': buscador.rondas,
+        'elegido': elegido,
+        'pareto': frente,
+        'candidatos': sorted(resultados, key=lambda r: -r['cv_r2']),
+    }
+    with open(ruta, 'w', encoding='utf-8') as f:
+        json.dump(reporte, f, indent=2, ensure_ascii=False)
+    return ruta
@@ -0,0 +1,84 @@
+"""
+Cache LRU en proceso para resultados de prediccion
+Limita el numero de entradas y su antiguedad (TTL) y lleva contadores de uso
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class CacheLRU:
+    """
+    Cache LRU segura entre hilos con tamano maximo y TTL
+
+    Un tamano_maximo de 0 desactiva la cache: obtener() siempre falla y
+    guardar() no almacena nada. Un ttl de 0 o negativo no vence las entradas.
+    """
+
+    def __init__(self, tamano_maximo=1024, ttl=600):
+        self.tamano_maximo = int(tamano_maximo)
+        self.ttl = float(ttl)
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        self.desalojos = 0
+        self.expirados = 0
+        self.invalidaciones = 0
+
+    @property
+    def activa(self):
+        return self.tamano_maximo > 0
+
+    def obtener(self, clave):
+        """Devuelve el valor guardado o None si no existe o ya expiro"""
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                self.fallos += 1
+                return None
+
+            valor, expira = entrada
+            if self.ttl > 0 and expira < time.monotonic():
+                del self._entradas[clave]
+                self.expirados += 1
+                self.fallos += 1
+                return None
+
+            self._entradas.move_to_end(clave)
+            self.aciertos += 1
+            return valor
+
+    def guardar(self, clave, valor):
+        """Guarda un valor desalojando las entradas menos usadas si hace falta"""
+        if not self.activa:
+            return
+
+        with self._lock:
+            self._entradas[clave] = (valor, time.monotonic() + self.ttl)
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.tamano_maximo:
+                self._entradas.popitem(last=False)
+                self.desalojos += 1
+
+    def limpiar(self):
+        """Elimina todas las entradas (por ejemplo al cargar un modelo nuevo)"""
+        with self._lock:
+            self._entradas.clear()
+            self.invalidaciones += 1
+
+    def estadisticas(self):
+        """Contadores de uso de la cache"""
+        with self._lock:
+            consultas = self.aciertos + self.fallos
+            return {
+                'tamano': len(self._entradas),
+                'tamano_maximo': self.tamano_maximo,
+                'ttl': self.ttl,
+                'aciertos': self.aciertos,
+                'fallos': self.fallos,
+                'desalojos': self.desalojos,
+                'expirados': self.expirados,
+                'invalidaciones': self.invalidaciones,
+                'tasa_aciertos': self.aciertos / consultas if consultas else 0.0,
+            }
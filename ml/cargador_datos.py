@@ -0,0 +1,164 @@
+"""
+Carga del dataset de entrenamiento por bloques con tipos explicitos
+
+Lee el CSV en bloques de `tamano_bloque` filas con un esquema fijo (categorias,
+int8/int16/float32 segun el rango de cada columna) y sin parsear las columnas
+que el modelo no usa (ID, Name, Location). Opcionalmente guarda el resultado en
+una cache (Parquet o un .npy por columna) que se reutiliza mientras el CSV no
+cambie; la cache .npy se abre con mmap, sin copiarla a memoria.
+"""
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+RUTA_DATASET = Path("app/static/dataset/teen_phone_addiction_dataset.csv")
+CACHE_DIR = Path("ml/models/cache_datos")
+
+COLUMNA_OBJETIVO = 'Addiction_Level'
+COLUMNAS_IGNORADAS = ('ID', 'Name', 'Location')
+CATEGORICAS = ('Gender', 'School_Grade', 'Phone_Usage_Purpose')
+
+# Tipos segun el rango de cada columna en las encuestas. Los arboles de sklearn
+# entrenan en float32, asi que no se pierde precision en las features; el
+# objetivo se mantiene en float64 para no alterar los valores de las hojas
+ESQUEMA = {
+    'Age': 'int8',
+    'Gender': 'category',
+    'School_Grade': 'category',
+    'Daily_Usage_Hours': 'float32',
+    'Sleep_Hours': 'float32',
+    'Academic_Performance': 'int8',
+    'Social_Interactions': 'int8',
+    'Exercise_Hours': 'float32',
+    'Anxiety_Level': 'int8',
+    'Depression_Level': 'int8',
+    'Self_Esteem': 'int8',
+    'Parental_Control': 'int8',
+    'Screen_Time_Before_Bed': 'float32',
+    'Phone_Checks_Per_Day': 'int16',
+    'Apps_Used_Daily': 'int8',
+    'Time_on_Social_Media': 'float32',
+    'Time_on_Gaming': 'float32',
+    'Time_on_Education': 'float32',
+    'Phone_Usage_Purpose': 'category',
+    'Family_Communication': 'int8',
+    'Weekend_Usage_Hours': 'float32',
+    COLUMNA_OBJETIVO: 'float64',
+}
+
+FORMATOS_CACHE = ('parquet', 'npy')
+
+
+def _leer_csv(ruta, tamano_bloque):
+    """Lee el CSV por bloques y une las columnas al final"""
+    bloques = pd.read_csv(
+        ruta,
+        usecols=lambda columna: columna not in COLUMNAS_IGNORADAS,
+        dtype=ESQUEMA,
+        chunksize=tamano_bloque,
+    )
+
+    # Se acumula cada columna por separado: al unirlas solo existe una copia
+    # de la columna que se esta concatenando, no dos del DataFrame entero
+    columnas = {}
+    for bloque in bloques:
+        for nombre, serie in bloque.items():
+            columnas.setdefault(nombre, []).append(serie.array)
+        del bloque
+
+    datos = {}
+    for nombre in list(columnas):
+        partes = columnas.pop(nombre)
+        if ESQUEMA.get(nombre) == 'category':
+            # Cada bloque trae sus propias categorias; se unen y se ordenan
+            # como las ordenaria LabelEncoder
+            unido = union_categoricals(partes, sort_categories=True)
+            datos[nombre] = pd.Categorical.from_codes(unido.codes, unido.categories)
+        else:
+            datos[nombre] = np.concatenate([np.asarray(parte) for parte in partes])
+
+    return pd.DataFrame(datos, copy=False)
+
+
+def _ruta_cache(ruta, formato):
+    nombre = Path(ruta).stem
+    return CACHE_DIR / (f"{nombre}.parquet" if formato == 'parquet' else nombre)
+
+
+def _cache_vigente(ruta_cache, ruta):
+    return ruta_cache.exists() and ruta_cache.stat().st_mtime >= Path(ruta).stat().st_mtime
+
+
+def _guardar_npy(df, directorio):
+    """Un .npy por columna; las categoricas se guardan como codigos"""
+    directorio.mkdir(parents=True, exist_ok=True)
+    categorias = {}
+    for nombre, serie in df.items():
+        if isinstance(serie.dtype, pd.CategoricalDtype):
+            np.save(directorio / f"{nombre}.npy", serie.cat.codes.to_numpy())
+            categorias[nombre] = [str(c) for c in serie.cat.categories]
+        else:
+            np.save(directorio / f"{nombre}.npy", serie.to_numpy())
+    with open(directorio / "columnas.json", 'w', encoding='utf-8') as f:
+        json.dump({'columnas': list(df.columns), 'categorias': categorias}, f, ensure_ascii=False)
+
+
+def _cargar_npy(directorio):
+    with open(directorio / "columnas.json", encoding='utf-8') as f:
+        meta = json.load(f)
+    datos = {}
+    for nombre in meta['columnas']:
+        array = np.load(directorio / f"{nombre}.npy", mmap_mode='r')
+        if nombre in meta['categorias']:
+            datos[nombre] = pd.Categorical.from_codes(array, meta['categorias'][nombre])
+        else:
+            datos[nombre] = array
+    return pd.DataFrame(datos, copy=False)
+
+
+def cargar_dataset(ruta=RUTA_DATASET, tamano_bloque=100_000, cache=None):
+    """
+    Carga el dataset con el esquema de ESQUEMA, sin las columnas ignoradas
+
+    Args:
+        ruta: CSV de la encuesta
+        tamano_bloque (int): Filas por bloque de lectura
+        cache (str): 'parquet', 'npy' o None para no usar cache
+
+    Returns:
+        pd.DataFrame con las features y el objetivo
+    """
+    if cache is not None and cache not in FORMATOS_CACHE:
+        raise ValueError(f"Formato de cache desconocido: {cache}")
+
+    ruta_cache = _ruta_cache(ruta, cache) if cache else None
+    if ruta_cache is not None and _cache_vigente(ruta_cache, ruta):
+        try:
+            if cache == 'parquet':
+                return pd.read_parquet(ruta_cache)
+            return _cargar_npy(ruta_cache)
+        except Exception as e:
+            print(f"No se pudo leer la cache {ruta_cache}: {e}")
+
+    df = _leer_csv(ruta, tamano_bloque)
+
+    if ruta_cache is not None:
+        try:
+            if cache == 'parquet':
+                CACHE_DIR.mkdir(parents=True, exist_ok=True)
+                df.to_parquet(ruta_cache, index=False)
+            else:
+                _guardar_npy(df, ruta_cache)
+        except ImportError as e:
+            # Parquet necesita pyarrow o fastparquet
+            print(f"No se pudo guardar la cache {ruta_cache}: {e}")
+
+    return df
+
+
+def memoria_mb(df):
+    """Memoria ocupada por el DataFrame en MB"""
+    return df.memory_usage(deep=True).sum() / 1024 ** 2
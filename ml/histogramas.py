@@ -0,0 +1,126 @@
+"""
+Histograma de cubetas fijas para metricas de latencia y tamano
+"""
+import bisect
+import threading
+import time
+
+
+class Histograma:
+    """
+    Cuenta observaciones por cubetas con limite superior inclusivo (<=)
+
+    La ultima cubeta (sin limite) recoge los valores mayores que el ultimo limite.
+    Es seguro usarlo desde varios hilos.
+    """
+
+    def __init__(self, limites):
+        self.limites = sorted(limites)
+        self.conteos = [0] * (len(self.limites) + 1)
+        self.total = 0
+        self.suma = 0.0
+        self.maximo = None
+        self._lock = threading.Lock()
+
+    def observar(self, valor):
+        indice = bisect.bisect_left(self.limites, valor)
+        with self._lock:
+            self.conteos[indice] += 1
+            self.total += 1
+            self.suma += valor
+            if self.maximo is None or valor > self.maximo:
+                self.maximo = valor
+
+    def percentil(self, p):
+        """
+        Limite superior de la cubeta donde cae el percentil p (0-100)
+
+        Devuelve el maximo observado si cae en la ultima cubeta y None si no
+        hay observaciones.
+        """
+        with self._lock:
+            if not self.total:
+                return None
+            objetivo = self.total * p / 100.0
+            acumulado = 0
+            for limite, conteo in zip(self.limites, self.conteos):
+                acumulado += conteo
+                if acumulado >= objetivo:
+                    return limite
+            return self.maximo
+
+    def resumen(self):
+        """Conteos por cubeta y estadisticas basicas"""
+        p50, p95, p99 = self.percentil(50), self.percentil(95), self.percentil(99)
+        with self._lock:
+            cubetas = {str(limite): conteo for limite, conteo in zip(self.limites, self.conteos)}
+            cubetas['+Inf'] = self.conteos[-1]
+            return {
+                'cubetas': cubetas,
+                'total': self.total,
+                'suma': self.suma,
+                'promedio': self.suma / self.total if self.total else 0.0,
+                'maximo': self.maximo,
+                'p50': p50,
+                'p95': p95,
+                'p99': p99,
+            }
+
+    def sumar(self, otro):
+        """Agrega las observaciones de otro histograma con los mismos limites"""
+        with otro._lock:
+            conteos, total, suma, maximo = list(otro.conteos), otro.total, otro.suma, otro.maximo
+        with self._lock:
+            self.conteos = [a + b for a, b in zip(self.conteos, conteos)]
+            self.total += total
+            self.suma += suma
+            if maximo is not None and (self.maximo is None or maximo > self.maximo):
+                self.maximo = maximo
+
+
+class HistogramaDeslizante:
+    """
+    Histograma de las observaciones de los ultimos `ventana` segundos
+
+    La ventana se reparte en `partes` histogramas consecutivos; cuando el
+    tiempo avanza se reemplaza el mas antiguo, asi que el resumen cubre entre
+    ventana * (partes - 1) / partes y ventana segundos.
+    """
+
+    def __init__(self, limites, ventana=60.0, partes=6, reloj=time.monotonic):
+        self.limites = sorted(limites)
+        self.ventana = ventana
+        self.partes = partes
+        self._duracion_parte = ventana / partes
+        self._reloj = reloj
+        # (periodo, histograma) por posicion; periodo = instante // duracion de parte
+        self._histogramas = [(None, None)] * partes
+        self._lock = threading.Lock()
+
+    def observar(self, valor):
+        periodo = int(self._reloj() // self._duracion_parte)
+        posicion = periodo % self.partes
+        with self._lock:
+            actual, histograma = self._histogramas[posicion]
+            if actual != periodo:
+                histograma = Histograma(self.limites)
+                self._histogramas[posicion] = (periodo, histograma)
+        histograma.observar(valor)
+
+    def combinado(self):
+        """Histograma con las observaciones dentro de la ventana"""
+        periodo = int(self._reloj() // self._duracion_parte)
+        combinado = Histograma(self.limites)
+        with self._lock:
+            vigentes = [h for p, h in self._histogramas if p is not None and periodo - p < self.partes]
+        for histograma in vigentes:
+            combinado.sumar(histograma)
+        return combinado
+
+    def percentil(self, p):
+        return self.combinado().percentil(p)
+
+    def resumen(self):
+        resumen = self.combinado().resumen()
+        resumen['ventana'] = self.ventana
+        return resumen
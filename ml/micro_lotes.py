@@ -0,0 +1,182 @@
+"""
+Agrupador de predicciones concurrentes en micro-lotes
+
+Los hilos que llaman a predecir() dejan su formulario en una cola; un hilo
+de fondo junta las solicitudes que llegan dentro de una ventana corta (o hasta
+un tamano maximo), hace una sola llamada a predecir_lote y entrega a cada hilo
+su resultado.
+
+El tiempo del modelo se mide en el hilo de fondo con una traza propia del
+lote y se suma a la traza de cada hilo que esperaba ese lote.
+"""
+import os
+import queue
+import threading
+import time
+
+from histogramas import Histograma
+
+# Cubetas de los histogramas
+LIMITES_TAMANO_LOTE = [1, 2, 4, 8, 16, 32, 64, 128]
+LIMITES_ESPERA = [0.0005, 0.001, 0.002, 0.003, 0.005, 0.01, 0.025, 0.05, 0.1]
+
+
+class _Solicitud:
+    """Formulario en espera y el resultado que le entregara el hilo de fondo"""
+
+    __slots__ = ('datos_formulario', 'datos_cuenta', 'llegada', 'listo',
+                 'resultado', 'error', 'segundos_modelo')
+
+    def __init__(self, datos_formulario, datos_cuenta):
+        self.datos_formulario = datos_formulario
+        self.datos_cuenta = datos_cuenta
+        self.llegada = time.perf_counter()
+        self.listo = threading.Event()
+        self.resultado = None
+        self.error = None
+        self.segundos_modelo = 0.0
+
+
+class MicroLoteador:
+    """
+    Expone predecir() con la misma firma que ProcrastinationPredictor,
+    agrupando las llamadas concurrentes en llamadas a predecir_lote
+    """
+
+    def __init__(self, predictor, ventana=0.003, tamano_maximo=32):
+        """
+        Args:
+            predictor: ProcrastinationPredictor con predecir y predecir_lote
+            ventana (float): Segundos que se espera por mas solicitudes desde
+                que llega la primera del lote
+            tamano_maximo (int): Solicitudes maximas por lote
+        """
+        self.predictor = predictor
+        self.ventana = ventana
+        self.tamano_maximo = tamano_maximo
+
+        self._cola = queue.Queue()
+        self._hilo = None
+        self._lock = threading.Lock()
+
+        self.lotes = 0
+        self.solicitudes = 0
+        self.errores_lote = 0
+        self.histograma_tamano = Histograma(LIMITES_TAMANO_LOTE)
+        self.histograma_espera = Histograma(LIMITES_ESPERA)
+
+    @classmethod
+    def desde_entorno(cls, predictor):
+        """Crea el agrupador segun las variables de entorno, o None si esta desactivado"""
+        if os.getenv('PREDICCION_MICROLOTES', '0').lower() not in ('1', 'true'):
+            return None
+        return cls(
+            predictor,
+            ventana=float(os.getenv('PREDICCION_MICROLOTES_VENTANA_MS', 3)) / 1000.0,
+            tamano_maximo=int(os.getenv('PREDICCION_MICROLOTES_MAXIMO', 32))
+        )
+
+    def _iniciar(self):
+        # El hilo se crea con la primera solicitud, despues de cualquier fork
+        with self._lock:
+            if self._hilo is None or not self._hilo.is_alive():
+                self._hilo = threading.Thread(target=self._atender, name='micro-lotes', daemon=True)
+                self._hilo.start()
+
+    def predecir(self, datos_formulario, datos_cuenta=None):
+        """
+        Predice el nivel de procrastinacion dentro del siguiente micro-lote
+
+        Returns:
+            dict con el mismo formato que ProcrastinationPredictor.predecir
+        """
+        if self._hilo is None:
+            self._iniciar()
+
+        solicitud = _Solicitud(datos_formulario, datos_cuenta)
+        # La prediccion ocurre en el hilo de fondo; la peticion anota su espera
+        # y el tiempo que el modelo dedico a su lote
+        trazas = self.predictor.trazas
+        with trazas.tramo('prediccion'):
+            self._cola.put(solicitud)
+            solicitud.listo.wait()
+        if solicitud.segundos_modelo:
+            traza = trazas.actual()
+            if traza is not None:
+                traza.sumar('modelo', solicitud.segundos_modelo)
+
+        if solicitud.error is not None:
+            raise solicitud.error
+        return solicitud.resultado
+
+    def _atender(self):
+        """Bucle del hilo de fondo"""
+        while True:
+            lote = [self._cola.get()]
+            limite = time.perf_counter() + self.ventana
+
+            while len(lote) < self.tamano_maximo:
+                restante = limite - time.perf_counter()
+                if restante <= 0:
+                    break
+                try:
+                    lote.append(self._cola.get(timeout=restante))
+                except queue.Empty:
+                    break
+
+            self._procesar(lote)
+
+    def _procesar(self, lote):
+        inicio = time.perf_counter()
+        for solicitud in lote:
+            self.histograma_espera.observar(inicio - solicitud.llegada)
+        self.histograma_tamano.observar(len(lote))
+
+        # Traza del lote en este hilo: recoge el tramo 'modelo' de predecir_lote
+        trazas = self.predictor.trazas
+        traza = trazas.iniciar()
+        try:
+            resultados = self.predictor.predecir_lote(
+                [s.datos_formulario for s in lote],
+                [s.datos_cuenta for s in lote]
+            )
+            for solicitud, resultado in zip(lote, resultados):
+                solicitud.resultado = resultado
+        except Exception:
+            # Un formulario invalido no debe hacer fallar a los demas del lote:
+            # se repite uno por uno y cada hilo recibe su propio error
+            self.errores_lote += 1
+            for solicitud in lote:
+                try:
+                    solicitud.resultado = self.predictor.predecir(
+                        solicitud.datos_formulario, solicitud.datos_cuenta
+                    )
+                except Exception as e:
+                    solicitud.error = e
+        finally:
+            if traza is not None:
+                trazas.terminar()
+
+        if traza is not None:
+            segundos_modelo = traza.tiempos.get('modelo', 0.0)
+            for solicitud in lote:
+                solicitud.segundos_modelo = segundos_modelo
+
+        self.lotes += 1
+        self.solicitudes += len(lote)
+        for solicitud in lote:
+            solicitud.listo.set()
+
+    def metricas(self):
+        """Histogramas de tamano de lote y de espera en cola (segundos)"""
+        return {
+            'ventana': self.ventana,
+            'tamano_maximo': self.tamano_maximo,
+            'en_cola': self._cola.qsize(),
+            'lotes': self.lotes,
+            'solicitudes': self.solicitudes,
+            'errores_lote': self.errores_lote,
+            'promedio_por_lote': self.solicitudes / self.lotes if self.lotes else 0.0,
+            'tamano_lote': self.histograma_tamano.resumen(),
+            'espera': self.histograma_espera.resumen(),
+        }
@@ -2,36 +2,338 @@
 Modulo de Prediccion de Nivel de Procrastinacion
 Utiliza el modelo Random Forest entrenado para predecir el nivel de adiccion
 """
-import joblib
+import os
+import hashlib
+import threading
+import warnings
 import numpy as np
-import pandas as pd
+from contextlib import nullcontext
 from pathlib import Path
+from bosque_plano import BosquePlano
+from cache_predicciones import CacheLRU
+from reglas import RECOMENDACIONES, FACTORES_RIESGO, extraer_entradas
+from versiones_modelo import directorio_activo, leer_manifiesto
+
+# Variables categoricas codificadas con LabelEncoder durante el entrenamiento
+CATEGORICAS = ['Gender', 'School_Grade', 'Phone_Usage_Purpose']
+
+# Modos de preparacion de features
+MODO_COMPILADO = 'compilado'    # EsquemaFeatures + fila NumPy (ruta en linea)
+MODO_DATAFRAME = 'dataframe'    # pandas + LabelEncoder (ruta de referencia)
+
+# Motores de inferencia
+MOTOR_PLANO = 'plano'      # BosquePlano sobre random_forest_plano.npz
+MOTOR_SKLEARN = 'sklearn'  # RandomForestRegressor.predict
+
+# El modelo se entreno con un DataFrame; al predecir con arrays NumPy sklearn
+# avisa en cada llamada aunque el orden de columnas es el mismo
+warnings.filterwarnings('ignore', message='X does not have valid feature names')
+
+
+class EsquemaFeatures:
+    """
+    Disposicion compilada de las features del modelo
+
+    Se construye una sola vez a partir de feature_names.pkl y label_encoders.pkl.
+    Guarda el indice de cada columna y los codigos de las categoricas como
+    diccionarios simples, de modo que una fila se llena sin pandas ni sklearn.
+    """
+
+    def __init__(self, feature_names, label_encoders):
+        self.feature_names = list(feature_names)
+        self.n_features = len(self.feature_names)
+        self.indices = {nombre: i for i, nombre in enumerate(self.feature_names)}
+
+        # LabelEncoder asigna a cada clase su posicion en classes_
+        self.codigos = {
+            col: {clase: codigo for codigo, clase in enumerate(le.classes_)}
+            for col, le in label_encoders.items()
+        }
+
+        # (indice, nombre, codigos o None) en el orden del modelo
+        self._columnas = [
+            (i, nombre, self.codigos.get(nombre))
+            for i, nombre in enumerate(self.feature_names)
+        ]
+
+    def construir_fila(self, features, fila=None):
+        """
+        Llena una fila float64 con las features en el orden del modelo
+
+        Args:
+            features: dict devuelto por extraer_features
+            fila: array de tamano n_features a reutilizar (opcional)
+
+        Returns:
+            np.ndarray de forma (n_features,)
+        """
+        if fila is None:
+            fila = np.empty(self.n_features, dtype=np.float64)
+
+        for i, nombre, codigos in self._columnas:
+            valor = features[nombre]
+            if codigos is not None:
+                try:
+                    valor = codigos[valor]
+                except KeyError:
+                    raise ValueError(f"Categoria desconocida para {nombre}: {valor!r}")
+            fila[i] = valor
+
+        return fila
+
+    def construir_matriz(self, lista_features):
+        """Llena una matriz preasignada con una fila por cada dict de features"""
+        X = np.empty((len(lista_features), self.n_features), dtype=np.float64)
+        for r, features in enumerate(lista_features):
+            self.construir_fila(features, X[r])
+        return X
+
+
+class ArtefactosModelo:
+    """
+    Modelo y componentes de una version cargada
+
+    No se modifica despues de crearse: el predictor cambia de version
+    reemplazando la referencia completa, asi que quien toma una instancia usa
+    siempre el modelo, los encoders y el esquema de una misma version.
+    """
+
+    def __init__(self, model, label_encoders, feature_names, version, directorio, manifiesto=None):
+        self.model = model
+        self.label_encoders = label_encoders
+        self.feature_names = feature_names
+        self.esquema = EsquemaFeatures(feature_names, label_encoders)
+        self.version = version
+        self.directorio = directorio
+        self.manifiesto = manifiesto
+
+
+class SinTrazas:
+    """
+    Trazas que no miden nada. La aplicacion web asigna app/trazas.py a
+    predictor.trazas para anotar los tramos en la traza de cada peticion.
+    """
+
+    _nulo = nullcontext()
+
+    @staticmethod
+    def tramo(nombre):
+        return SinTrazas._nulo
+
+    @staticmethod
+    def iniciar():
+        return None
+
+    @staticmethod
+    def actual():
+        return None
+
+    @staticmethod
+    def terminar():
+        return None
+
 
 class ProcrastinationPredictor:
     """Clase para realizar predicciones de procrastinacion"""
 
-    def __init__(self):
-        self.model = None
-        self.label_encoders = None
-        self.feature_names = None
-        self.cargar_modelo()
+    def __init__(self, modo_features=MODO_COMPILADO, motor=MOTOR_PLANO,
+                 tamano_cache=None, ttl_cache=None):
+        if modo_features not in (MODO_COMPILADO, MODO_DATAFRAME):
+            raise ValueError(f"Modo de features no valido: {modo_features}")
+        if motor not in (MOTOR_PLANO, MOTOR_SKLEARN):
+            raise ValueError(f"Motor de inferencia no valido: {motor}")
+
+        # Version activa (ArtefactosModelo); se carga con el primer uso (ver
+        # asegurar_cargado) y se reemplaza entera al recargar
+        self.artefactos = None
+        self.modo_features = modo_features
+        self.motor = motor
+
+        # Cache de resultados compartida por predecir y predecir_lote
+        if tamano_cache is None:
+            tamano_cache = int(os.getenv('PREDICCION_CACHE_TAMANO', '1024'))
+        if ttl_cache is None:
+            ttl_cache = float(os.getenv('PREDICCION_CACHE_TTL', '600'))
+        self.cache = CacheLRU(tamano_cache, ttl_cache)
+
+        self._lock_carga = threading.Lock()
+        self._lock_recarga = threading.Lock()
+
+        # Medicion de tramos ('prediccion', 'modelo'); ver SinTrazas
+        self.trazas = SinTrazas
+
+    # Componentes de la version activa (None mientras no se haya cargado)
+    @property
+    def model(self):
+        return self.artefactos.model if self.artefactos else None
+
+    @property
+    def label_encoders(self):
+        return self.artefactos.label_encoders if self.artefactos else None
+
+    @property
+    def feature_names(self):
+        return self.artefactos.feature_names if self.artefactos else None
+
+    @property
+    def esquema(self):
+        return self.artefactos.esquema if self.artefactos else None
+
+    @property
+    def version_modelo(self):
+        return self.artefactos.version if self.artefactos else None
+
+    def asegurar_cargado(self):
+        """
+        Carga el modelo si todavia no se ha cargado
+
+        Returns:
+            bool: True si el modelo esta disponible
+        """
+        if self.artefactos is None:
+            with self._lock_carga:
+                if self.artefactos is None:
+                    self.cargar_modelo()
+        return self.artefactos is not None
+
+    def _artefactos_actuales(self):
+        """Version activa, cargandola si hace falta"""
+        artefactos = self.artefactos
+        if artefactos is None:
+            self.asegurar_cargado()
+            artefactos = self.artefactos
+            if artefactos is None:
+                raise RuntimeError("El modelo de prediccion no esta disponible")
+        return artefactos
 
     def cargar_modelo(self):
         """Carga el modelo y componentes necesarios"""
         try:
-            modelo_path = Path("ml/models/random_forest_model.pkl")
-            encoders_path = Path("ml/models/label_encoders.pkl")
-            features_path = Path("ml/models/feature_names.pkl")
-
-            self.model = joblib.load(modelo_path)
-            self.label_encoders = joblib.load(encoders_path)
-            self.feature_names = joblib.load(features_path)
-
+            self.artefactos = self.cargar_artefactos()
+            # Los resultados guardados pertenecen al modelo anterior
+            self.cache.limpiar()
             return True
         except Exception as e:
             print(f"Error al cargar modelo: {e}")
             return False
 
+    def cargar_artefactos(self, directorio=None):
+        """
+        Lee los artefactos de un directorio sin tocar la version activa
+
+        Args:
+            directorio: directorio de la version (por defecto el de ml/models/ACTUAL,
+                o ml/models/ si no hay versiones)
+
+        Returns:
+            ArtefactosModelo
+        """
+        # joblib (y sklearn, al deserializar los LabelEncoder) solo se importan aqui
+        import joblib
+
+        directorio = Path(directorio) if directorio else directorio_activo()
+        modelo_path = directorio / "random_forest_model.pkl"
+        encoders_path = directorio / "label_encoders.pkl"
+        features_path = directorio / "feature_names.pkl"
+        bosque_path = directorio / "random_forest_plano.npz"
+        bosque_mmap_path = directorio / "random_forest_plano"
+
+        label_encoders = joblib.load(encoders_path)
+        feature_names = joblib.load(features_path)
+
+        # El bosque aplanado expone el mismo predict() que sklearn; si no se
+        # ha exportado todavia se usa el modelo serializado. El directorio
+        # de .npy se abre con mmap: los workers comparten sus paginas
+        if self.motor == MOTOR_PLANO and bosque_mmap_path.is_dir():
+            ruta_cargada = bosque_mmap_path
+            model = BosquePlano.cargar_mmap(bosque_mmap_path)
+        elif self.motor == MOTOR_PLANO and bosque_path.exists():
+            ruta_cargada = bosque_path
+            model = BosquePlano.cargar(bosque_path)
+        else:
+            ruta_cargada = modelo_path
+            model = joblib.load(modelo_path, mmap_mode='r')
+
+        # Las versiones nuevas se identifican por su manifiesto; los archivos
+        # sueltos anteriores, por el hash del artefacto cargado
+        manifiesto = leer_manifiesto(directorio)
+        version = manifiesto['version'] if manifiesto else self.calcular_version(ruta_cargada)
+
+        return ArtefactosModelo(model, label_encoders, feature_names, version, directorio, manifiesto)
+
+    def calentar(self, artefactos, filas=256):
+        """
+        Ejecuta predicciones de prueba sobre una version antes de activarla
+
+        Recorre el bosque con filas variadas para traer sus paginas a memoria
+        y comprueba que las salidas sean validas.
+        """
+        fila = artefactos.esquema.construir_fila(self.extraer_features({}, None))
+        rng = np.random.default_rng(0)
+        X = np.vstack([fila, rng.uniform(0, 24, size=(filas, artefactos.esquema.n_features))])
+
+        predicciones = artefactos.model.predict(X)
+        if not np.all(np.isfinite(predicciones)):
+            raise ValueError(f"La version {artefactos.version} produce predicciones no finitas")
+
+    def recargar(self, directorio=None):
+        """
+        Carga otra version en el hilo actual, la calienta y la activa
+
+        Mientras tanto las predicciones siguen usando la version anterior; el
+        cambio es la asignacion de una sola referencia. Si algo falla se
+        conserva la version activa.
+
+        Returns:
+            bool: True si la nueva version quedo activa
+        """
+        # Si ya hay una recarga en curso (vigilante y administrador a la vez) se omite
+        if not self._lock_recarga.acquire(blocking=False):
+            print("Ya hay una recarga del modelo en curso")
+            return False
+
+        try:
+            nuevos = self.cargar_artefactos(directorio)
+            self.calentar(nuevos)
+
+            with self._lock_carga:
+                anterior = self.version_modelo
+                self.artefactos = nuevos
+                self.cache.limpiar()
+        except Exception as e:
+            print(f"Error al recargar modelo: {e}")
+            return False
+        finally:
+            self._lock_recarga.release()
+
+        print(f"Modelo recargado: {anterior} -> {nuevos.version}")
+        return True
+
+    def info_modelo(self):
+        """Version activa y su manifiesto (metricas, features)"""
+        artefactos = self.artefactos
+        if artefactos is None:
+            return {'version': None}
+        return {
+            'version': artefactos.version,
+            'directorio': str(artefactos.directorio),
+            'manifiesto': artefactos.manifiesto,
+        }
+
+    @staticmethod
+    def calcular_version(ruta):
+        """Huella corta del contenido de un artefacto del modelo (archivo o directorio)"""
+        ruta = Path(ruta)
+        archivos = sorted(ruta.iterdir()) if ruta.is_dir() else [ruta]
+
+        sha = hashlib.sha256()
+        for archivo in archivos:
+            sha.update(archivo.name.encode())
+            with open(archivo, 'rb') as f:
+                for bloque in iter(lambda: f.read(1 << 20), b''):
+                    sha.update(bloque)
+        return sha.hexdigest()[:12]
+
     def mapear_genero(self, genero_str):
         """Mapea el genero del formulario al formato del dataset"""
         mapeo = {
@@ -76,16 +378,17 @@ class ProcrastinationPredictor:
         }
         return mapeo.get(proposito_str, 'Other')
 
-    def preparar_datos_formulario(self, datos_formulario, datos_cuenta=None):
+    def extraer_features(self, datos_formulario, datos_cuenta=None):
         """
-        Prepara los datos del formulario para la prediccion
+        Extrae las features del formulario sin codificar las categoricas
 
         Args:
             datos_formulario: dict con datos del formulario
             datos_cuenta: dict con datos de la cuenta del usuario (opcional)
 
         Returns:
-            DataFrame con las features preparadas
+            dict con las features; Gender, School_Grade y Phone_Usage_Purpose
+            quedan como texto en el formato del dataset
         """
         # Crear diccionario con todas las features necesarias
         features = {}
@@ -102,8 +405,7 @@ class ProcrastinationPredictor:
         else:
             genero = self.mapear_genero(datos_formulario.get('gender', 'O'))
 
-        # Codificar genero
-        features['Gender'] = self.label_encoders['Gender'].transform([genero])[0]
+        features['Gender'] = genero
 
         # 3. School_Grade - de cuenta o formulario
         if datos_cuenta and 'grado_escolaridad' in datos_cuenta and datos_cuenta['grado_escolaridad']:
@@ -111,8 +413,7 @@ class ProcrastinationPredictor:
         else:
             grado = self.mapear_grado_escolar(datos_formulario.get('schoolgrade', 'Universidad'))
 
-        # Codificar grado escolar
-        features['School_Grade'] = self.label_encoders['School_Grade'].transform([grado])[0]
+        features['School_Grade'] = grado
 
         # 4. Daily_Usage_Hours - del formulario
         features['Daily_Usage_Hours'] = float(datos_formulario.get('daily_usage', 5.0))
@@ -171,8 +472,7 @@ class ProcrastinationPredictor:
         features['Time_on_Education'] = education  # Ya esta en horas
 
         # 19. Phone_Usage_Purpose - del formulario
-        proposito = self.mapear_proposito(datos_formulario.get('purpose', 'otro'))
-        features['Phone_Usage_Purpose'] = self.label_encoders['Phone_Usage_Purpose'].transform([proposito])[0]
+        features['Phone_Usage_Purpose'] = self.mapear_proposito(datos_formulario.get('purpose', 'otro'))
 
         # 20. Family_Communication - valor por defecto
         features['Family_Communication'] = 5
@@ -180,12 +480,83 @@ class ProcrastinationPredictor:
         # 21. Weekend_Usage_Hours - del formulario
         features['Weekend_Usage_Hours'] = float(datos_formulario.get('weekend_usage', 6.0))
 
+        return features
+
+    def preparar_datos_formulario(self, datos_formulario, datos_cuenta=None, artefactos=None):
+        """
+        Prepara los datos del formulario para la prediccion
+
+        Args:
+            datos_formulario: dict con datos del formulario
+            datos_cuenta: dict con datos de la cuenta del usuario (opcional)
+            artefactos: version del modelo a usar (por defecto la activa)
+
+        Returns:
+            DataFrame con las features preparadas
+        """
+        import pandas as pd
+
+        artefactos = artefactos or self._artefactos_actuales()
+        features = self.extraer_features(datos_formulario, datos_cuenta)
+
+        # Codificar variables categoricas
+        for col in CATEGORICAS:
+            features[col] = artefactos.label_encoders[col].transform([features[col]])[0]
+
         # Crear DataFrame con el orden correcto de features
         df = pd.DataFrame([features])
-        df = df[self.feature_names]  # Asegurar el orden correcto
+        df = df[artefactos.feature_names]  # Asegurar el orden correcto
 
         return df
 
+    def preparar_vector(self, datos_formulario, datos_cuenta=None, artefactos=None):
+        """
+        Prepara los datos del formulario como fila NumPy usando el esquema
+        compilado (sin pandas ni LabelEncoder)
+
+        Returns:
+            np.ndarray float64 de forma (n_features,) en el orden de self.feature_names
+        """
+        artefactos = artefactos or self._artefactos_actuales()
+        features = self.extraer_features(datos_formulario, datos_cuenta)
+        return artefactos.esquema.construir_fila(features)
+
+    def preparar_lote(self, lista_formularios, lista_cuentas=None, artefactos=None):
+        """
+        Prepara la matriz de features para varios formularios a la vez
+
+        Args:
+            lista_formularios: lista de dicts con datos de formularios
+            lista_cuentas: lista de dicts con datos de cuenta (opcional, puede
+                contener None en las posiciones sin cuenta)
+            artefactos: version del modelo a usar (por defecto la activa)
+
+        Returns:
+            np.ndarray de forma (n_formularios, n_features) en el orden de
+            self.feature_names
+        """
+        if lista_cuentas is None:
+            lista_cuentas = [None] * len(lista_formularios)
+        if len(lista_cuentas) != len(lista_formularios):
+            raise ValueError("lista_formularios y lista_cuentas deben tener la misma longitud")
+
+        artefactos = artefactos or self._artefactos_actuales()
+        filas = [self.extraer_features(datos, cuenta)
+                 for datos, cuenta in zip(lista_formularios, lista_cuentas)]
+
+        if self.modo_features == MODO_DATAFRAME:
+            X = np.empty((len(filas), len(artefactos.feature_names)), dtype=np.float64)
+            for j, nombre in enumerate(artefactos.feature_names):
+                columna = [fila[nombre] for fila in filas]
+                if nombre in CATEGORICAS:
+                    # Una sola llamada a transform por columna
+                    X[:, j] = artefactos.label_encoders[nombre].transform(columna)
+                else:
+                    X[:, j] = columna
+            return X
+
+        return artefactos.esquema.construir_matriz(filas)
+
     def predecir(self, datos_formulario, datos_cuenta=None):
         """
         Predice el nivel de procrastinacion
@@ -195,44 +566,152 @@ class ProcrastinationPredictor:
             datos_cuenta: dict con datos de la cuenta (opcional)
 
         Returns:
-            dict con prediccion y analisis
+            dict con prediccion y analisis (incluye version_modelo)
         """
-        # Preparar datos
-        X = self.preparar_datos_formulario(datos_formulario, datos_cuenta)
+        with self.trazas.tramo('prediccion'):
+            # Toda la prediccion usa la misma version aunque se recargue en medio
+            artefactos = self._artefactos_actuales()
+
+            # Preparar datos
+            if self.modo_features == MODO_DATAFRAME:
+                X = self.preparar_datos_formulario(datos_formulario, datos_cuenta, artefactos)
+                fila = X.to_numpy(dtype=np.float64)[0]
+            else:
+                fila = self.preparar_vector(datos_formulario, datos_cuenta, artefactos)
+                X = fila.reshape(1, -1)
+
+            entradas = extraer_entradas(datos_formulario)
+            clave = self.clave_cache(fila, datos_formulario, artefactos.version, entradas)
+            analisis = self.cache.obtener(clave)
+
+            if analisis is None:
+                # Realizar prediccion
+                with self.trazas.tramo('modelo'):
+                    prediccion = artefactos.model.predict(X)[0]
+                analisis = self.analizar_prediccion(datos_formulario, prediccion, entradas)
+                self.cache.guardar(clave, analisis)
+
+            resultado = self.completar_resultado(analisis, datos_formulario)
+            resultado['version_modelo'] = artefactos.version
+            return resultado
+
+    def predecir_lote(self, lista_formularios, lista_cuentas=None):
+        """
+        Predice el nivel de procrastinacion de varios formularios con una sola
+        llamada al modelo
 
-        # Realizar prediccion
-        prediccion = self.model.predict(X)[0]
+        Args:
+            lista_formularios: lista de dicts con datos de formularios
+            lista_cuentas: lista de dicts con datos de cuenta (opcional)
 
-        # Limitar entre 1 y 10
-        prediccion = max(1.0, min(10.0, prediccion))
+        Returns:
+            list de dicts con el mismo formato que predecir(), en el mismo orden
+        """
+        if not lista_formularios:
+            return []
+
+        artefactos = self._artefactos_actuales()
+        X = self.preparar_lote(lista_formularios, lista_cuentas, artefactos)
+
+        entradas = [extraer_entradas(datos) for datos in lista_formularios]
+        claves = [self.clave_cache(fila, datos, artefactos.version, e)
+                  for fila, datos, e in zip(X, lista_formularios, entradas)]
+        analisis = [self.cache.obtener(clave) for clave in claves]
+
+        # Solo las filas que no estaban en cache pasan por el modelo, y sus
+        # reglas se evaluan juntas sobre el lote
+        pendientes = [i for i, a in enumerate(analisis) if a is None]
+        if pendientes:
+            with self.trazas.tramo('modelo'):
+                predicciones = np.clip(artefactos.model.predict(X[pendientes]), 1.0, 10.0).tolist()
+            entradas_pendientes = [entradas[i] for i in pendientes]
+            recomendaciones = RECOMENDACIONES.evaluar_lote(entradas_pendientes, predicciones)
+            factores = FACTORES_RIESGO.evaluar_lote(entradas_pendientes)
+            for j, i in enumerate(pendientes):
+                analisis[i] = self.armar_analisis(predicciones[j], recomendaciones[j], factores[j])
+                self.cache.guardar(claves[i], analisis[i])
+
+        resultados = [self.completar_resultado(a, datos)
+                      for a, datos in zip(analisis, lista_formularios)]
+        for resultado in resultados:
+            resultado['version_modelo'] = artefactos.version
+        return resultados
+
+    def clave_cache(self, fila, datos_formulario, version=None, entradas=None):
+        """
+        Clave de cache: version del modelo, vector de features codificado y
+        los valores que leen las reglas de recomendaciones y factores de riesgo
+        (sus valores por defecto no coinciden con los de las features)
+        """
+        if entradas is None:
+            entradas = extraer_entradas(datos_formulario)
+        return (version or self.version_modelo, fila.tobytes(), entradas)
 
-        # Clasificar nivel
+    def estadisticas_cache(self):
+        """Contadores de aciertos, fallos y desalojos de la cache de resultados"""
+        estadisticas = self.cache.estadisticas()
+        estadisticas['version_modelo'] = self.version_modelo
+        return estadisticas
+
+    def clasificar_nivel(self, prediccion):
+        """
+        Clasifica el puntaje predicho
+
+        Returns:
+            tuple: (nivel, color, descripcion)
+        """
         if prediccion < 3:
-            nivel = "Bajo"
-            color = "green"
-            descripcion = "Tienes un nivel bajo de procrastinacion. Mantienes un buen equilibrio con el uso del celular."
+            return ("Bajo", "green",
+                    "Tienes un nivel bajo de procrastinacion. Mantienes un buen equilibrio con el uso del celular.")
         elif prediccion < 5:
-            nivel = "Moderado-Bajo"
-            color = "lightgreen"
-            descripcion = "Tu nivel de procrastinacion es moderado-bajo. Estas en el camino correcto, pero puedes mejorar."
+            return ("Moderado-Bajo", "lightgreen",
+                    "Tu nivel de procrastinacion es moderado-bajo. Estas en el camino correcto, pero puedes mejorar.")
         elif prediccion < 7:
-            nivel = "Moderado"
-            color = "orange"
-            descripcion = "Tienes un nivel moderado de procrastinacion. Es momento de implementar cambios en tus habitos."
+            return ("Moderado", "orange",
+                    "Tienes un nivel moderado de procrastinacion. Es momento de implementar cambios en tus habitos.")
         elif prediccion < 9:
-            nivel = "Alto"
-            color = "orangered"
-            descripcion = "Tu nivel de procrastinacion es alto. El uso del celular esta afectando tu productividad significativamente."
+            return ("Alto", "orangered",
+                    "Tu nivel de procrastinacion es alto. El uso del celular esta afectando tu productividad significativamente.")
         else:
-            nivel = "Muy Alto"
-            color = "red"
-            descripcion = "Nivel de procrastinacion muy alto. Es urgente tomar medidas para reducir el tiempo en el celular."
+            return ("Muy Alto", "red",
+                    "Nivel de procrastinacion muy alto. Es urgente tomar medidas para reducir el tiempo en el celular.")
 
-        # Generar recomendaciones basadas en los datos
-        recomendaciones = self.generar_recomendaciones(datos_formulario, prediccion)
+    def construir_resultado(self, datos_formulario, prediccion):
+        """
+        Construye el dict de resultado a partir del puntaje crudo del modelo
 
-        # Calcular factores de riesgo
-        factores_riesgo = self.identificar_factores_riesgo(datos_formulario)
+        Args:
+            datos_formulario: dict con datos del formulario
+            prediccion: puntaje devuelto por el modelo
+
+        Returns:
+            dict con prediccion y analisis
+        """
+        analisis = self.analizar_prediccion(datos_formulario, prediccion)
+        return self.completar_resultado(analisis, datos_formulario)
+
+    def analizar_prediccion(self, datos_formulario, prediccion, entradas=None):
+        """
+        Parte del resultado que depende solo del puntaje y de las respuestas
+        (es la que se guarda en cache)
+        """
+        # Limitar entre 1 y 10
+        prediccion = max(1.0, min(10.0, float(prediccion)))
+
+        if entradas is None:
+            entradas = extraer_entradas(datos_formulario)
+
+        # Recomendaciones y factores de riesgo segun las tablas de reglas.py
+        return self.armar_analisis(
+            prediccion,
+            RECOMENDACIONES.evaluar_fila(entradas, prediccion),
+            FACTORES_RIESGO.evaluar_fila(entradas)
+        )
+
+    def armar_analisis(self, prediccion, recomendaciones, factores_riesgo):
+        """Arma el analisis a partir del puntaje ya limitado entre 1 y 10"""
+        # Clasificar nivel
+        nivel, color, descripcion = self.clasificar_nivel(prediccion)
 
         return {
             'prediccion': round(prediccion, 2),
@@ -240,137 +719,35 @@ class ProcrastinationPredictor:
             'color': color,
             'descripcion': descripcion,
             'recomendaciones': recomendaciones,
-            'factores_riesgo': factores_riesgo,
-            'datos_analizados': {
-                'horas_diarias': datos_formulario.get('daily_usage', 0),
-                'apps_usadas': datos_formulario.get('apps_daily', []),
-                'tiempo_redes': datos_formulario.get('time_social_media', 0),
-                'horas_sueno': datos_formulario.get('sleephours', 0)
-            }
+            'factores_riesgo': factores_riesgo
+        }
+
+    def completar_resultado(self, analisis, datos_formulario):
+        """
+        Agrega los datos analizados del formulario a un analisis
+
+        El analisis puede venir de la cache: las recomendaciones y los
+        factores se copian para que cada llamada reciba los suyos.
+        """
+        resultado = dict(analisis)
+        resultado['recomendaciones'] = [dict(m) for m in analisis['recomendaciones']]
+        resultado['factores_riesgo'] = [dict(m) for m in analisis['factores_riesgo']]
+        resultado['datos_analizados'] = {
+            'horas_diarias': datos_formulario.get('daily_usage', 0),
+            'apps_usadas': datos_formulario.get('apps_daily', []),
+            'tiempo_redes': datos_formulario.get('time_social_media', 0),
+            'horas_sueno': datos_formulario.get('sleephours', 0)
         }
+        return resultado
 
     def generar_recomendaciones(self, datos, prediccion):
-        """Genera recomendaciones personalizadas"""
-        recomendaciones = []
-
-        # Analizar horas diarias de uso
-        horas_uso = float(datos.get('daily_usage', 0))
-        if horas_uso > 6:
-            recomendaciones.append({
-                'tipo': 'critico',
-                'titulo': 'Reduce el tiempo de uso del celular',
-                'mensaje': f'Usas {horas_uso} horas diarias. Intenta reducir a 4-5 horas estableciendo limites en las apps.'
-            })
-        elif horas_uso > 4:
-            recomendaciones.append({
-                'tipo': 'advertencia',
-                'titulo': 'Controla tu tiempo en el celular',
-                'mensaje': f'Usas {horas_uso} horas diarias. Considera establecer tiempos especificos para usar el celular.'
-            })
-
-        # Analizar redes sociales (ahora en horas)
-        tiempo_redes = float(datos.get('time_social_media', 0))
-        if tiempo_redes > 3:  # Mas de 3 horas
-            recomendaciones.append({
-                'tipo': 'critico',
-                'titulo': 'Limita el tiempo en redes sociales',
-                'mensaje': f'Pasas {tiempo_redes:.1f} horas en redes sociales. Usa temporizadores de apps para limitarlo a 1-1.5 horas.'
-            })
-        elif tiempo_redes > 2:  # Mas de 2 horas
-            recomendaciones.append({
-                'tipo': 'advertencia',
-                'titulo': 'Reduce tiempo en redes sociales',
-                'mensaje': f'Pasas {tiempo_redes:.1f} horas en redes sociales. Considera reducirlo gradualmente.'
-            })
-
-        # Analizar sueno
-        horas_sueno = float(datos.get('sleephours', 7))
-        if horas_sueno < 7:
-            recomendaciones.append({
-                'tipo': 'advertencia',
-                'titulo': 'Mejora tus habitos de sueno',
-                'mensaje': f'Duermes {horas_sueno} horas. Intenta dormir 7-9 horas y evita el celular 1 hora antes de dormir.'
-            })
-
-        # Analizar pantalla antes de dormir (ahora en horas)
-        pantalla_dormir = float(datos.get('screen_before_bed', 0))
-        if pantalla_dormir > 1:  # Mas de 1 hora
-            recomendaciones.append({
-                'tipo': 'advertencia',
-                'titulo': 'Evita pantallas antes de dormir',
-                'mensaje': f'Usas el celular {pantalla_dormir:.1f} horas antes de dormir. Intenta reducirlo a menos de 0.5 horas (30 minutos).'
-            })
-        elif pantalla_dormir > 0.5:  # Mas de 30 minutos
-            recomendaciones.append({
-                'tipo': 'consejo',
-                'titulo': 'Reduce pantallas antes de dormir',
-                'mensaje': 'Intenta usar el celular menos de 30 minutos antes de acostarte para mejorar la calidad del sueno.'
-            })
-
-        # Analizar ejercicio
-        ejercicio = float(datos.get('exercise', 0))
-        if ejercicio < 2:
-            recomendaciones.append({
-                'tipo': 'consejo',
-                'titulo': 'Aumenta la actividad fisica',
-                'mensaje': 'Haz al menos 3-4 horas de ejercicio a la semana para reducir el estres y mejorar el enfoque.'
-            })
-
-        # Recomendaciones generales segun nivel
-        if prediccion >= 8:
-            recomendaciones.append({
-                'tipo': 'critico',
-                'titulo': 'Busca apoyo profesional',
-                'mensaje': 'Considera hablar con un orientador o psicologo sobre tus habitos digitales.'
-            })
-
-        # Siempre agregar al menos una recomendacion positiva
-        recomendaciones.append({
-            'tipo': 'consejo',
-            'titulo': 'Implementa la tecnica Pomodoro',
-            'mensaje': 'Estudia 25 minutos sin distracciones, descansa 5 minutos. Repite 4 veces y toma un descanso largo.'
-        })
-
-        return recomendaciones[:5]  # Maximo 5 recomendaciones
+        """Genera recomendaciones personalizadas (ver reglas.REGLAS_RECOMENDACIONES)"""
+        # Copias: los mensajes de las reglas se comparten entre resultados
+        return [dict(m) for m in RECOMENDACIONES.evaluar_fila(extraer_entradas(datos), prediccion)]
 
     def identificar_factores_riesgo(self, datos):
-        """Identifica los principales factores de riesgo"""
-        factores = []
-
-        horas_uso = float(datos.get('daily_usage', 0))
-        tiempo_redes = float(datos.get('time_social_media', 0))  # Ya esta en horas
-        tiempo_juegos = float(datos.get('time_gaming', 0))  # Ya esta en horas
-        revisiones = int(datos.get('checks_per_day', 0))
-
-        if horas_uso > 6:
-            factores.append({
-                'factor': 'Uso excesivo del celular',
-                'valor': f'{horas_uso} horas/dia',
-                'impacto': 'Alto'
-            })
-
-        if tiempo_redes > 3:
-            factores.append({
-                'factor': 'Tiempo elevado en redes sociales',
-                'valor': f'{tiempo_redes:.1f} horas/dia',
-                'impacto': 'Alto'
-            })
-
-        if revisiones > 100:
-            factores.append({
-                'factor': 'Revisar celular frecuentemente',
-                'valor': f'{revisiones} veces/dia',
-                'impacto': 'Medio'
-            })
-
-        if tiempo_juegos > 2:
-            factores.append({
-                'factor': 'Tiempo en videojuegos',
-                'valor': f'{tiempo_juegos:.1f} horas/dia',
-                'impacto': 'Medio'
-            })
-
-        return factores
+        """Identifica los principales factores de riesgo (ver reglas.REGLAS_FACTORES)"""
+        return [dict(m) for m in FACTORES_RIESGO.evaluar_fila(extraer_entradas(datos))]
 
 # Instancia global del predictor
 predictor = ProcrastinationPredictor()
@@ -0,0 +1,258 @@
+"""
+Motor de reglas de recomendaciones y factores de riesgo
+
+Las reglas se declaran como tablas: cada una compara una entrada del formulario
+(o el puntaje predicho) contra un umbral y produce un mensaje. Las reglas de un
+mismo grupo son excluyentes (la primera que se cumple gana, como un if/elif).
+El mismo motor evalua una fila con comparaciones de Python o un lote completo
+con NumPy (una comparacion vectorizada por regla).
+
+Los mensajes sin valores se construyen una sola vez y se comparten entre
+resultados; los que incluyen el valor de la respuesta se formatean una vez por
+valor distinto. Ningun mensaje devuelto se debe modificar.
+"""
+import operator
+
+import numpy as np
+
+# Entradas que leen las reglas: (nombre, clave del formulario, valor por
+# defecto, conversion). Sus valores por defecto no coinciden con los de las
+# features del modelo, por eso se leen aparte
+ENTRADAS = (
+    ('horas_uso', 'daily_usage', 0, float),
+    ('tiempo_redes', 'time_social_media', 0, float),
+    ('horas_sueno', 'sleephours', 7, float),
+    ('pantalla_dormir', 'screen_before_bed', 0, float),
+    ('ejercicio', 'exercise', 0, float),
+    ('tiempo_juegos', 'time_gaming', 0, float),
+    ('revisiones', 'checks_per_day', 0, int),
+)
+
+# Columna del puntaje en la matriz de evaluacion (despues de las entradas)
+PREDICCION = 'prediccion'
+
+OPERADORES = {
+    '>': operator.gt,
+    '>=': operator.ge,
+    '<': operator.lt,
+}
+
+# (grupo, entrada, operador, umbral, mensaje). El mensaje es un dict cuyos
+# textos pueden usar {valor}; grupo None = regla independiente
+REGLAS_RECOMENDACIONES = (
+    ('uso', 'horas_uso', '>', 6, {
+        'tipo': 'critico',
+        'titulo': 'Reduce el tiempo de uso del celular',
+        'mensaje': 'Usas {valor} horas diarias. Intenta reducir a 4-5 horas estableciendo limites en las apps.'
+    }),
+    ('uso', 'horas_uso', '>', 4, {
+        'tipo': 'advertencia',
+        'titulo': 'Controla tu tiempo en el celular',
+        'mensaje': 'Usas {valor} horas diarias. Considera establecer tiempos especificos para usar el celular.'
+    }),
+    ('redes', 'tiempo_redes', '>', 3, {
+        'tipo': 'critico',
+        'titulo': 'Limita el tiempo en redes sociales',
+        'mensaje': 'Pasas {valor:.1f} horas en redes sociales. Usa temporizadores de apps para limitarlo a 1-1.5 horas.'
+    }),
+    ('redes', 'tiempo_redes', '>', 2, {
+        'tipo': 'advertencia',
+        'titulo': 'Reduce tiempo en redes sociales',
+        'mensaje': 'Pasas {valor:.1f} horas en redes sociales. Considera reducirlo gradualmente.'
+    }),
+    (None, 'horas_sueno', '<', 7, {
+        'tipo': 'advertencia',
+        'titulo': 'Mejora tus habitos de sueno',
+        'mensaje': 'Duermes {valor} horas. Intenta dormir 7-9 horas y evita el celular 1 hora antes de dormir.'
+    }),
+    ('pantalla', 'pantalla_dormir', '>', 1, {
+        'tipo': 'advertencia',
+        'titulo': 'Evita pantallas antes de dormir',
+        'mensaje': 'Usas el celular {valor:.1f} horas antes de dormir. Intenta reducirlo a menos de 0.5 horas (30 minutos).'
+    }),
+    ('pantalla', 'pantalla_dormir', '>', 0.5, {
+        'tipo': 'consejo',
+        'titulo': 'Reduce pantallas antes de dormir',
+        'mensaje': 'Intenta usar el celular menos de 30 minutos antes de acostarte para mejorar la calidad del sueno.'
+    }),
+    (None, 'ejercicio', '<', 2, {
+        'tipo': 'consejo',
+        'titulo': 'Aumenta la actividad fisica',
+        'mensaje': 'Haz al menos 3-4 horas de ejercicio a la semana para reducir el estres y mejorar el enfoque.'
+    }),
+    (None, PREDICCION, '>=', 8, {
+        'tipo': 'critico',
+        'titulo': 'Busca apoyo profesional',
+        'mensaje': 'Considera hablar con un orientador o psicologo sobre tus habitos digitales.'
+    }),
+)
+
+# Se agrega siempre al final, antes de recortar a MAXIMO_RECOMENDACIONES
+RECOMENDACION_FINAL = {
+    'tipo': 'consejo',
+    'titulo': 'Implementa la tecnica Pomodoro',
+    'mensaje': 'Estudia 25 minutos sin distracciones, descansa 5 minutos. Repite 4 veces y toma un descanso largo.'
+}
+MAXIMO_RECOMENDACIONES = 5
+
+REGLAS_FACTORES = (
+    (None, 'horas_uso', '>', 6, {
+        'factor': 'Uso excesivo del celular',
+        'valor': '{valor} horas/dia',
+        'impacto': 'Alto'
+    }),
+    (None, 'tiempo_redes', '>', 3, {
+        'factor': 'Tiempo elevado en redes sociales',
+        'valor': '{valor:.1f} horas/dia',
+        'impacto': 'Alto'
+    }),
+    (None, 'revisiones', '>', 100, {
+        'factor': 'Revisar celular frecuentemente',
+        'valor': '{valor} veces/dia',
+        'impacto': 'Medio'
+    }),
+    (None, 'tiempo_juegos', '>', 2, {
+        'factor': 'Tiempo en videojuegos',
+        'valor': '{valor:.1f} horas/dia',
+        'impacto': 'Medio'
+    }),
+)
+
+# Mensajes con valor formateados que se recuerdan por regla
+MAXIMO_MENSAJES_POR_REGLA = 4096
+
+
+def extraer_entradas(datos_formulario):
+    """
+    Lee y convierte las respuestas que usan las reglas
+
+    Returns:
+        tuple con un valor por cada entrada de ENTRADAS
+    """
+    obtener = datos_formulario.get
+    return tuple([conversion(obtener(clave, defecto)) for _, clave, defecto, conversion in ENTRADAS])
+
+
+class _Regla:
+    """Regla compilada: columna de entrada, comparacion y plantilla del mensaje"""
+
+    __slots__ = ('grupo', 'columna', 'comparar', 'umbral', 'plantilla',
+                 'con_valor', 'fijo', '_formateados')
+
+    def __init__(self, grupo, columna, comparar, umbral, plantilla):
+        self.grupo = grupo
+        self.columna = columna
+        self.comparar = comparar
+        self.umbral = umbral
+        self.plantilla = plantilla
+        self.con_valor = any('{' in texto for texto in plantilla.values())
+        # Un solo dict compartido por todos los resultados que cumplen la regla
+        self.fijo = None if self.con_valor else dict(plantilla)
+        self._formateados = {}
+
+    def mensaje(self, valor):
+        if self.fijo is not None:
+            return self.fijo
+        # La clave es el texto del valor: 0.0 y -0.0 (o 5 y 5.0) son iguales
+        # como claves de dict pero se formatean distinto
+        clave = repr(valor)
+        mensaje = self._formateados.get(clave)
+        if mensaje is None:
+            mensaje = {c: t.format(valor=valor) for c, t in self.plantilla.items()}
+            if len(self._formateados) < MAXIMO_MENSAJES_POR_REGLA:
+                self._formateados[clave] = mensaje
+        return mensaje
+
+
+class TablaReglas:
+    """Conjunto de reglas compilado sobre las columnas de ENTRADAS + PREDICCION"""
+
+    def __init__(self, reglas, final=None, maximo=None):
+        columnas = [nombre for nombre, *_ in ENTRADAS] + [PREDICCION]
+        self.reglas = [
+            _Regla(grupo, columnas.index(entrada), OPERADORES[simbolo], umbral, plantilla)
+            for grupo, entrada, simbolo, umbral, plantilla in reglas
+        ]
+        self.final = final
+        self.maximo = maximo
+
+    def _recortar(self, mensajes):
+        if self.final is not None:
+            mensajes.append(self.final)
+        if self.maximo and len(mensajes) > self.maximo:
+            del mensajes[self.maximo:]
+        return mensajes
+
+    def evaluar_fila(self, entradas, prediccion=None):
+        """
+        Evalua las reglas para una fila
+
+        Args:
+            entradas (tuple): Valores de extraer_entradas
+            prediccion (float): Puntaje, si alguna regla lo usa
+
+        Returns:
+            list de mensajes
+        """
+        valores = entradas + (prediccion,)
+        mensajes = []
+        grupos_cumplidos = set()
+        for regla in self.reglas:
+            if regla.grupo is not None and regla.grupo in grupos_cumplidos:
+                continue
+            valor = valores[regla.columna]
+            if regla.comparar(valor, regla.umbral):
+                mensajes.append(regla.mensaje(valor))
+                if regla.grupo is not None:
+                    grupos_cumplidos.add(regla.grupo)
+        return self._recortar(mensajes)
+
+    def evaluar_lote(self, entradas, predicciones=None):
+        """
+        Evalua las reglas para un lote con una comparacion NumPy por regla
+
+        Args:
+            entradas (list): Tuplas de extraer_entradas, una por fila
+            predicciones: Puntajes de cada fila, si alguna regla los usa
+
+        Returns:
+            list con la lista de mensajes de cada fila, en orden
+        """
+        n = len(entradas)
+        if n == 0:
+            return []
+        # Columnas como listas de Python (conservan float/int) y como arrays
+        columnas = list(zip(*entradas)) + [list(predicciones) if predicciones is not None else [None] * n]
+        arrays = {}
+
+        resultados = [[] for _ in range(n)]
+        cumplidos = {}
+        for regla in self.reglas:
+            array = arrays.get(regla.columna)
+            if array is None:
+                array = arrays[regla.columna] = np.asarray(columnas[regla.columna])
+            cumple = regla.comparar(array, regla.umbral)
+            if regla.grupo is not None:
+                previos = cumplidos.get(regla.grupo)
+                if previos is not None:
+                    cumple_nuevo = cumple & ~previos
+                    cumplidos[regla.grupo] = previos | cumple
+                    cumple = cumple_nuevo
+                else:
+                    cumplidos[regla.grupo] = cumple
+
+            indices = np.flatnonzero(cumple).tolist()
+            if regla.fijo is not None:
+                for i in indices:
+                    resultados[i].append(regla.fijo)
+            else:
+                valores = columnas[regla.columna]
+                mensaje = regla.mensaje
+                for i in indices:
+                    resultados[i].append(mensaje(valores[i]))
+
+        return [self._recortar(mensajes) for mensajes in resultados]
+
+
+RECOMENDACIONES = TablaReglas(REGLAS_RECOMENDACIONES, RECOMENDACION_FINAL, MAXIMO_RECOMENDACIONES)
+FACTORES_RIESGO = TablaReglas(REGLAS_FACTORES)
@@ -2,14 +2,12 @@
 Entrenamiento del Modelo de Prediccion de Procrastinacion
 Utiliza Random Forest Regressor para predecir el nivel de adiccion al celular
 """
+import argparse
 import sys
 import io
 sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
 
-import pandas as pd
 import numpy as np
-import joblib
-from pathlib import Path
 from sklearn.model_selection import train_test_split, cross_val_score
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.linear_model import LinearRegression
@@ -17,10 +15,24 @@ from sklearn.preprocessing import LabelEncoder
 from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
 import matplotlib.pyplot as plt
 import seaborn as sns
+from versiones_modelo import guardar_version
+from cargador_datos import (
+    FORMATOS_CACHE, CATEGORICAS, COLUMNA_OBJETIVO, cargar_dataset, memoria_mb
+)
+from almacen_features import AlmacenFeatures, clave_features
+from busqueda_hiperparametros import (
+    ESTRATEGIAS, BuscadorHiperparametros, frente_pareto, elegir_candidato, escribir_reporte
+)
 
 # Configuracion
 RANDOM_STATE = 42
 TEST_SIZE = 0.2
+HIPERPARAMETROS = {
+    'n_estimators': 100,
+    'max_depth': 15,
+    'min_samples_split': 5,
+    'min_samples_leaf': 2,
+}
 sns.set_style("whitegrid")
 
 class ProcrastinationModel:
@@ -32,49 +44,49 @@ class ProcrastinationModel:
         self.label_encoders = {}
         self.feature_names = []
         self.metrics = {}
+        self.indices_division = None
 
-    def cargar_datos(self):
-        """Carga y preprocesa el dataset"""
+    def cargar_datos(self, cache=None):
+        """Carga el dataset por bloques con tipos explicitos (ver cargador_datos)"""
         print("=" * 80)
         print("1. CARGANDO DATASET")
         print("=" * 80)
 
-        ruta_dataset = Path("app/static/dataset/teen_phone_addiction_dataset.csv")
-        df = pd.read_csv(ruta_dataset)
+        df = cargar_dataset(cache=cache)
 
         print(f"✓ Dataset cargado: {df.shape[0]} filas x {df.shape[1]} columnas")
+        print(f"✓ Memoria: {memoria_mb(df):.2f} MB")
         print(f"✓ Sin valores nulos: {df.isnull().sum().sum() == 0}")
 
         return df
 
     def preprocesar_datos(self, df):
-        """Preprocesa los datos para el entrenamiento"""
+        """
+        Preprocesa los datos para el entrenamiento
+
+        Trabaja sobre el DataFrame de cargar_datos sin copiarlo: las columnas
+        categoricas se reemplazan por sus codigos y el objetivo se extrae.
+        """
         print("\n" + "=" * 80)
         print("2. PREPROCESAMIENTO DE DATOS")
         print("=" * 80)
 
-        # Copiar datos
-        df_proc = df.copy()
-
-        # Eliminar columnas no necesarias
-        columnas_eliminar = ['ID', 'Name', 'Location']
-        df_proc = df_proc.drop(columns=columnas_eliminar)
-        print(f"✓ Eliminadas columnas: {columnas_eliminar}")
-
-        # Identificar variables categoricas
-        categoricas = ['Gender', 'School_Grade', 'Phone_Usage_Purpose']
+        # ID, Name y Location no se leen del CSV (ver cargador_datos)
+        print(f"✓ Columnas usadas: {df.shape[1]}")
 
-        # Codificar variables categoricas
-        print(f"✓ Codificando variables categoricas: {categoricas}")
-        for col in categoricas:
+        # Codificar variables categoricas. Las categorias vienen ordenadas,
+        # asi que sus codigos son los mismos que asignaria LabelEncoder
+        print(f"✓ Codificando variables categoricas: {list(CATEGORICAS)}")
+        for col in CATEGORICAS:
             le = LabelEncoder()
-            df_proc[col] = le.fit_transform(df_proc[col])
+            le.classes_ = np.asarray(df[col].cat.categories, dtype=object)
+            df[col] = df[col].cat.codes.astype(np.int8)
             self.label_encoders[col] = le
             print(f"  - {col}: {len(le.classes_)} categorias")
 
         # Separar features y target
-        X = df_proc.drop('Addiction_Level', axis=1)
-        y = df_proc['Addiction_Level']
+        y = df.pop(COLUMNA_OBJETIVO)
+        X = df
 
         self.feature_names = X.columns.tolist()
 
@@ -92,15 +104,56 @@ class ProcrastinationModel:
         print("3. DIVISION DE DATOS")
         print("=" * 80)
 
-        X_train, X_test, y_train, y_test = train_test_split(
-            X, y, test_size=TEST_SIZE, random_state=RANDOM_STATE
+        # Se dividen posiciones (misma particion que dividir X e y) para
+        # poder guardarlas en el almacen de features
+        indices_train, indices_test = train_test_split(
+            np.arange(len(X)), test_size=TEST_SIZE, random_state=RANDOM_STATE
         )
+        self.indices_division = (indices_train, indices_test)
+        X_train, X_test = X.iloc[indices_train], X.iloc[indices_test]
+        y_train, y_test = y.iloc[indices_train], y.iloc[indices_test]
 
         print(f"✓ Conjunto de entrenamiento: {X_train.shape[0]} muestras ({(1-TEST_SIZE)*100:.0f}%)")
         print(f"✓ Conjunto de prueba: {X_test.shape[0]} muestras ({TEST_SIZE*100:.0f}%)")
 
         return X_train, X_test, y_train, y_test
 
+    def cargar_features(self, cache=None, recalcular=False):
+        """
+        Pasos 1 a 3 (carga, preprocesamiento y division) con almacen de features
+
+        Si el almacen ya tiene una entrada para el contenido del dataset y esta
+        configuracion se abre con mmap; si no, se ejecutan los pasos y se guarda.
+
+        Returns:
+            tuple: (X, y, X_train, X_test, y_train, y_test)
+        """
+        clave, config = clave_features(test_size=TEST_SIZE, random_state=RANDOM_STATE)
+        almacen = None if recalcular else AlmacenFeatures.abrir(clave)
+
+        if almacen is None:
+            df = self.cargar_datos(cache)
+            X, y = self.preprocesar_datos(df)
+            self.dividir_datos(X, y)
+            almacen = AlmacenFeatures.guardar(clave, config, X, y, self.label_encoders,
+                                              *self.indices_division)
+            print(f"\n✓ Features guardadas en el almacen: {almacen.directorio}")
+        else:
+            print("=" * 80)
+            print("1-3. FEATURES DESDE EL ALMACEN")
+            print("=" * 80)
+            print(f"✓ Entrada {clave} (dataset {config['hash_dataset'][:12]}): {almacen.directorio}")
+            print(f"✓ X: {almacen.X.shape[0]} filas x {almacen.X.shape[1]} variables (mmap)")
+            print(f"✓ Conjunto de entrenamiento: {len(almacen.indices_train)} muestras")
+            print(f"✓ Conjunto de prueba: {len(almacen.indices_test)} muestras")
+
+        # Ambos caminos entrenan sobre los mismos arrays del almacen
+        self.label_encoders = almacen.label_encoders()
+        self.feature_names = list(almacen.feature_names)
+        self.indices_division = (almacen.indices_train, almacen.indices_test)
+        X, y = almacen.dataframes()
+        return (X, y) + almacen.division()
+
     def entrenar_baseline(self, X_train, y_train, X_test, y_test):
         """Entrena modelo baseline (Regresion Lineal)"""
         print("\n" + "=" * 80)
@@ -136,27 +189,62 @@ class ProcrastinationModel:
 
         return self.baseline_model
 
-    def entrenar_random_forest(self, X_train, y_train, X_test, y_test):
+    def buscar_hiperparametros(self, X_train, y_train, estrategia, n_candidatos=20,
+                               workers=None, tolerancia_r2=0.005):
+        """
+        Busca hiperparametros en paralelo segun R² de validacion cruzada y
+        latencia de inferencia, y escribe el reporte de Pareto
+
+        Returns:
+            dict: Hiperparametros del candidato elegido
+        """
+        print("\n" + "=" * 80)
+        print(f"4b. BUSQUEDA DE HIPERPARAMETROS ({estrategia})")
+        print("=" * 80)
+
+        buscador = BuscadorHiperparametros(estrategia, n_candidatos=n_candidatos, workers=workers)
+        print(f"✓ {buscador.workers} procesos en paralelo")
+        resultados = buscador.buscar(X_train, y_train)
+
+        frente = frente_pareto(resultados)
+        elegido = elegir_candidato(frente, tolerancia_r2)
+        ruta = escribir_reporte(resultados, frente, elegido, buscador)
+
+        print(f"\nFrente de Pareto (R² vs latencia de una fila):\n")
+        print(f"  {'R² (cv)':<10} {'1 fila (ms)':<13} {'lote (ms)':<11} {'nodos':<9} hiperparametros")
+        for resultado in frente:
+            marca = '*' if resultado is elegido else ' '
+            print(f"{marca} {resultado['cv_r2']:<10.4f} {resultado['latencia_fila_ms']:<13.3f} "
+                  f"{resultado['latencia_lote_ms']:<11.3f} {resultado['nodos']:<9d} {resultado['parametros']}")
+        print(f"\n✓ Elegido (* el mas rapido a {tolerancia_r2} de R² del mejor): {elegido['parametros']}")
+        print(f"✓ Reporte guardado: {ruta}")
+
+        self.metrics['busqueda_hiperparametros'] = {
+            'estrategia': estrategia,
+            'candidatos': len(resultados),
+            'elegido': elegido,
+            'reporte': str(ruta),
+        }
+        return elegido['parametros']
+
+    def entrenar_random_forest(self, X_train, y_train, X_test, y_test, hiperparametros=None):
         """Entrena modelo Random Forest Regressor"""
         print("\n" + "=" * 80)
         print("5. ENTRENAMIENTO MODELO PRINCIPAL (Random Forest)")
         print("=" * 80)
 
+        hiperparametros = hiperparametros or HIPERPARAMETROS
+
         # Configuracion del modelo
         self.model = RandomForestRegressor(
-            n_estimators=100,
-            max_depth=15,
-            min_samples_split=5,
-            min_samples_leaf=2,
+            **hiperparametros,
             random_state=RANDOM_STATE,
             n_jobs=-1
         )
 
         print("Hiperparametros:")
-        print(f"  - n_estimators: 100")
-        print(f"  - max_depth: 15")
-        print(f"  - min_samples_split: 5")
-        print(f"  - min_samples_leaf: 2")
+        for nombre, valor in hiperparametros.items():
+            print(f"  - {nombre}: {valor}")
         print(f"\nEntrenando...")
 
         self.model.fit(X_train, y_train)
@@ -172,6 +260,7 @@ class ProcrastinationModel:
         test_mae = mean_absolute_error(y_test, y_pred_test)
 
         self.metrics['random_forest'] = {
+            'hiperparametros': dict(hiperparametros),
             'train_r2': train_r2,
             'test_r2': test_r2,
             'test_rmse': test_rmse,
@@ -258,36 +347,43 @@ class ProcrastinationModel:
         print("\n✓ Random Forest supera significativamente al baseline")
 
     def guardar_modelo(self):
-        """Guarda el modelo y encoders"""
+        """Guarda el modelo y encoders en un directorio de version nuevo y lo activa"""
         print("\n" + "=" * 80)
         print("9. GUARDANDO MODELO")
         print("=" * 80)
 
-        modelo_path = Path("ml/models/random_forest_model.pkl")
-        encoders_path = Path("ml/models/label_encoders.pkl")
-        features_path = Path("ml/models/feature_names.pkl")
-        metrics_path = Path("ml/models/metrics.pkl")
-
-        # Guardar modelo
-        joblib.dump(self.model, modelo_path)
-        print(f"✓ Modelo guardado: {modelo_path}")
-
-        # Guardar encoders
-        joblib.dump(self.label_encoders, encoders_path)
-        print(f"✓ Label encoders guardados: {encoders_path}")
-
-        # Guardar nombres de features
-        joblib.dump(self.feature_names, features_path)
-        print(f"✓ Feature names guardados: {features_path}")
+        version, directorio = guardar_version(
+            self.model, self.label_encoders, self.feature_names, self.metrics
+        )
 
-        # Guardar metricas
-        joblib.dump(self.metrics, metrics_path)
-        print(f"✓ Metricas guardadas: {metrics_path}")
+        print(f"✓ Modelo guardado: {directorio / 'random_forest_model.pkl'}")
+        print(f"✓ Bosque aplanado guardado: {directorio / 'random_forest_plano.npz'} "
+              f"({sum(e.tree_.node_count for e in self.model.estimators_)} nodos)")
+        print(f"✓ Bosque para mmap guardado: {directorio / 'random_forest_plano'}/")
+        print(f"✓ Label encoders guardados: {directorio / 'label_encoders.pkl'}")
+        print(f"✓ Feature names guardados: {directorio / 'feature_names.pkl'}")
+        print(f"✓ Metricas guardadas: {directorio / 'metrics.pkl'}")
+        print(f"✓ Version {version} guardada en {directorio}/ y activada")
 
         print(f"\n✓ Todos los archivos guardados exitosamente")
 
 def main():
     """Funcion principal"""
+    parser = argparse.ArgumentParser(description="Entrena el modelo de procrastinacion")
+    parser.add_argument('--busqueda', choices=ESTRATEGIAS,
+                        help='Busca hiperparametros antes de entrenar (por defecto se usan los fijos)')
+    parser.add_argument('--candidatos', type=int, default=20,
+                        help='Candidatos a muestrear en busqueda aleatoria o sucesiva')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Procesos de la busqueda (por defecto, todos los nucleos)')
+    parser.add_argument('--cache', choices=FORMATOS_CACHE,
+                        help='Guarda el dataset ya tipado en cache (parquet o npy) y lo reutiliza')
+    parser.add_argument('--recalcular-features', action='store_true',
+                        help='Ignora el almacen de features y vuelve a preprocesar el CSV')
+    parser.add_argument('--tolerancia-r2', type=float, default=0.005,
+                        help='R² que se acepta perder frente al mejor a cambio de latencia')
+    args = parser.parse_args()
+
     print("\n" + "=" * 80)
     print(" " * 15 + "ENTRENAMIENTO DEL MODELO DE PROCRASTINACION")
     print("=" * 80)
@@ -295,20 +391,21 @@ def main():
     # Inicializar modelo
     pm = ProcrastinationModel()
 
-    # 1. Cargar datos
-    df = pm.cargar_datos()
-
-    # 2. Preprocesar
-    X, y = pm.preprocesar_datos(df)
-
-    # 3. Dividir datos
-    X_train, X_test, y_train, y_test = pm.dividir_datos(X, y)
+    # 1-3. Cargar, preprocesar y dividir (o reutilizar el almacen de features)
+    X, y, X_train, X_test, y_train, y_test = pm.cargar_features(args.cache, args.recalcular_features)
 
     # 4. Entrenar baseline
     pm.entrenar_baseline(X_train, y_train, X_test, y_test)
 
+    # 4b. Buscar hiperparametros (opcional)
+    hiperparametros = None
+    if args.busqueda:
+        hiperparametros = pm.buscar_hiperparametros(
+            X_train, y_train, args.busqueda, args.candidatos, args.workers, args.tolerancia_r2
+        )
+
     # 5. Entrenar Random Forest
-    pm.entrenar_random_forest(X_train, y_train, X_test, y_test)
+    pm.entrenar_random_forest(X_train, y_train, X_test, y_test, hiperparametros)
 
     # 6. Validacion cruzada
     pm.validacion_cruzada(X, y)
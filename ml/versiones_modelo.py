@@ -0,0 +1,183 @@
+"""
+Versiones de los artefactos del modelo
+
+Cada entrenamiento se guarda en su propio directorio ml/models/versiones/<version>/
+con un manifest.json (hash del modelo, features, clases de los encoders y
+metricas). El archivo ml/models/ACTUAL contiene el nombre de la version activa;
+se reemplaza de forma atomica, asi que un lector nunca ve un valor a medias.
+Sin ACTUAL se usan los archivos sueltos de ml/models/ (formato anterior).
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+MODELOS_DIR = Path("ml/models")
+VERSIONES_DIR = MODELOS_DIR / "versiones"
+PUNTERO_ACTUAL = MODELOS_DIR / "ACTUAL"
+MANIFIESTO = "manifest.json"
+
+
+def hash_archivo(ruta):
+    """sha256 completo del contenido de un archivo"""
+    sha = hashlib.sha256()
+    with open(ruta, 'rb') as f:
+        for bloque in iter(lambda: f.read(1 << 20), b''):
+            sha.update(bloque)
+    return sha.hexdigest()
+
+
+def nueva_version(ruta_modelo):
+    """Nombre de version: fecha de creacion y prefijo del hash del modelo"""
+    return f"{datetime.now():%Y%m%d-%H%M%S}-{hash_archivo(ruta_modelo)[:8]}"
+
+
+def escribir_manifiesto(directorio, version, feature_names, label_encoders, metricas):
+    """
+    Escribe manifest.json describiendo los artefactos de un directorio de version
+
+    Returns:
+        dict: El manifiesto escrito
+    """
+    directorio = Path(directorio)
+    archivos = {
+        ruta.name: hash_archivo(ruta)
+        for ruta in sorted(directorio.iterdir()) if ruta.is_file() and ruta.name != MANIFIESTO
+    }
+    manifiesto = {
+        'version': version,
+        'creado': datetime.now().isoformat(timespec='seconds'),
+        'hash_modelo': archivos.get('random_forest_model.pkl'),
+        'archivos': archivos,
+        'feature_names': list(feature_names),
+        'encoders': {col: [str(clase) for clase in le.classes_] for col, le in label_encoders.items()},
+        'metricas': metricas,
+    }
+    with open(directorio / MANIFIESTO, 'w', encoding='utf-8') as f:
+        # Las metricas traen escalares y arrays de NumPy
+        json.dump(manifiesto, f, indent=2, ensure_ascii=False,
+                  default=lambda valor: valor.tolist() if hasattr(valor, 'tolist') else str(valor))
+    return manifiesto
+
+
+def leer_manifiesto(directorio):
+    """Manifiesto de un directorio de version, o None si no tiene"""
+    ruta = Path(directorio) / MANIFIESTO
+    if not ruta.exists():
+        return None
+    with open(ruta, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def version_activa():
+    """Nombre de la version activa, o None si se usa el formato anterior"""
+    try:
+        return PUNTERO_ACTUAL.read_text(encoding='utf-8').strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def directorio_activo():
+    """Directorio de artefactos que debe cargar el predictor"""
+    version = version_activa()
+    return VERSIONES_DIR / version if version else MODELOS_DIR
+
+
+def activar_version(version):
+    """Apunta ACTUAL a una version existente (reemplazo atomico)"""
+    if not (VERSIONES_DIR / version).is_dir():
+        raise ValueError(f"No existe la version de modelo: {version}")
+    temporal = PUNTERO_ACTUAL.with_suffix('.tmp')
+    temporal.write_text(version + '\n', encoding='utf-8')
+    os.replace(temporal, PUNTERO_ACTUAL)
+
+
+def guardar_version(modelo, label_encoders, feature_names, metricas, activar=True):
+    """
+    Guarda los artefactos de un modelo entrenado en un directorio de version nuevo
+
+    Se escribe en un directorio temporal que se renombra al terminar, asi
+    nadie carga una version a medio guardar.
+
+    Args:
+        modelo: RandomForestRegressor entrenado
+        activar (bool): Apuntar ACTUAL a la version nueva
+
+    Returns:
+        tuple: (version, directorio)
+    """
+    import joblib
+    from bosque_plano import guardar_bosque_plano, guardar_bosque_mmap
+
+    VERSIONES_DIR.mkdir(parents=True, exist_ok=True)
+    temporal = VERSIONES_DIR / f".nueva-{os.getpid()}"
+    temporal.mkdir()
+
+    # Modelo sin compresion, para poder abrirlo con mmap_mode='r'
+    joblib.dump(modelo, temporal / "random_forest_model.pkl")
+    # Bosque aplanado para el motor de inferencia de predict.py, y el mismo
+    # bosque ya compilado con un .npy por array para abrirlo con mmap
+    guardar_bosque_plano(modelo, temporal / "random_forest_plano.npz")
+    guardar_bosque_mmap(modelo, temporal / "random_forest_plano")
+    joblib.dump(label_encoders, temporal / "label_encoders.pkl")
+    joblib.dump(feature_names, temporal / "feature_names.pkl")
+    joblib.dump(metricas, temporal / "metrics.pkl")
+
+    version = nueva_version(temporal / "random_forest_model.pkl")
+    escribir_manifiesto(temporal, version, feature_names, label_encoders, metricas)
+    directorio = VERSIONES_DIR / version
+    os.rename(temporal, directorio)
+    if activar:
+        activar_version(version)
+    return version, directorio
+
+
+def listar_versiones():
+    """Versiones disponibles, de la mas antigua a la mas reciente"""
+    if not VERSIONES_DIR.is_dir():
+        return []
+    # Los directorios que empiezan con '.' son versiones a medio escribir
+    return sorted(ruta.name for ruta in VERSIONES_DIR.iterdir()
+                  if ruta.is_dir() and not ruta.name.startswith('.'))
+
+
+class VigilanteModelo:
+    """
+    Hilo que revisa ACTUAL cada `intervalo` segundos y recarga el predictor
+    cuando cambia la version activa
+    """
+
+    def __init__(self, predictor, intervalo=30):
+        self.predictor = predictor
+        self.intervalo = intervalo
+        self._detener = threading.Event()
+        self._hilo = None
+
+    @classmethod
+    def desde_entorno(cls, predictor):
+        """Crea el vigilante segun MODELO_VIGILAR_SEGUNDOS, o None si vale 0"""
+        intervalo = float(os.getenv('MODELO_VIGILAR_SEGUNDOS', '0'))
+        return cls(predictor, intervalo) if intervalo > 0 else None
+
+    def iniciar(self):
+        if self._hilo is None or not self._hilo.is_alive():
+            self._detener.clear()
+            self._hilo = threading.Thread(target=self._vigilar, name='vigilante-modelo', daemon=True)
+            self._hilo.start()
+
+    def detener(self):
+        self._detener.set()
+
+    def _vigilar(self):
+        while not self._detener.wait(self.intervalo):
+            artefactos = self.predictor.artefactos
+            directorio = directorio_activo()
+            # Solo se compara una vez cargado; la primera carga la hace el uso normal
+            if artefactos is not None and Path(artefactos.directorio) != directorio:
+                print(f"Nueva version de modelo detectada: {directorio.name}")
+                inicio = time.perf_counter()
+                if self.predictor.recargar(directorio):
+                    print(f"Modelo {directorio.name} activo en {time.perf_counter() - inicio:.2f}s")
@@ -0,0 +1,435 @@
+"""
+Prueba de carga local con trafico sintetico
+
+Cada usuario virtual toma como perfil una fila de
+teen_phone_addiction_dataset.csv (distribucion conjunta real de las
+respuestas): se registra por /register con la edad y el genero de esa fila,
+inicia sesion por /login y luego recorre una mezcla de rutas (/index,
+/formulario, /procesar_formulario seguido de /resultados y
+/cuenta/resultados). Cada formulario enviado es el perfil con un poco de ruido,
+como si el mismo estudiante respondiera de nuevo.
+
+Los usuarios son hilos con su propia conexion HTTP keep-alive y sus cookies.
+Al terminar se reporta el throughput y, por ruta, las peticiones, la tasa de
+errores y las latencias p50/p95/p99. Las peticiones que terminan durante el
+calentamiento no entran en las estadisticas.
+
+Para comparar configuraciones se puede dejar que el script levante el
+servidor (--servidor) con las variables de entorno de cada corrida, y guardar
+cada reporte con --salida:
+
+    GUNICORN_WORKERS=4 GUNICORN_THREADS=2 DATABASE_PROFILE=rendimiento \\
+        python prueba_carga.py --servidor "gunicorn -c gunicorn.conf.py app:app" \\
+        --concurrencia 16 --duracion 60 --salida carga_w4t2.json
+
+Uso: python prueba_carga.py [--url URL] [--concurrencia N] [--duracion S] [--mezcla index=4,...]
+"""
+import argparse
+import http.client
+import json
+import os
+import shlex
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode, urlsplit
+
+import numpy as np
+
+sys.path.insert(0, 'ml')
+
+# nombre -> (metodo, ruta, status esperado)
+RUTAS = {
+    'index': ('GET', '/index', 200),
+    'formulario': ('GET', '/formulario', 200),
+    'procesar_formulario': ('POST', '/procesar_formulario', 302),
+    'cuenta_resultados': ('GET', '/cuenta/resultados', 200),
+}
+MEZCLA = 'index=4,formulario=2,procesar_formulario=2,cuenta_resultados=2'
+
+# Opciones de formulario.html y su equivalente en el dataset
+APPS = ['whatsapp', 'instagram', 'facebook', 'youtube', 'tiktok', 'twitter', 'snapchat', 'telegram', 'otros']
+PROPOSITOS = {
+    'Education': ['educacion'],
+    'Social Media': ['redes'],
+    'Browsing': ['entretenimiento'],
+    'Gaming': ['juegos'],
+    'Other': ['comunicacion', 'otro'],
+}
+GENEROS = {'Male': 'M', 'Female': 'F', 'Other': 'O'}
+
+# Campo del formulario -> (columna del dataset, factor de escala, decimales)
+CAMPOS_NUMERICOS = {
+    'daily_usage': ('Daily_Usage_Hours', 1, 1),
+    'sleephours': ('Sleep_Hours', 1, 1),
+    'academic_perf': ('Academic_Performance', 1 / 20, 1),  # 0-100 -> 0-5
+    'exercise': ('Exercise_Hours', 1, 1),
+    'screen_before_bed': ('Screen_Time_Before_Bed', 1, 1),
+    'checks_per_day': ('Phone_Checks_Per_Day', 1, 0),
+    'time_social_media': ('Time_on_Social_Media', 1, 1),
+    'time_gaming': ('Time_on_Gaming', 1, 1),
+    'time_education': ('Time_on_Education', 1, 1),
+    'weekend_usage': ('Weekend_Usage_Hours', 1, 1),
+}
+
+# Desviacion del ruido de cada envio, como fraccion de la desviacion de la columna
+RUIDO = 0.1
+
+CLAVE_USUARIOS = 'carga123'
+
+
+class GeneradorFormularios:
+    """Perfiles y formularios muestreados del dataset"""
+
+    def __init__(self, ruta=None):
+        from cargador_datos import RUTA_DATASET, cargar_dataset
+
+        df = cargar_dataset(ruta or RUTA_DATASET)
+        self.n = len(df)
+        self.columnas = {}
+        for campo, (columna, escala, _) in CAMPOS_NUMERICOS.items():
+            valores = df[columna].to_numpy(dtype=np.float64) * escala
+            self.columnas[campo] = (valores, valores.std() * RUIDO, valores.min(), valores.max())
+        self.edades = df['Age'].to_numpy()
+        self.generos = df['Gender'].astype(str).to_numpy()
+        self.propositos = df['Phone_Usage_Purpose'].astype(str).to_numpy()
+        self.apps = df['Apps_Used_Daily'].to_numpy()
+
+    def perfil(self, rng):
+        """Indice de una fila del dataset"""
+        return int(rng.integers(self.n))
+
+    def cuenta(self, fila):
+        return {'edad': int(self.edades[fila]), 'genero': GENEROS.get(self.generos[fila], 'O')}
+
+    def formulario(self, fila, rng):
+        """Formulario del perfil `fila` con ruido en las respuestas numericas"""
+        datos = {}
+        for campo, (valores, desviacion, minimo, maximo) in self.columnas.items():
+            decimales = CAMPOS_NUMERICOS[campo][2]
+            valor = float(np.clip(valores[fila] + rng.normal(0, desviacion), minimo, maximo))
+            datos[campo] = str(int(round(valor))) if decimales == 0 else f"{valor:.{decimales}f}"
+
+        n_apps = int(np.clip(self.apps[fila], 1, len(APPS)))
+        datos['apps_daily'] = [str(app) for app in rng.choice(APPS, size=n_apps, replace=False)]
+        datos['purpose'] = str(rng.choice(PROPOSITOS.get(self.propositos[fila], ['otro'])))
+        return datos
+
+
+class ClienteHTTP:
+    """Conexion keep-alive con cookies, sin seguir redirecciones"""
+
+    def __init__(self, url, timeout):
+        partes = urlsplit(url)
+        self.host = partes.hostname
+        self.port = partes.port or 80
+        self.timeout = timeout
+        self.cookies = {}
+        self.conexion = None
+
+    def peticion(self, metodo, ruta, datos=None):
+        """
+        Returns:
+            tuple: (status, cabecera Location, cuerpo)
+        """
+        cabeceras = {}
+        cuerpo = None
+        if self.cookies:
+            cabeceras['Cookie'] = '; '.join(f"{k}={v}" for k, v in self.cookies.items())
+        if datos is not None:
+            cuerpo = urlencode(datos, doseq=True)
+            cabeceras['Content-Type'] = 'application/x-www-form-urlencoded'
+
+        if self.conexion is None:
+            self.conexion = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        try:
+            self.conexion.request(metodo, ruta, body=cuerpo, headers=cabeceras)
+            respuesta = self.conexion.getresponse()
+            contenido = respuesta.read()
+        except (OSError, http.client.HTTPException):
+            # La siguiente peticion abre una conexion nueva
+            self.cerrar()
+            raise
+
+        for encabezado in respuesta.headers.get_all('Set-Cookie') or []:
+            for nombre, morsel in SimpleCookie(encabezado).items():
+                self.cookies[nombre] = morsel.value
+        return respuesta.status, respuesta.headers.get('Location', ''), contenido
+
+    def cerrar(self):
+        if self.conexion is not None:
+            self.conexion.close()
+            self.conexion = None
+
+
+class Registro:
+    """Latencias y errores de un usuario virtual (se combinan al final)"""
+
+    def __init__(self, desde):
+        self.desde = desde
+        self.latencias = defaultdict(list)
+        self.errores = Counter()
+        self.motivos = Counter()
+
+    def anotar(self, ruta, inicio, fin, error=None):
+        if fin < self.desde:
+            return  # calentamiento
+        self.latencias[ruta].append(fin - inicio)
+        if error:
+            self.errores[ruta] += 1
+            self.motivos[(ruta, error)] += 1
+
+
+class UsuarioVirtual(threading.Thread):
+    def __init__(self, indice, args, generador, mezcla, desde, hasta, retraso):
+        super().__init__(daemon=True)
+        self.indice = indice
+        self.args = args
+        self.generador = generador
+        self.nombres, self.pesos = mezcla
+        self.hasta = hasta
+        self.retraso = retraso
+        self.rng = np.random.default_rng(args.semilla + indice)
+        self.cliente = ClienteHTTP(args.url, args.timeout)
+        self.registro = Registro(desde)
+
+    def pedir(self, ruta, metodo, url, esperado, datos=None, validar=None):
+        """Hace una peticion y la anota; devuelve (status, location) o None si fallo"""
+        inicio = time.perf_counter()
+        try:
+            status, location, cuerpo = self.cliente.peticion(metodo, url, datos)
+        except (OSError, http.client.HTTPException) as e:
+            self.registro.anotar(ruta, inicio, time.perf_counter(), type(e).__name__)
+            return None
+        fin = time.perf_counter()
+
+        error = None
+        if status != esperado:
+            error = f"HTTP {status}" + (f" -> {location}" if location else '')
+        elif validar is not None:
+            error = validar(location, cuerpo)
+        self.registro.anotar(ruta, inicio, fin, error)
+        return None if error else (status, location)
+
+    def iniciar_sesion(self):
+        fila = self.generador.perfil(self.rng)
+        correo = f"carga-{os.getpid()}-{self.indice}-{int(time.time() * 1000)}@proyecto-ml.local"
+        registro = dict(nombre='Carga', apellido=f'U{self.indice}', correo=correo,
+                        clave=CLAVE_USUARIOS, confirmar_clave=CLAVE_USUARIOS, **self.generador.cuenta(fila))
+
+        def registrado(_, cuerpo):
+            return None if 'Registro exitoso'.encode('utf-8') in cuerpo else 'registro rechazado'
+
+        def con_sesion(location, _):
+            return None if location.endswith('/index') else f"redirige a {location}"
+
+        if self.pedir('register', 'POST', '/register', 200, registro, registrado) is None:
+            return None
+        if self.pedir('login', 'POST', '/login', 302, {'username': correo, 'password': CLAVE_USUARIOS},
+                      con_sesion) is None:
+            return None
+        return fila
+
+    def run(self):
+        time.sleep(self.retraso)
+        fila = self.iniciar_sesion()
+        if fila is None:
+            self.cliente.cerrar()
+            return
+
+        def procesado(location, _):
+            return None if '/resultados' in location else f"redirige a {location}"
+
+        while time.perf_counter() < self.hasta:
+            nombre = self.nombres[self.rng.choice(len(self.nombres), p=self.pesos)]
+            metodo, url, esperado = RUTAS[nombre]
+            if nombre == 'procesar_formulario':
+                respuesta = self.pedir(nombre, metodo, url, esperado,
+                                       self.generador.formulario(fila, self.rng), procesado)
+                if respuesta is not None:
+                    # El navegador sigue la redireccion a la pagina de resultados
+                    self.pedir('resultados', 'GET', urlsplit(respuesta[1]).path, 200)
+            else:
+                self.pedir(nombre, metodo, url, esperado)
+
+            if self.args.pausa:
+                time.sleep(self.rng.exponential(self.args.pausa / 1000))
+        self.cliente.cerrar()
+
+
+def leer_mezcla(texto):
+    """'index=4,formulario=2' -> (nombres, probabilidades)"""
+    pesos = {}
+    for parte in texto.split(','):
+        nombre, _, peso = parte.partition('=')
+        nombre = nombre.strip()
+        if nombre not in RUTAS:
+            raise ValueError(f"Ruta desconocida en la mezcla: {nombre} (validas: {', '.join(RUTAS)})")
+        pesos[nombre] = float(peso or 1)
+    total = sum(pesos.values())
+    return list(pesos), [peso / total for peso in pesos.values()]
+
+
+def esperar_servidor(url, proceso, timeout=60):
+    """Espera a que /inicio responda; False si el proceso termina o se agota el tiempo"""
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        if proceso is not None and proceso.poll() is not None:
+            return False
+        cliente = ClienteHTTP(url, 2)
+        try:
+            if cliente.peticion('GET', '/inicio')[0] == 200:
+                return True
+        except (OSError, http.client.HTTPException):
+            time.sleep(0.25)
+        finally:
+            cliente.cerrar()
+    return False
+
+
+def resumir(registros, segundos):
+    """
+    Combina los registros de todos los usuarios
+
+    Returns:
+        dict: {'peticiones', 'errores', 'throughput', 'rutas': {ruta: estadisticas}, 'motivos'}
+    """
+    latencias = defaultdict(list)
+    errores = Counter()
+    motivos = Counter()
+    for registro in registros:
+        for ruta, valores in registro.latencias.items():
+            latencias[ruta].extend(valores)
+        errores.update(registro.errores)
+        motivos.update(registro.motivos)
+
+    rutas = {}
+    for ruta, valores in latencias.items():
+        ms = np.asarray(valores) * 1000
+        p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+        rutas[ruta] = {
+            'peticiones': len(ms),
+            'errores': errores[ruta],
+            'tasa_error': errores[ruta] / len(ms),
+            'por_segundo': len(ms) / segundos,
+            'p50_ms': float(p50),
+            'p95_ms': float(p95),
+            'p99_ms': float(p99),
+            'maximo_ms': float(ms.max()),
+        }
+
+    total = sum(r['peticiones'] for r in rutas.values())
+    total_errores = sum(errores.values())
+    return {
+        'peticiones': total,
+        'errores': total_errores,
+        'tasa_error': total_errores / total if total else 0.0,
+        'throughput': total / segundos,
+        'rutas': rutas,
+        'motivos': {f"{ruta}: {motivo}": n for (ruta, motivo), n in motivos.most_common()},
+    }
+
+
+def imprimir_reporte(resumen, segundos):
+    print(f"\nVentana medida: {segundos:.1f}s, {resumen['peticiones']} peticiones, "
+          f"{resumen['throughput']:.1f} peticiones/s, {resumen['tasa_error']:.2%} errores\n")
+    print(f"{'ruta':<22} {'pet.':>7} {'pet/s':>7} {'error':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    print("-" * 82)
+    for ruta, r in sorted(resumen['rutas'].items()):
+        print(f"{ruta:<22} {r['peticiones']:>7} {r['por_segundo']:>7.1f} {r['tasa_error']:>7.2%} "
+              f"{r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} {r['p99_ms']:>8.1f} {r['maximo_ms']:>8.1f}")
+    if resumen['motivos']:
+        print("\nErrores:")
+        for motivo, n in list(resumen['motivos'].items())[:10]:
+            print(f"  {n:>6}  {motivo}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga local con formularios del dataset")
+    parser.add_argument('--url', default='http://127.0.0.1:8000', help='Servidor a probar')
+    parser.add_argument('--servidor', help='Comando para levantar el servidor durante la prueba')
+    parser.add_argument('--concurrencia', type=int, default=8, help='Usuarios virtuales simultaneos')
+    parser.add_argument('--duracion', type=float, default=30, help='Segundos de prueba')
+    parser.add_argument('--calentamiento', type=float, default=5,
+                        help='Segundos iniciales que no entran en las estadisticas')
+    parser.add_argument('--rampa', type=float, default=0,
+                        help='Segundos en los que se reparten los arranques de los usuarios')
+    parser.add_argument('--mezcla', default=MEZCLA, help='Pesos de cada ruta: nombre=peso,...')
+    parser.add_argument('--pausa', type=float, default=0, help='Pausa media entre peticiones (ms)')
+    parser.add_argument('--timeout', type=float, default=30, help='Timeout por peticion (s)')
+    parser.add_argument('--semilla', type=int, default=42)
+    parser.add_argument('--salida', help='Guarda el reporte en JSON')
+    args = parser.parse_args()
+
+    mezcla = leer_mezcla(args.mezcla)
+    generador = GeneradorFormularios()
+
+    print("=" * 60)
+    print("PRUEBA DE CARGA")
+    print("=" * 60)
+    print(f"Servidor: {args.url}" + (f" ({args.servidor})" if args.servidor else ''))
+    print(f"Usuarios: {args.concurrencia}, duracion: {args.duracion}s "
+          f"(calentamiento {args.calentamiento}s, rampa {args.rampa}s)")
+    print(f"Mezcla: {', '.join(f'{n}={p:.0%}' for n, p in zip(*mezcla))}")
+    print(f"Perfiles muestreados de {generador.n} filas del dataset")
+
+    proceso = None
+    if args.servidor:
+        proceso = subprocess.Popen(shlex.split(args.servidor))
+    try:
+        if not esperar_servidor(args.url, proceso):
+            print(f"✗ El servidor no responde en {args.url}")
+            sys.exit(1)
+
+        inicio = time.perf_counter()
+        desde = inicio + args.calentamiento
+        hasta = inicio + args.duracion
+        usuarios = [
+            UsuarioVirtual(i, args, generador, mezcla, desde, hasta,
+                           args.rampa * i / args.concurrencia)
+            for i in range(args.concurrencia)
+        ]
+        for usuario in usuarios:
+            usuario.start()
+        for usuario in usuarios:
+            usuario.join()
+        segundos = max(time.perf_counter() - desde, 1e-9)
+    finally:
+        if proceso is not None:
+            proceso.terminate()
+            try:
+                proceso.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proceso.kill()
+
+    resumen = resumir([usuario.registro for usuario in usuarios], segundos)
+    imprimir_reporte(resumen, segundos)
+
+    if args.salida:
+        reporte = {
+            'fecha': datetime.now().isoformat(timespec='seconds'),
+            'configuracion': {
+                'url': args.url,
+                'servidor': args.servidor,
+                'concurrencia': args.concurrencia,
+                'duracion': args.duracion,
+                'calentamiento': args.calentamiento,
+                'mezcla': dict(zip(*mezcla)),
+                'pausa_ms': args.pausa,
+                'entorno': {clave: valor for clave, valor in os.environ.items()
+                            if clave.startswith(('GUNICORN_', 'DATABASE_', 'DB_POOL_', 'PREDICCION_'))},
+            },
+            'segundos_medidos': segundos,
+            **resumen,
+        }
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            json.dump(reporte, f, indent=2, ensure_ascii=False)
+        print(f"\n✓ Reporte guardado en {args.salida}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,316 @@
+"""
+Puntuacion por lotes fuera de la aplicacion web
+
+Lee formularios de un CSV (una columna por campo del formulario, con los
+mismos nombres que en formulario.html; edad, genero y grado_escolaridad
+opcionales como datos de cuenta) o de la tabla resultados, los divide en
+bloques y los puntua en un pool de procesos con ProcrastinationPredictor.
+Los resultados se escriben en orden, bloque por bloque, a un CSV, a NDJSON o de
+vuelta en la tabla resultados (re-puntuacion tras un reentrenamiento).
+
+La memoria depende del tamano de bloque y de los bloques en vuelo, no del
+tamano de la entrada. Despues de cada bloque escrito se guarda el offset
+alcanzado (filas leidas del CSV o ultimo id de resultados) en el archivo de
+progreso; --reanudar continua desde ahi.
+
+Uso:
+    python puntuar_lote.py --entrada encuestas.csv --salida puntajes.ndjson
+    python puntuar_lote.py --entrada bd --salida bd
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from pathlib import Path
+
+sys.path.insert(0, 'ml')
+
+# Campos del formulario que se leen de cada fila del CSV
+CAMPOS_FORMULARIO = (
+    'daily_usage', 'sleephours', 'academic_perf', 'exercise', 'screen_before_bed',
+    'checks_per_day', 'apps_daily', 'time_social_media', 'time_gaming',
+    'time_education', 'purpose', 'weekend_usage', 'age', 'gender', 'schoolgrade',
+)
+CAMPOS_CUENTA = ('edad', 'genero', 'grado_escolaridad')
+
+PROGRESO_BD = Path("instance/puntuar_lote.progreso")
+
+# Bloques enviados al pool por cada worker antes de esperar resultados
+BLOQUES_EN_VUELO_POR_WORKER = 2
+
+
+def formulario_desde_csv(fila):
+    """
+    Convierte una fila del CSV en (formulario, cuenta)
+
+    Las celdas vacias se omiten para que el predictor use sus valores por defecto.
+    """
+    datos = {}
+    for campo in CAMPOS_FORMULARIO:
+        valor = (fila.get(campo) or '').strip()
+        if valor:
+            datos[campo] = valor.split(',') if campo == 'apps_daily' else valor
+
+    cuenta = None
+    if (fila.get('edad') or '').strip():
+        cuenta = {campo: (fila.get(campo) or '').strip() or None for campo in CAMPOS_CUENTA}
+    return datos, cuenta
+
+
+def leer_csv(ruta, tamano_bloque, desde=0):
+    """
+    Bloques de (referencia, formulario, cuenta) de un CSV
+
+    La referencia es el numero de fila de datos (1 = primera fila tras el encabezado).
+
+    Yields:
+        tuple: (offset tras el bloque, bloque)
+    """
+    with open(ruta, newline='', encoding='utf-8') as f:
+        filas = islice(csv.DictReader(f), desde, None)
+        offset = desde
+        while True:
+            bloque = []
+            for fila in islice(filas, tamano_bloque):
+                offset += 1
+                bloque.append((offset, *formulario_desde_csv(fila)))
+            if not bloque:
+                return
+            yield offset, bloque
+
+
+def leer_bd(tamano_bloque, desde=0):
+    """
+    Bloques de (id, formulario, cuenta) de la tabla resultados, por id
+
+    Yields:
+        tuple: (ultimo id del bloque, bloque)
+    """
+    from app.models import Resultado
+
+    ultimo_id = desde
+    while True:
+        filas = Resultado.obtener_para_entrenamiento(ultimo_id, tamano_bloque)
+        if not filas:
+            return
+        ultimo_id = filas[-1]['id']
+        yield ultimo_id, [(f['id'], f['datos_formulario'], f['datos_cuenta']) for f in filas]
+
+
+def _iniciar_worker():
+    from predict import predictor
+    predictor.asegurar_cargado()
+
+
+def puntuar_bloque(bloque):
+    """
+    Puntua un bloque con una sola llamada a predecir_lote (se ejecuta en un worker)
+
+    Returns:
+        list de (referencia, resultado o None, error o None)
+    """
+    from predict import predictor
+
+    referencias = [ref for ref, _, _ in bloque]
+    formularios = [datos for _, datos, _ in bloque]
+    cuentas = [cuenta for _, _, cuenta in bloque]
+    try:
+        return list(zip(referencias, predictor.predecir_lote(formularios, cuentas), [None] * len(bloque)))
+    except Exception:
+        pass
+
+    # Algun formulario invalido: se repite fila por fila y cada una lleva su error
+    salida = []
+    for ref, datos, cuenta in bloque:
+        try:
+            salida.append((ref, predictor.predecir(datos, cuenta), None))
+        except Exception as e:
+            salida.append((ref, None, f"{type(e).__name__}: {e}"))
+    return salida
+
+
+class EscritorCSV:
+    COLUMNAS = ['referencia', 'prediccion', 'nivel', 'version_modelo', 'error']
+
+    def __init__(self, ruta, continuar):
+        nuevo = not continuar or not Path(ruta).exists()
+        self._archivo = open(ruta, 'a' if continuar else 'w', newline='', encoding='utf-8')
+        self._escritor = csv.writer(self._archivo)
+        if nuevo:
+            self._escritor.writerow(self.COLUMNAS)
+
+    def escribir(self, filas):
+        for ref, resultado, error in filas:
+            resultado = resultado or {}
+            self._escritor.writerow([ref, resultado.get('prediccion'), resultado.get('nivel'),
+                                     resultado.get('version_modelo'), error])
+        self._archivo.flush()
+
+    def cerrar(self):
+        self._archivo.close()
+
+
+class EscritorNDJSON:
+    def __init__(self, ruta, continuar):
+        self._archivo = open(ruta, 'a' if continuar else 'w', encoding='utf-8')
+
+    def escribir(self, filas):
+        for ref, resultado, error in filas:
+            linea = {'referencia': ref}
+            if resultado is not None:
+                linea.update({clave: resultado[clave] for clave in (
+                    'prediccion', 'nivel', 'recomendaciones', 'factores_riesgo', 'version_modelo')})
+            else:
+                linea['error'] = error
+            self._archivo.write(json.dumps(linea, ensure_ascii=False) + '\n')
+        self._archivo.flush()
+
+    def cerrar(self):
+        self._archivo.close()
+
+
+class EscritorBD:
+    """Reemplaza la prediccion de cada resultado; las estadisticas se rehacen al cerrar"""
+
+    def __init__(self):
+        from app.models import Resultado
+        self._resultado = Resultado
+        self.actualizadas = 0
+
+    def escribir(self, filas):
+        actualizadas = self._resultado.actualizar_predicciones([{
+            'id': ref,
+            'nivel_prediccion': resultado['nivel'],
+            'puntaje_prediccion': resultado['prediccion'],
+            'recomendaciones': resultado['recomendaciones'],
+            'factores_riesgo': resultado['factores_riesgo'],
+            'version_modelo': resultado['version_modelo'],
+        } for ref, resultado, _ in filas if resultado is not None])
+        if actualizadas is None:
+            raise RuntimeError("No se pudieron guardar las predicciones del bloque")
+        self.actualizadas += actualizadas
+
+    def cerrar(self):
+        if self.actualizadas:
+            usuarios = self._resultado.reconstruir_estadisticas()
+            print(f"Estadisticas reconstruidas para {usuarios} usuarios")
+
+
+def leer_progreso(ruta):
+    try:
+        with open(ruta, encoding='utf-8') as f:
+            return json.load(f)['offset']
+    except FileNotFoundError:
+        return 0
+
+
+def guardar_progreso(ruta, offset):
+    temporal = Path(f"{ruta}.tmp")
+    temporal.write_text(json.dumps({'offset': offset}), encoding='utf-8')
+    os.replace(temporal, ruta)
+
+
+def procesar(bloques, escritor, workers, ruta_progreso):
+    """
+    Puntua los bloques y los escribe en orden de entrada
+
+    Returns:
+        dict con filas, errores, segundos y ultimo offset
+    """
+    estado = {'filas': 0, 'errores': 0, 'offset': None}
+    inicio = time.perf_counter()
+
+    def completar(offset, filas):
+        escritor.escribir(filas)
+        guardar_progreso(ruta_progreso, offset)
+        estado['filas'] += len(filas)
+        estado['errores'] += sum(1 for _, resultado, _ in filas if resultado is None)
+        estado['offset'] = offset
+        transcurrido = time.perf_counter() - inicio
+        print(f"  offset {offset}: {estado['filas']} filas, {estado['errores']} errores, "
+              f"{estado['filas'] / transcurrido:.0f} filas/s")
+
+    if workers == 0:
+        _iniciar_worker()
+        for offset, bloque in bloques:
+            completar(offset, puntuar_bloque(bloque))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_iniciar_worker) as pool:
+            # Pocos bloques en vuelo: la memoria no crece con la entrada
+            en_vuelo = deque()
+            for offset, bloque in bloques:
+                en_vuelo.append((offset, pool.submit(puntuar_bloque, bloque)))
+                if len(en_vuelo) >= workers * BLOQUES_EN_VUELO_POR_WORKER:
+                    offset_listo, futuro = en_vuelo.popleft()
+                    completar(offset_listo, futuro.result())
+            while en_vuelo:
+                offset_listo, futuro = en_vuelo.popleft()
+                completar(offset_listo, futuro.result())
+
+    estado['segundos'] = time.perf_counter() - inicio
+    return estado
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Puntuacion por lotes con ProcrastinationPredictor")
+    parser.add_argument('--entrada', required=True, help="Ruta de un CSV, o 'bd' para la tabla resultados")
+    parser.add_argument('--salida', required=True,
+                        help="Ruta .csv o .ndjson, o 'bd' para actualizar la tabla resultados")
+    parser.add_argument('--tamano-bloque', type=int, default=1000, help='Filas por bloque')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='Procesos del pool (0 = en este proceso)')
+    parser.add_argument('--desde', type=int, default=None,
+                        help='Offset inicial: filas del CSV ya procesadas o ultimo id de resultados')
+    parser.add_argument('--reanudar', action='store_true', help='Continua desde el archivo de progreso')
+    args = parser.parse_args()
+
+    desde_bd = args.entrada == 'bd'
+    hacia_bd = args.salida == 'bd'
+    ruta_progreso = PROGRESO_BD if hacia_bd else Path(f"{args.salida}.progreso")
+
+    if args.desde is not None:
+        desde = args.desde
+    elif args.reanudar:
+        desde = leer_progreso(ruta_progreso)
+    else:
+        desde = 0
+    continuar = desde > 0
+
+    if desde_bd or hacia_bd:
+        from app.database import db
+        db.inicializar_esquema()
+
+    if hacia_bd:
+        escritor = EscritorBD()
+    elif args.salida.endswith('.ndjson') or args.salida.endswith('.jsonl'):
+        escritor = EscritorNDJSON(args.salida, continuar)
+    else:
+        escritor = EscritorCSV(args.salida, continuar)
+
+    bloques = leer_bd(args.tamano_bloque, desde) if desde_bd else leer_csv(args.entrada, args.tamano_bloque, desde)
+
+    print("=" * 60)
+    print("PUNTUACION POR LOTES")
+    print("=" * 60)
+    print(f"Entrada: {args.entrada} (desde offset {desde})")
+    print(f"Salida: {args.salida}")
+    print(f"Bloques de {args.tamano_bloque} filas, {args.workers} workers\n")
+
+    try:
+        estado = procesar(bloques, escritor, args.workers, ruta_progreso)
+    finally:
+        escritor.cerrar()
+
+    print(f"\n✓ {estado['filas']} filas en {estado['segundos']:.2f}s "
+          f"({estado['filas'] / max(estado['segundos'], 1e-9):.0f} filas/s), {estado['errores']} errores")
+    if estado['offset'] is not None:
+        print(f"✓ Ultimo offset: {estado['offset']} (guardado en {ruta_progreso})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,287 @@
+"""
+Reentrenamiento incremental con los resultados guardados en produccion
+
+Recorre por bloques los resultados nuevos desde el ultimo punto de control
+(ml/models/reentrenamiento.json), los convierte a features con la misma logica
+que usa el predictor (extraer_features + codificacion de la version activa) y
+actualiza el bosque activo sin reentrenarlo completo:
+  - agrega `--arboles` arboles con warm_start, entrenados con las filas nuevas
+    mas una muestra del conjunto de entrenamiento original (--replay), para que
+    el bosque no olvide el dataset etiquetado
+  - si el bosque supera `--max-arboles` se descartan los arboles mas antiguos,
+    asi el costo de servir queda acotado y el bosque es una ventana deslizante
+    sobre los reentrenamientos
+La version nueva se evalua contra el conjunto de prueba del almacen de features
+y solo se activa si su R² no cae mas de `--tolerancia-r2`. El punto de control
+solo avanza cuando la version se activa: un rango rechazado (o guardado con
+--sin-activar) queda registrado en el historial y se vuelve a leer, junto con
+las filas posteriores, en el siguiente reentrenamiento.
+
+La etiqueta de cada fila es el valor observado de `--columna-etiqueta` (por
+defecto puntaje_observado); las filas sin valor se omiten. Si la tabla
+resultados no tiene esa columna el script se detiene: entrenar con
+puntaje_prediccion seria entrenar el bosque con sus propias predicciones.
+Una etiqueta anotada despues de que el punto de control paso su fila no se usa.
+
+Uso: python reentrenar.py [--columna-etiqueta COLUMNA] [--arboles N] [--max-arboles N]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, 'ml')
+
+PUNTO_CONTROL = Path("ml/models/reentrenamiento.json")
+
+# Historial de reentrenamientos que se conserva en el punto de control
+MAXIMO_HISTORIAL = 100
+
+
+def leer_punto_control():
+    """Ultimo ID procesado e historial, o valores iniciales si no hay punto de control"""
+    if not PUNTO_CONTROL.exists():
+        return {'ultimo_id': 0, 'historial': []}
+    with open(PUNTO_CONTROL, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def guardar_punto_control(punto_control):
+    """Escribe el punto de control de forma atomica"""
+    temporal = PUNTO_CONTROL.with_suffix('.tmp')
+    with open(temporal, 'w', encoding='utf-8') as f:
+        json.dump(punto_control, f, indent=2, ensure_ascii=False)
+    os.replace(temporal, PUNTO_CONTROL)
+
+
+def registrar_reentrenamiento(punto_control, registro, ultimo_id):
+    """
+    Agrega un reentrenamiento al historial y avanza el punto de control
+
+    El ultimo ID solo avanza si la version se activo; si no, los mismos
+    resultados se vuelven a usar en el siguiente reentrenamiento.
+
+    Args:
+        punto_control (dict): Punto de control leido con leer_punto_control
+        registro (dict): Entrada del historial, con la clave 'activada'
+        ultimo_id (int): Ultimo ID de resultados usado en el reentrenamiento
+
+    Returns:
+        dict: El mismo punto de control, actualizado
+    """
+    if registro['activada']:
+        punto_control['ultimo_id'] = ultimo_id
+    punto_control['historial'].append(registro)
+    punto_control['historial'] = punto_control['historial'][-MAXIMO_HISTORIAL:]
+    return punto_control
+
+
+def convertir_bloque(predictor, artefactos, bloque):
+    """
+    Convierte un bloque de resultados a la matriz de features
+
+    Returns:
+        tuple: (X, y, filas descartadas por datos invalidos)
+    """
+    formularios = [fila['datos_formulario'] for fila in bloque]
+    cuentas = [fila['datos_cuenta'] for fila in bloque]
+    puntajes = np.array([fila['etiqueta'] for fila in bloque], dtype=np.float64)
+
+    try:
+        X = predictor.preparar_lote(formularios, cuentas, artefactos)
+        return X, puntajes, 0
+    except (ValueError, TypeError, KeyError):
+        pass
+
+    # Algun formulario del bloque no se puede convertir: se repite fila por
+    # fila y se descartan solo las invalidas
+    filas, etiquetas = [], []
+    for datos, cuenta, puntaje in zip(formularios, cuentas, puntajes):
+        try:
+            filas.append(predictor.preparar_vector(datos, cuenta, artefactos))
+            etiquetas.append(puntaje)
+        except (ValueError, TypeError, KeyError):
+            continue
+    X = np.array(filas, dtype=np.float64).reshape(len(filas), len(artefactos.feature_names))
+    return X, np.array(etiquetas, dtype=np.float64), len(bloque) - len(filas)
+
+
+def leer_nuevos(predictor, artefactos, desde_id, tamano_bloque, columna_etiqueta, tiempos):
+    """
+    Recorre los resultados etiquetados posteriores a `desde_id` y los convierte
+    a features
+
+    Returns:
+        tuple: (X float32, y, ultimo ID leido, filas descartadas)
+    """
+    from app.models import Resultado
+
+    bloques_X, bloques_y = [], []
+    ultimo_id, descartadas = desde_id, 0
+    while True:
+        inicio = time.perf_counter()
+        bloque = Resultado.obtener_para_entrenamiento(ultimo_id, tamano_bloque, columna_etiqueta)
+        tiempos['lectura'] += time.perf_counter() - inicio
+        if not bloque:
+            break
+
+        inicio = time.perf_counter()
+        X, y, invalidas = convertir_bloque(predictor, artefactos, bloque)
+        # Los arboles entrenan en float32; asi se acumula la mitad de memoria
+        bloques_X.append(X.astype(np.float32))
+        bloques_y.append(y)
+        tiempos['conversion'] += time.perf_counter() - inicio
+
+        descartadas += invalidas
+        ultimo_id = bloque[-1]['id']
+
+    n_features = len(artefactos.feature_names)
+    X = np.concatenate(bloques_X) if bloques_X else np.empty((0, n_features), dtype=np.float32)
+    y = np.concatenate(bloques_y) if bloques_y else np.empty(0)
+    return X, y, ultimo_id, descartadas
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reentrenamiento incremental con resultados de produccion")
+    parser.add_argument('--columna-etiqueta', default='puntaje_observado',
+                        help='Columna de resultados con el puntaje real observado')
+    parser.add_argument('--arboles', type=int, default=20, help='Arboles nuevos por reentrenamiento')
+    parser.add_argument('--max-arboles', type=int, default=200,
+                        help='Arboles maximos del bosque; se descartan los mas antiguos')
+    parser.add_argument('--minimo-filas', type=int, default=50,
+                        help='Filas nuevas necesarias para reentrenar')
+    parser.add_argument('--replay', type=float, default=1.0,
+                        help='Filas del dataset original por cada fila nueva')
+    parser.add_argument('--tamano-bloque', type=int, default=1000, help='Resultados leidos por consulta')
+    parser.add_argument('--tolerancia-r2', type=float, default=0.02,
+                        help='Caida maxima de R² (prueba) para activar la version nueva')
+    parser.add_argument('--sin-activar', action='store_true', help='Guarda la version sin activarla')
+    args = parser.parse_args()
+
+    import joblib
+    import pandas as pd
+    from sklearn.metrics import r2_score
+
+    from app.database import db
+    from app.models import Resultado
+    from almacen_features import AlmacenFeatures, clave_features
+    from predict import predictor
+    from versiones_modelo import directorio_activo, guardar_version, activar_version
+
+    print("=" * 60)
+    print("REENTRENAMIENTO INCREMENTAL")
+    print("=" * 60)
+
+    inicio_total = time.perf_counter()
+    tiempos = {'lectura': 0.0, 'conversion': 0.0}
+
+    db.inicializar_esquema()
+    if args.columna_etiqueta == 'puntaje_prediccion':
+        print("puntaje_prediccion es la salida del propio modelo, no una etiqueta observada")
+        return
+    if args.columna_etiqueta not in Resultado.columnas_tabla():
+        print(f"La tabla resultados no tiene la columna de etiqueta '{args.columna_etiqueta}'.")
+        print("Se necesita el puntaje real observado de cada resultado; no se reentrena")
+        return
+
+    almacen = AlmacenFeatures.abrir(clave_features()[0])
+    if almacen is None:
+        print("No hay features del dataset en el almacen. Ejecuta: python ml/train_model.py")
+        return
+
+    punto_control = leer_punto_control()
+    directorio = directorio_activo()
+    artefactos = predictor.cargar_artefactos(directorio)
+    print(f"Version base: {artefactos.version}")
+    print(f"Punto de control: resultados con id > {punto_control['ultimo_id']}")
+
+    X_nuevo, y_nuevo, ultimo_id, descartadas = leer_nuevos(
+        predictor, artefactos, punto_control['ultimo_id'], args.tamano_bloque,
+        args.columna_etiqueta, tiempos
+    )
+    print(f"Filas nuevas etiquetadas: {len(X_nuevo)} (descartadas: {descartadas}) "
+          f"en {tiempos['lectura'] + tiempos['conversion']:.2f}s")
+
+    if len(X_nuevo) < args.minimo_filas:
+        print(f"Se necesitan al menos {args.minimo_filas} filas nuevas; no se reentrena")
+        return
+
+    # Filas nuevas + muestra del conjunto de entrenamiento original
+    rng = np.random.default_rng(len(punto_control['historial']))
+    n_replay = min(int(len(X_nuevo) * args.replay), len(almacen.indices_train))
+    indices = rng.choice(almacen.indices_train, size=n_replay, replace=False)
+    X = pd.DataFrame(np.concatenate([X_nuevo, almacen.X[indices]]), columns=artefactos.feature_names)
+    y = np.concatenate([y_nuevo, almacen.y[indices]])
+
+    X_test, y_test = almacen.dataframes()
+    X_test, y_test = X_test.iloc[almacen.indices_test], y_test.iloc[almacen.indices_test]
+
+    modelo = joblib.load(directorio / "random_forest_model.pkl")
+    r2_antes = r2_score(y_test, modelo.predict(X_test))
+
+    inicio = time.perf_counter()
+    modelo.set_params(warm_start=True, n_estimators=len(modelo.estimators_) + args.arboles, n_jobs=-1)
+    modelo.fit(X, y)
+    descartados = max(0, len(modelo.estimators_) - args.max_arboles)
+    if descartados:
+        modelo.estimators_ = modelo.estimators_[descartados:]
+        modelo.n_estimators = len(modelo.estimators_)
+    tiempos['entrenamiento'] = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    r2_despues = r2_score(y_test, modelo.predict(X_test))
+    tiempos['evaluacion'] = time.perf_counter() - inicio
+    print(f"Arboles: +{args.arboles}, -{descartados} (total {len(modelo.estimators_)})")
+    print(f"R² (test): {r2_antes:.4f} -> {r2_despues:.4f}")
+
+    activar = not args.sin_activar and r2_despues >= r2_antes - args.tolerancia_r2
+    metricas = joblib.load(directorio / "metrics.pkl") if (directorio / "metrics.pkl").exists() else {}
+    metricas['reentrenamiento'] = {
+        'version_base': artefactos.version,
+        'filas_nuevas': len(X_nuevo),
+        'desde_id': punto_control['ultimo_id'],
+        'filas_replay': n_replay,
+        'hasta_id': ultimo_id,
+        'arboles_agregados': args.arboles,
+        'arboles_descartados': descartados,
+        'r2_test_antes': r2_antes,
+        'r2_test_despues': r2_despues,
+    }
+
+    inicio = time.perf_counter()
+    version, _ = guardar_version(modelo, artefactos.label_encoders, artefactos.feature_names,
+                                 metricas, activar=False)
+    if activar:
+        activar_version(version)
+    tiempos['guardado'] = time.perf_counter() - inicio
+    tiempos['total'] = time.perf_counter() - inicio_total
+
+    if activar:
+        print(f"✓ Version {version} guardada y activada")
+    else:
+        print(f"✗ Version {version} guardada sin activar; los resultados con id > "
+              f"{punto_control['ultimo_id']} se volveran a usar en el siguiente reentrenamiento")
+
+    registrar_reentrenamiento(punto_control, {
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'version': version,
+        'activada': activar,
+        **metricas['reentrenamiento'],
+        'filas_descartadas': descartadas,
+        'filas_por_segundo': len(X_nuevo) / max(tiempos['lectura'] + tiempos['conversion'], 1e-9),
+        'tiempos': {fase: round(segundos, 4) for fase, segundos in tiempos.items()},
+    }, ultimo_id)
+    guardar_punto_control(punto_control)
+
+    print("\nTiempos:")
+    for fase, segundos in tiempos.items():
+        print(f"  {fase:<15} {segundos:8.3f} s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+Reporte del tiempo de arranque de la aplicacion
+
+Muestra cuanto tarda cada fase (importar app, crear el esquema, cargar el
+modelo, primera prediccion) y que paquetes se llevan el tiempo de importacion
+segun `python -X importtime`.
+
+Uso: python reporte_arranque.py [--top N]
+"""
+import argparse
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+
+def tiempos_importacion(modulo='app'):
+    """
+    Importa un modulo en un proceso nuevo con -X importtime
+
+    Returns:
+        tuple: (total en segundos, dict paquete -> segundos propios)
+    """
+    salida = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {modulo}'],
+        capture_output=True, text=True
+    ).stderr
+
+    por_paquete = defaultdict(float)
+    total = 0.0
+    for linea in salida.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not linea.startswith('import time:') or 'self [us]' in linea:
+            continue
+        propio, acumulado, nombre = linea[len('import time:'):].split('|')
+        nombre = nombre.strip()
+        por_paquete[nombre.split('.')[0]] += int(propio) / 1e6
+        if nombre == modulo:
+            total = int(acumulado) / 1e6
+
+    return total, dict(por_paquete)
+
+
+def medir(descripcion, funcion, fases):
+    inicio = time.perf_counter()
+    resultado = funcion()
+    fases.append((descripcion, time.perf_counter() - inicio))
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--top', type=int, default=10, help='Paquetes a mostrar')
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("REPORTE DE ARRANQUE")
+    print("=" * 60)
+
+    total, por_paquete = tiempos_importacion('app')
+    print(f"\nImportar 'app' en un proceso nuevo: {total * 1000:.0f} ms")
+    print(f"\nPaquetes con mas tiempo de importacion propio (top {args.top}):")
+    for paquete, segundos in sorted(por_paquete.items(), key=lambda x: -x[1])[:args.top]:
+        print(f"  {paquete:<25} {segundos * 1000:8.1f} ms")
+
+    fases = []
+    medir("import app", lambda: __import__('app'), fases)
+
+    from app.database import db
+    from predict import predictor
+
+    medir("db.inicializar_esquema()", db.inicializar_esquema, fases)
+    medir("predictor.asegurar_cargado()", predictor.asegurar_cargado, fases)
+    medir("primera prediccion", lambda: predictor.predecir({}), fases)
+    medir("segunda prediccion", lambda: predictor.predecir({'daily_usage': '5'}), fases)
+
+    print("\nFases en este proceso:")
+    for descripcion, segundos in fases:
+        print(f"  {descripcion:<30} {segundos * 1000:8.1f} ms")
+
+    pesados = [m for m in ('pandas', 'sklearn', 'scipy', 'joblib') if m in sys.modules]
+    print(f"\nModulos pesados cargados al final: {', '.join(pesados) or 'ninguno'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""
+Reporte de memoria residente del modelo por worker
+
+Arranca N procesos nuevos (como workers de gunicorn sin preload) que cargan el
+modelo de dos formas y lo usan a la vez:
+  - copia: random_forest_plano.npz leido completo en memoria de cada proceso
+  - mmap:  directorio random_forest_plano/ abierto con np.load(mmap_mode='r')
+Con todos los procesos vivos mide en /proc/self/smaps_rollup cuanto crecio
+cada uno: RSS, memoria privada y PSS (la parte proporcional de las paginas
+compartidas). La diferencia de PSS es la memoria que ahorra cada worker.
+
+Solo funciona en Linux. Uso: python reporte_memoria.py [--workers N]
+"""
+import argparse
+import multiprocessing
+import sys
+from pathlib import Path
+
+BOSQUE_NPZ = Path("ml/models/random_forest_plano.npz")
+BOSQUE_MMAP = Path("ml/models/random_forest_plano")
+SMAPS = Path("/proc/self/smaps_rollup")
+
+
+def leer_memoria():
+    """RSS, PSS y memoria privada del proceso actual en KB"""
+    valores = {}
+    for linea in SMAPS.read_text().splitlines()[1:]:
+        partes = linea.split()
+        if len(partes) >= 2 and partes[1].isdigit():
+            valores[partes[0].rstrip(':')] = int(partes[1])
+    return {
+        'rss': valores.get('Rss', 0),
+        'pss': valores.get('Pss', 0),
+        'privada': valores.get('Private_Clean', 0) + valores.get('Private_Dirty', 0),
+    }
+
+
+def _worker(modo, barrera, cola):
+    sys.path.insert(0, 'ml')
+    import numpy as np
+    from bosque_plano import BosquePlano
+
+    antes = leer_memoria()
+    if modo == 'mmap':
+        bosque = BosquePlano.cargar_mmap(BOSQUE_MMAP)
+    else:
+        bosque = BosquePlano.cargar(BOSQUE_NPZ)
+
+    # Recorrer muchas filas toca practicamente todos los nodos del bosque
+    X = np.random.default_rng(0).uniform(0, 24, size=(2000, bosque.n_features_in_))
+    bosque.predict(X)
+
+    barrera.wait()
+    despues = leer_memoria()
+    cola.put({clave: despues[clave] - antes[clave] for clave in despues})
+    barrera.wait()
+
+
+def medir(modo, workers):
+    """Promedio por worker del crecimiento de memoria al cargar el modelo"""
+    contexto = multiprocessing.get_context('spawn')
+    barrera = contexto.Barrier(workers)
+    cola = contexto.Queue()
+    procesos = [contexto.Process(target=_worker, args=(modo, barrera, cola)) for _ in range(workers)]
+    for proceso in procesos:
+        proceso.start()
+    medidas = [cola.get() for _ in procesos]
+    for proceso in procesos:
+        proceso.join()
+
+    return {clave: sum(m[clave] for m in medidas) / workers for clave in medidas[0]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memoria residente del modelo por worker")
+    parser.add_argument('--workers', type=int, default=4, help='Procesos a lanzar')
+    args = parser.parse_args()
+
+    if not SMAPS.exists():
+        print("Este reporte necesita /proc/self/smaps_rollup (Linux)")
+        return
+    faltantes = [str(ruta) for ruta in (BOSQUE_NPZ, BOSQUE_MMAP) if not ruta.exists()]
+    if faltantes:
+        print(f"Faltan artefactos: {', '.join(faltantes)}. Ejecuta: python ml/train_model.py")
+        return
+
+    print("=" * 60)
+    print(f"MEMORIA DEL MODELO POR WORKER ({args.workers} workers)")
+    print("=" * 60)
+
+    resultados = {modo: medir(modo, args.workers) for modo in ('copia', 'mmap')}
+
+    print(f"\n{'modo':<8}{'RSS (KB)':>12}{'PSS (KB)':>12}{'privada (KB)':>15}")
+    for modo, memoria in resultados.items():
+        print(f"{modo:<8}{memoria['rss']:>12.0f}{memoria['pss']:>12.0f}{memoria['privada']:>15.0f}")
+
+    ahorro = resultados['copia']['pss'] - resultados['mmap']['pss']
+    print(f"\nAhorro por worker (PSS): {ahorro:.0f} KB")
+    print(f"Ahorro total con {args.workers} workers: {ahorro * args.workers / 1024:.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
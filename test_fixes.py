@@ -2,9 +2,12 @@
 Script de prueba para verificar que los problemas de login y sesión están resueltos
 """
 
+from app.database import db
 from app.models import Usuario, Resultado
 from datetime import datetime
 
+db.inicializar_esquema()
+
 print("="*60)
 print("VERIFICACIÓN DE CORRECCIONES")
 print("="*60)
@@ -0,0 +1,1040 @@
+"""
+Pruebas del modulo de prediccion (ml/predict.py)
+
+Se pueden ejecutar con pytest o directamente: python test_prediccion.py
+"""
+import importlib.util
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+
+# Las pruebas que usan app/ escriben en una base temporal
+BASE_PRUEBAS = str(Path(tempfile.mkdtemp()) / 'pruebas.db')
+os.environ['DATABASE_URL'] = BASE_PRUEBAS
+
+sys.path.insert(0, str(Path(__file__).parent / 'ml'))
+from predict import ProcrastinationPredictor, MODO_DATAFRAME
+from bosque_plano import BosquePlano, aplanar_bosque, guardar_bosque_mmap
+from cache_predicciones import CacheLRU
+from micro_lotes import MicroLoteador
+from reglas import RECOMENDACIONES, FACTORES_RIESGO, extraer_entradas
+from histogramas import HistogramaDeslizante
+from app import app, trazas
+from app.database import db, Database, PoolConexiones, PoolAgotadoError
+
+# Con pytest, test_fixes.py importa app.database antes que este archivo y la
+# base global ya apunta a instance/: se redirige a la temporal
+if db.db_path != BASE_PRUEBAS:
+    db.pool.cerrar()
+    db.db_path = BASE_PRUEBAS
+
+FORMULARIOS = [
+    # Formulario tipico enviado desde formulario.html
+    {
+        'daily_usage': '5.5', 'sleephours': '6', 'academic_perf': '3.5',
+        'exercise': '1', 'screen_before_bed': '1.5', 'checks_per_day': '120',
+        'apps_daily': ['whatsapp', 'instagram', 'tiktok'],
+        'time_social_media': '3.5', 'time_gaming': '0.5', 'time_education': '1',
+        'purpose': 'redes', 'weekend_usage': '8'
+    },
+    # Valores extremos y proposito desconocido
+    {
+        'daily_usage': '12', 'sleephours': '3', 'academic_perf': 'no-numerico',
+        'exercise': '0', 'screen_before_bed': '3', 'checks_per_day': '300',
+        'apps_daily': 'texto', 'time_social_media': '6', 'time_gaming': '4',
+        'time_education': '0', 'purpose': 'desconocido', 'weekend_usage': '14'
+    },
+    # Formulario vacio: todas las features toman su valor por defecto
+    {},
+]
+
+CUENTAS = [
+    None,
+    {'edad': 15, 'genero': 'F', 'grado_escolaridad': 'Secundaria'},
+    {'edad': '17', 'genero': 'M', 'grado_escolaridad': None},
+    {'edad': 20, 'genero': 'X', 'grado_escolaridad': '11th'},
+]
+
+
+def _casos():
+    for datos in FORMULARIOS:
+        for cuenta in CUENTAS:
+            yield datos, cuenta
+
+
+def _crear_usuario():
+    """Crea las tablas si hace falta y un usuario nuevo; devuelve su ID"""
+    from app.models import Usuario
+    db.inicializar_esquema()
+    return Usuario.crear_usuario('Ana', 'Prueba', 20, 'F', f'{uuid.uuid4().hex}@prueba.com', 'clave123')
+
+
+@contextmanager
+def _otra_base(ruta):
+    """Apunta la base global (y la memoria del catalogo) a otro archivo durante el bloque"""
+    from app.models import CatalogoMensajes
+    anterior = db.db_path
+    db.pool.cerrar()
+    db.db_path = ruta
+    CatalogoMensajes.limpiar()
+    try:
+        yield
+    finally:
+        db.pool.cerrar()
+        db.db_path = anterior
+        CatalogoMensajes.limpiar()
+
+
+def _cargar_migracion(nombre):
+    """Importa un script de database/migrations (su nombre empieza con un numero)"""
+    ruta = Path(__file__).parent / 'database' / 'migrations' / nombre
+    spec = importlib.util.spec_from_file_location(ruta.stem, ruta)
+    modulo = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(modulo)
+    return modulo
+
+
+def _resultado(usuario_id, puntaje, datos=None):
+    """Argumentos de Resultado.guardar_resultado / guardar_lote"""
+    return {
+        'usuario_id': usuario_id,
+        'nivel_prediccion': 'Alto' if puntaje >= 7 else 'Bajo',
+        'puntaje_prediccion': puntaje,
+        'datos_formulario': FORMULARIOS[0] if datos is None else datos,
+        'recomendaciones': [{'titulo': 'Descansa', 'descripcion': f'Nivel {puntaje}'}],
+        'factores_riesgo': [{'factor': 'Uso diario', 'valor': '5 horas', 'impacto': 'Alto'}],
+        'version_modelo': 'v-prueba',
+    }
+
+
+def test_vector_compilado_igual_a_dataframe():
+    """El esquema compilado produce exactamente el mismo vector que pandas"""
+    predictor = ProcrastinationPredictor()
+
+    for datos, cuenta in _casos():
+        referencia = predictor.preparar_datos_formulario(datos, cuenta)
+        referencia = referencia.to_numpy(dtype=np.float64)[0]
+        compilado = predictor.preparar_vector(datos, cuenta)
+
+        assert compilado.dtype == np.float64
+        assert np.array_equal(referencia, compilado), (datos, cuenta)
+
+
+def test_lote_compilado_igual_a_dataframe():
+    """preparar_lote da la misma matriz en ambos modos"""
+    compilado = ProcrastinationPredictor()
+    referencia = ProcrastinationPredictor(modo_features=MODO_DATAFRAME)
+
+    datos, cuentas = zip(*_casos())
+    assert np.array_equal(
+        compilado.preparar_lote(list(datos), list(cuentas)),
+        referencia.preparar_lote(list(datos), list(cuentas))
+    )
+
+
+def test_predecir_lote_igual_a_predecir():
+    """predecir_lote devuelve, en orden, lo mismo que predecir fila por fila"""
+    predictor = ProcrastinationPredictor(tamano_cache=0)
+    datos, cuentas = zip(*_casos())
+
+    referencia = [predictor.predecir(d, c) for d, c in zip(datos, cuentas)]
+    assert predictor.predecir_lote(list(datos), list(cuentas)) == referencia
+    assert predictor.predecir_lote(list(datos)) == [predictor.predecir(d) for d in datos]
+    assert predictor.predecir_lote([]) == []
+
+    # Con cache, un lote con filas ya vistas mezcla aciertos y filas nuevas
+    con_cache = ProcrastinationPredictor(tamano_cache=64)
+    con_cache.predecir_lote(list(datos[:4]), list(cuentas[:4]))
+    assert con_cache.predecir_lote(list(datos), list(cuentas)) == referencia
+    assert con_cache.estadisticas_cache()['aciertos'] == 4
+
+
+def test_bosque_plano_igual_a_sklearn():
+    """El motor aplanado reproduce RandomForestRegressor.predict"""
+    from sklearn.ensemble import RandomForestRegressor
+
+    rng = np.random.default_rng(42)
+    X = rng.uniform(0, 10, size=(400, 6))
+    y = X[:, 0] * 0.5 + np.sin(X[:, 1]) + rng.normal(0, 0.1, 400)
+
+    modelo = RandomForestRegressor(n_estimators=15, max_depth=8, random_state=42)
+    modelo.fit(X, y)
+    bosque = BosquePlano(**aplanar_bosque(modelo))
+
+    X_prueba = rng.uniform(-1, 11, size=(300, 6))
+    X_prueba[:50] = np.round(X_prueba[:50], 1)  # valores sobre los umbrales
+    X_prueba[0, 2] = np.nan
+
+    assert np.allclose(bosque.predict(X_prueba), modelo.predict(X_prueba), rtol=0, atol=1e-9)
+    assert np.allclose(bosque.predict(X_prueba[3]), modelo.predict(X_prueba[3:4]), rtol=0, atol=1e-9)
+
+    # El formato .npy abierto con mmap da exactamente lo mismo
+    with tempfile.TemporaryDirectory() as directorio:
+        guardar_bosque_mmap(modelo, directorio)
+        mapeado = BosquePlano.cargar_mmap(directorio)
+        assert np.array_equal(mapeado.predict(X_prueba), bosque.predict(X_prueba))
+        del mapeado
+
+
+def test_cache_lru_desaloja_y_expira():
+    """La cache respeta el tamano maximo, el TTL y la invalidacion"""
+    cache = CacheLRU(tamano_maximo=2, ttl=60)
+    cache.guardar('a', 1)
+    cache.guardar('b', 2)
+    assert cache.obtener('a') == 1      # 'a' pasa a ser la mas reciente
+    cache.guardar('c', 3)               # desaloja 'b'
+    assert cache.obtener('b') is None
+    assert cache.obtener('c') == 3
+
+    cache.limpiar()
+    assert cache.obtener('a') is None
+
+    expirada = CacheLRU(tamano_maximo=2, ttl=0.01)
+    expirada.guardar('a', 1)
+    time.sleep(0.02)
+    assert expirada.obtener('a') is None
+
+    estadisticas = cache.estadisticas()
+    assert estadisticas['desalojos'] == 1
+    assert estadisticas['aciertos'] == 2
+    assert estadisticas['invalidaciones'] == 1
+    assert expirada.estadisticas()['expirados'] == 1
+
+
+def test_resultados_de_cache_independientes():
+    """Modificar un resultado devuelto no cambia lo que reciben las siguientes llamadas"""
+    predictor = ProcrastinationPredictor(tamano_cache=16)
+    datos = dict(FORMULARIOS[0], daily_usage='7', checks_per_day='150')
+    original = predictor.predecir(datos)
+    assert original['recomendaciones'] and original['factores_riesgo']
+
+    for resultado in (predictor.predecir(datos), predictor.predecir_lote([datos])[0]):
+        resultado['recomendaciones'][0]['mensaje'] = 'modificado'
+        resultado['recomendaciones'].append({'titulo': 'extra'})
+        resultado['factores_riesgo'][0]['valor'] = 'modificado'
+        resultado['factores_riesgo'].clear()
+    assert predictor.estadisticas_cache()['aciertos'] == 2
+
+    assert predictor.predecir(datos) == original
+    assert predictor.predecir_lote([datos]) == [original]
+
+
+def test_micro_lotes_igual_a_predecir():
+    """Los hilos reciben de los micro-lotes el mismo resultado que con predecir"""
+    predictor = ProcrastinationPredictor(tamano_cache=0)
+    agrupador = MicroLoteador(predictor, ventana=0.005, tamano_maximo=8)
+
+    casos = list(_casos()) * 3
+    referencia = [predictor.predecir(datos, cuenta) for datos, cuenta in casos]
+    obtenidos = [None] * len(casos)
+
+    def trabajar(i):
+        obtenidos[i] = agrupador.predecir(*casos[i])
+
+    hilos = [threading.Thread(target=trabajar, args=(i,)) for i in range(len(casos))]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+    assert obtenidos == referencia
+    metricas = agrupador.metricas()
+    assert metricas['solicitudes'] == len(casos)
+    assert metricas['lotes'] < len(casos)
+    assert metricas['tamano_lote']['maximo'] <= 8
+
+
+def test_reglas_lote_igual_a_fila():
+    # Valores justo en los umbrales de las reglas y a cada lado
+    rng = np.random.default_rng(0)
+    umbrales = ['0', '0.5', '0.6', '1', '1.5', '2', '2.5', '3', '3.5', '4', '4.5', '6', '6.5', '7', '8']
+    formularios = [
+        {clave: str(rng.choice(umbrales)) for clave in
+         ('daily_usage', 'time_social_media', 'sleephours', 'screen_before_bed', 'exercise', 'time_gaming')}
+        | {'checks_per_day': str(rng.choice([50, 100, 101]))}
+        for _ in range(300)
+    ] + [{}]
+    predicciones = [float(p) for p in rng.choice([1.0, 7.99, 8.0, 10.0], size=len(formularios))]
+
+    entradas = [extraer_entradas(datos) for datos in formularios]
+    recomendaciones = RECOMENDACIONES.evaluar_lote(entradas, predicciones)
+    factores = FACTORES_RIESGO.evaluar_lote(entradas)
+    for e, p, r, f in zip(entradas, predicciones, recomendaciones, factores):
+        assert r == RECOMENDACIONES.evaluar_fila(e, p)
+        assert f == FACTORES_RIESGO.evaluar_fila(e)
+        assert 1 <= len(r) <= 5
+
+    # Grupos excluyentes: con 6.5 horas de uso solo aplica la regla critica
+    titulos = [m['titulo'] for m in RECOMENDACIONES.evaluar_fila(extraer_entradas({'daily_usage': '6.5'}), 8.0)]
+    assert titulos == ['Reduce el tiempo de uso del celular', 'Aumenta la actividad fisica',
+                       'Busca apoyo profesional', 'Implementa la tecnica Pomodoro']
+    assert FACTORES_RIESGO.evaluar_fila(extraer_entradas({'checks_per_day': '101', 'time_gaming': '2.25'})) == [
+        {'factor': 'Revisar celular frecuentemente', 'valor': '101 veces/dia', 'impacto': 'Medio'},
+        {'factor': 'Tiempo en videojuegos', 'valor': '2.2 horas/dia', 'impacto': 'Medio'},
+    ]
+
+
+def _recomendaciones_originales(datos, prediccion):
+    """ProcrastinationPredictor.generar_recomendaciones antes de reglas.py (cadena de if)"""
+    recomendaciones = []
+
+    horas_uso = float(datos.get('daily_usage', 0))
+    if horas_uso > 6:
+        recomendaciones.append({
+            'tipo': 'critico',
+            'titulo': 'Reduce el tiempo de uso del celular',
+            'mensaje': f'Usas {horas_uso} horas diarias. Intenta reducir a 4-5 horas estableciendo limites en las apps.'
+        })
+    elif horas_uso > 4:
+        recomendaciones.append({
+            'tipo': 'advertencia',
+            'titulo': 'Controla tu tiempo en el celular',
+            'mensaje': f'Usas {horas_uso} horas diarias. Considera establecer tiempos especificos para usar el celular.'
+        })
+
+    tiempo_redes = float(datos.get('time_social_media', 0))
+    if tiempo_redes > 3:
+        recomendaciones.append({
+            'tipo': 'critico',
+            'titulo': 'Limita el tiempo en redes sociales',
+            'mensaje': f'Pasas {tiempo_redes:.1f} horas en redes sociales. Usa temporizadores de apps para limitarlo a 1-1.5 horas.'
+        })
+    elif tiempo_redes > 2:
+        recomendaciones.append({
+            'tipo': 'advertencia',
+            'titulo': 'Reduce tiempo en redes sociales',
+            'mensaje': f'Pasas {tiempo_redes:.1f} horas en redes sociales. Considera reducirlo gradualmente.'
+        })
+
+    horas_sueno = float(datos.get('sleephours', 7))
+    if horas_sueno < 7:
+        recomendaciones.append({
+            'tipo': 'advertencia',
+            'titulo': 'Mejora tus habitos de sueno',
+            'mensaje': f'Duermes {horas_sueno} horas. Intenta dormir 7-9 horas y evita el celular 1 hora antes de dormir.'
+        })
+
+    pantalla_dormir = float(datos.get('screen_before_bed', 0))
+    if pantalla_dormir > 1:
+        recomendaciones.append({
+            'tipo': 'advertencia',
+            'titulo': 'Evita pantallas antes de dormir',
+            'mensaje': f'Usas el celular {pantalla_dormir:.1f} horas antes de dormir. Intenta reducirlo a menos de 0.5 horas (30 minutos).'
+        })
+    elif pantalla_dormir > 0.5:
+        recomendaciones.append({
+            'tipo': 'consejo',
+            'titulo': 'Reduce pantallas antes de dormir',
+            'mensaje': 'Intenta usar el celular menos de 30 minutos antes de acostarte para mejorar la calidad del sueno.'
+        })
+
+    ejercicio = float(datos.get('exercise', 0))
+    if ejercicio < 2:
+        recomendaciones.append({
+            'tipo': 'consejo',
+            'titulo': 'Aumenta la actividad fisica',
+            'mensaje': 'Haz al menos 3-4 horas de ejercicio a la semana para reducir el estres y mejorar el enfoque.'
+        })
+
+    if prediccion >= 8:
+        recomendaciones.append({
+            'tipo': 'critico',
+            'titulo': 'Busca apoyo profesional',
+            'mensaje': 'Considera hablar con un orientador o psicologo sobre tus habitos digitales.'
+        })
+
+    recomendaciones.append({
+        'tipo': 'consejo',
+        'titulo': 'Implementa la tecnica Pomodoro',
+        'mensaje': 'Estudia 25 minutos sin distracciones, descansa 5 minutos. Repite 4 veces y toma un descanso largo.'
+    })
+
+    return recomendaciones[:5]
+
+
+def _factores_originales(datos):
+    """ProcrastinationPredictor.identificar_factores_riesgo antes de reglas.py (cadena de if)"""
+    factores = []
+
+    horas_uso = float(datos.get('daily_usage', 0))
+    tiempo_redes = float(datos.get('time_social_media', 0))
+    tiempo_juegos = float(datos.get('time_gaming', 0))
+    revisiones = int(datos.get('checks_per_day', 0))
+
+    if horas_uso > 6:
+        factores.append({'factor': 'Uso excesivo del celular', 'valor': f'{horas_uso} horas/dia', 'impacto': 'Alto'})
+    if tiempo_redes > 3:
+        factores.append({'factor': 'Tiempo elevado en redes sociales', 'valor': f'{tiempo_redes:.1f} horas/dia',
+                         'impacto': 'Alto'})
+    if revisiones > 100:
+        factores.append({'factor': 'Revisar celular frecuentemente', 'valor': f'{revisiones} veces/dia',
+                         'impacto': 'Medio'})
+    if tiempo_juegos > 2:
+        factores.append({'factor': 'Tiempo en videojuegos', 'valor': f'{tiempo_juegos:.1f} horas/dia',
+                         'impacto': 'Medio'})
+
+    return factores
+
+
+def test_reglas_igual_a_if_original():
+    """Las tablas de reglas dan el mismo texto que la cadena de if original, en cualquier orden"""
+    rng = np.random.default_rng(1)
+    valores = ['-0', '0', '-0.0', '0.0', '-1', '0.5', '0.50000001', '1', '2', '2.0', '3', '4', '6',
+               '6.0', '6.000001', '7', '6.99', '1e-300', '-1e-300', 'inf', '-inf', 'nan']
+    claves = ('daily_usage', 'time_social_media', 'sleephours', 'screen_before_bed', 'exercise', 'time_gaming')
+    formularios = [{clave: valor} for clave in claves for valor in valores]
+    formularios += [{'checks_per_day': valor} for valor in ('-0', '0', '100', '101')]
+    formularios += [
+        {clave: str(rng.choice(valores)) for clave in claves}
+        | {'checks_per_day': str(rng.choice(['-0', '100', '101']))}
+        for _ in range(300)
+    ]
+    predicciones = [float(p) for p in rng.choice([1.0, 7.99, 8.0, 10.0], size=len(formularios))]
+
+    # El orden en que se formatean 0.0 y -0.0 no cambia el texto de ninguno
+    for orden in (1, -1):
+        casos = list(zip(formularios, predicciones))[::orden]
+        entradas = [extraer_entradas(datos) for datos, _ in casos]
+        recomendaciones = RECOMENDACIONES.evaluar_lote(entradas, [p for _, p in casos])
+        factores = FACTORES_RIESGO.evaluar_lote(entradas)
+        for (datos, p), e, r, f in zip(casos, entradas, recomendaciones, factores):
+            esperadas = _recomendaciones_originales(datos, p)
+            assert RECOMENDACIONES.evaluar_fila(e, p) == esperadas == r, datos
+            assert FACTORES_RIESGO.evaluar_fila(e) == _factores_originales(datos) == f, datos
+
+
+def test_pool_una_conexion_por_contexto():
+    """Cada contexto de aplicacion toma una conexion del pool y la devuelve al cerrarse"""
+    db.inicializar_esquema()
+    en_uso, prestamos = db.pool.en_uso, db.pool.prestamos
+
+    with app.app_context():
+        db.fetch_query("SELECT 1")
+        db.execute_query("SELECT 1")
+        with db.conexion() as primera, db.conexion() as segunda:
+            assert primera is segunda
+        assert db.pool.en_uso == en_uso + 1
+    assert db.pool.en_uso == en_uso
+    assert db.pool.prestamos == prestamos + 1
+
+    # Fuera de Flask la conexion se presta solo durante cada consulta
+    db.fetch_query("SELECT 1")
+    db.fetch_query("SELECT 1")
+    assert db.pool.en_uso == en_uso
+    assert db.pool.prestamos == prestamos + 3
+
+    # Pool lleno: se espera `timeout` y se lanza PoolAgotadoError
+    pool = PoolConexiones(db.connect, tamano=1, timeout=0.01)
+    conexion = pool.obtener()
+    try:
+        pool.obtener()
+        assert False, "se esperaba PoolAgotadoError"
+    except PoolAgotadoError:
+        pass
+
+    # Al devolverla se deshace la transaccion abierta y la conexion se reutiliza
+    conexion.execute("BEGIN")
+    pool.devolver(conexion)
+    assert not conexion.in_transaction
+    assert pool.obtener() is conexion
+    assert pool.creadas == 1 and pool.agotados == 1
+    pool.devolver(conexion)
+    pool.cerrar()
+
+
+def test_perfiles_sqlite_aplicados():
+    """Las conexiones llevan los PRAGMAs del perfil elegido con DATABASE_PROFILE"""
+    esperados = {
+        'basico': {'journal_mode': 'delete', 'synchronous': 2, 'temp_store': 0, 'foreign_keys': 1},
+        'rendimiento': {'journal_mode': 'wal', 'synchronous': 1, 'cache_size': -20000,
+                        'mmap_size': 268435456, 'temp_store': 2, 'busy_timeout': 5000, 'foreign_keys': 1},
+        'seguro': {'journal_mode': 'wal', 'synchronous': 2, 'temp_store': 2, 'busy_timeout': 5000,
+                   'foreign_keys': 1},
+    }
+    directorio = tempfile.mkdtemp()
+    entorno = {clave: os.environ.get(clave) for clave in ('DATABASE_URL', 'DATABASE_PROFILE')}
+    try:
+        for perfil, valores in esperados.items():
+            os.environ['DATABASE_URL'] = os.path.join(directorio, f'{perfil}.db')
+            os.environ['DATABASE_PROFILE'] = perfil
+            base = Database()
+            activos = base.configuracion_activa()
+            base.disconnect()
+            assert {clave: activos[clave] for clave in valores} == valores, perfil
+
+        os.environ['DATABASE_PROFILE'] = 'inexistente'
+        try:
+            Database()
+            assert False, "se esperaba ValueError"
+        except ValueError:
+            pass
+    finally:
+        for clave, valor in entorno.items():
+            if valor is None:
+                os.environ.pop(clave, None)
+            else:
+                os.environ[clave] = valor
+
+
+def test_guardar_lote_ids_y_estadisticas():
+    """guardar_lote devuelve los IDs reales en orden y actualiza estadisticas_usuario"""
+    from app.models import Resultado
+
+    usuarios = [_crear_usuario(), _crear_usuario()]
+    puntajes = [2.5, 8.0, 4.25, 9.5, 1.0, 6.75, 3.0]
+    resultados = [_resultado(usuarios[i % 2], p) for i, p in enumerate(puntajes)]
+
+    # tamano_lote menor que el total: los IDs salen de varios last_insert_rowid()
+    ids = Resultado.guardar_lote(resultados, tamano_lote=3)
+    assert len(ids) == len(puntajes) and ids == sorted(set(ids))
+    filas = db.fetch_query(
+        f"SELECT id, usuario_id, puntaje_prediccion FROM resultados WHERE id IN ({','.join('?' * len(ids))}) ORDER BY id",
+        tuple(ids)
+    )
+    assert [(f['id'], f['usuario_id'], f['puntaje_prediccion']) for f in filas] == [
+        (i, r['usuario_id'], r['puntaje_prediccion']) for i, r in zip(ids, resultados)
+    ]
+
+    for usuario_id in usuarios:
+        propios = [r['puntaje_prediccion'] for r in resultados if r['usuario_id'] == usuario_id]
+        estadisticas = Resultado.obtener_estadisticas_usuario(usuario_id)
+        assert estadisticas['total_evaluaciones'] == len(propios)
+        assert estadisticas['promedio_puntaje'] == sum(propios) / len(propios)
+        assert estadisticas['puntaje_minimo'] == min(propios)
+        assert estadisticas['puntaje_maximo'] == max(propios)
+
+    # Una fila invalida (usuario inexistente) deshace todo el lote
+    total = db.fetch_query("SELECT COUNT(*) AS n FROM resultados")[0]['n']
+    assert Resultado.guardar_lote([_resultado(usuarios[0], 5.0), _resultado(-1, 5.0)]) is None
+    assert db.fetch_query("SELECT COUNT(*) AS n FROM resultados")[0]['n'] == total
+    assert Resultado.guardar_lote([]) == []
+
+
+def test_migracion_003_ida_y_vuelta():
+    """La migracion 003 convierte el JSON a columnas y la reversion devuelve el mismo JSON"""
+    from app.models import Resultado
+    migracion = _cargar_migracion('003_resultados_compactos.py')
+
+    formularios = [
+        FORMULARIOS[0],
+        # apps_daily como valor suelto, claves fuera del formulario y texto no numerico
+        {'daily_usage': '7', 'apps_daily': '10', 'academic_perf': 'no-numerico',
+         'purpose': 'educación', 'origen': 'importación'},
+        {},
+    ]
+    recomendaciones = [[{'titulo': 'Duerme más', 'descripcion': 'Al menos 7 horas'}],
+                       [{'titulo': 'Duerme más', 'descripcion': 'Al menos 7 horas'},
+                        {'titulo': 'Pausas', 'descripcion': 'Cada 25 minutos'}],
+                       []]
+
+    with _otra_base(str(Path(tempfile.mkdtemp()) / 'json.db')):
+        with db.transaccion() as cursor:
+            cursor.execute(migracion.SQL_CREAR_RESULTADOS_JSON)
+        usuario_id = _crear_usuario()
+        with db.transaccion() as cursor:
+            for datos, mensajes in zip(formularios, recomendaciones):
+                cursor.execute(
+                    "INSERT INTO resultados (usuario_id, nivel_prediccion, puntaje_prediccion, "
+                    "datos_formulario, recomendaciones, factores_riesgo) VALUES (?, 'Bajo', 3.5, ?, ?, '[]')",
+                    (usuario_id, json.dumps(datos), json.dumps(mensajes))
+                )
+        originales = db.fetch_query("SELECT * FROM resultados ORDER BY id")
+
+        assert migracion.ejecutar_migracion()
+        migrados = sorted(Resultado.obtener_por_usuario(usuario_id, limite=10), key=lambda r: r['id'])
+        assert [r['id'] for r in migrados] == [f['id'] for f in originales]
+        assert [r['recomendaciones'] for r in migrados] == recomendaciones
+        assert migrados[0]['datos_formulario']['apps_daily'] == ['whatsapp', 'instagram', 'tiktok']
+        assert migrados[0]['datos_formulario']['daily_usage'] == 5.5
+        assert migrados[1]['datos_formulario'] == {
+            'daily_usage': 7.0, 'apps_daily': '10', 'academic_perf': 'no-numerico',
+            'purpose': 'educación', 'origen': 'importación'
+        }
+        assert migrados[2]['datos_formulario'] == {}
+        formularios_migrados = [r['datos_formulario'] for r in migrados]
+
+        assert migracion.revertir_migracion()
+        revertidos = db.fetch_query("SELECT * FROM resultados ORDER BY id")
+        assert [json.loads(f['datos_formulario']) for f in revertidos] == formularios_migrados
+        assert [json.loads(f['recomendaciones']) for f in revertidos] == recomendaciones
+        assert [f['fecha_creacion'] for f in revertidos] == [f['fecha_creacion'] for f in originales]
+
+        # Ida otra vez en el mismo proceso: el catalogo se vuelve a crear
+        assert migracion.ejecutar_migracion()
+        otra_vez = sorted(Resultado.obtener_por_usuario(usuario_id, limite=10), key=lambda r: r['id'])
+        assert [r['datos_formulario'] for r in otra_vez] == formularios_migrados
+        assert [r['recomendaciones'] for r in otra_vez] == recomendaciones
+        assert db.fetch_query("SELECT COUNT(*) AS n FROM catalogo_mensajes")[0]['n'] == 2
+
+
+def test_proyeccion_y_decodificacion_diferida():
+    """campos= limita las columnas leidas y los campos pesados se decodifican al usarlos"""
+    from datetime import datetime
+    from app.models import Resultado
+
+    usuario_id = _crear_usuario()
+    datos = _resultado(usuario_id, 8.25)
+    resultado_id = Resultado.guardar_resultado(**datos)
+
+    ligero = Resultado.obtener_por_id(resultado_id, usuario_id, campos=['id', 'puntaje_prediccion'])
+    assert dict(ligero) == {'id': resultado_id, 'puntaje_prediccion': 8.25}
+    assert 'recomendaciones' not in ligero and ligero.get('recomendaciones') is None
+    try:
+        ligero['datos_formulario']
+        assert False, "se esperaba KeyError"
+    except KeyError:
+        pass
+
+    completo = Resultado.obtener_por_id(resultado_id, usuario_id)
+    assert 'recomendaciones' in completo and len(completo) == len(Resultado.CAMPOS)
+    assert completo.get('factores_riesgo') == datos['factores_riesgo']
+    # Lo visible de la fila no depende de que campos se usaron antes
+    sin_usar = Resultado.obtener_por_id(resultado_id, usuario_id)
+    assert set(sin_usar.keys()) == set(completo) == set(Resultado.CAMPOS)
+    assert sin_usar == completo and dict(sin_usar) == dict(completo)
+    with app.app_context():
+        serializado = json.loads(app.json.dumps(Resultado.obtener_por_id(resultado_id, usuario_id)))
+    assert set(serializado) == set(Resultado.CAMPOS)
+    assert serializado['recomendaciones'] == datos['recomendaciones']
+    assert completo['datos_formulario']['apps_daily'] == FORMULARIOS[0]['apps_daily']
+    assert completo['datos_formulario']['checks_per_day'] == 120
+    assert isinstance(completo['fecha_creacion'], datetime)
+    assert completo['version_modelo'] == 'v-prueba'
+
+    # Solo el dueño ve el resultado; un campo desconocido es un error
+    assert Resultado.obtener_por_id(resultado_id, usuario_id + 1000) is None
+    try:
+        Resultado.obtener_por_usuario(usuario_id, campos=['clave'])
+        assert False, "se esperaba ValueError"
+    except ValueError:
+        pass
+    filas = Resultado.obtener_por_usuario(usuario_id, campos=('nivel_prediccion',))
+    assert [dict(f) for f in filas] == [{'nivel_prediccion': 'Alto'}]
+
+
+def test_index_incluye_datos_de_las_graficas():
+    """El JSON de las graficas de /index lleva puntaje, fecha y respuestas del formulario"""
+    from app.models import Resultado
+
+    usuario_id = _crear_usuario()
+    formularios = [FORMULARIOS[0], dict(FORMULARIOS[0], daily_usage='2', sleephours='8')]
+    for puntaje, datos in zip((8.25, 3.5), formularios):
+        Resultado.guardar_resultado(**_resultado(usuario_id, puntaje, datos))
+
+    cliente = app.test_client()
+    with cliente.session_transaction() as sesion:
+        sesion.update({'usuario_id': usuario_id, 'nombre': 'Ana', 'correo': 'ana@prueba.com'})
+    respuesta = cliente.get('/index')
+    assert respuesta.status_code == 200
+    pagina = respuesta.get_data(as_text=True)
+    inicio = pagina.index('const resultados = ') + len('const resultados = ')
+    resultados = json.loads(pagina[inicio:pagina.index(';\n', inicio)])
+
+    assert len(resultados) == 2
+    for resultado in resultados:
+        assert {'fecha_creacion', 'puntaje_prediccion', 'datos_formulario'} <= set(resultado)
+        assert {'daily_usage', 'sleephours', 'academic_perf', 'exercise',
+                'time_social_media', 'screen_before_bed'} <= set(resultado['datos_formulario'])
+    assert sorted(r['datos_formulario']['daily_usage'] for r in resultados) == [2.0, 5.5]
+
+
+def test_estadisticas_incrementales_igual_a_reconstruidas():
+    """La suma incremental de estadisticas_usuario coincide con recalcularla desde cero"""
+    from app.models import Resultado
+
+    usuario_id, sin_resultados = _crear_usuario(), _crear_usuario()
+    for puntaje in (4.0, 9.0, 2.5):
+        Resultado.guardar_resultado(**_resultado(usuario_id, puntaje))
+    ids = Resultado.guardar_lote([_resultado(usuario_id, p) for p in (6.0, 3.5)])
+
+    incremental = Resultado.obtener_estadisticas_usuario(usuario_id)
+    assert incremental['total_evaluaciones'] == 5
+    assert incremental['promedio_puntaje'] == 5.0
+    assert (incremental['puntaje_minimo'], incremental['puntaje_maximo']) == (2.5, 9.0)
+    assert incremental['ultimo_puntaje'] == 3.5
+    assert Resultado.obtener_estadisticas_usuario(sin_resultados) == {
+        'total_evaluaciones': 0, 'promedio_puntaje': None, 'puntaje_maximo': None,
+        'puntaje_minimo': None, 'ultimo_puntaje': None, 'ultima_evaluacion': None
+    }
+
+    assert Resultado.reconstruir_estadisticas() >= 1
+    assert Resultado.obtener_estadisticas_usuario(usuario_id) == incremental
+
+    # actualizar_predicciones no toca el resumen: el maximo se corrige al reconstruir
+    Resultado.actualizar_predicciones([{
+        'id': ids[0], 'nivel_prediccion': 'Alto', 'puntaje_prediccion': 9.75,
+        'recomendaciones': [], 'factores_riesgo': [], 'version_modelo': 'v-prueba'
+    }])
+    assert Resultado.obtener_estadisticas_usuario(usuario_id)['puntaje_maximo'] == 9.0
+    Resultado.reconstruir_estadisticas()
+    reconstruidas = Resultado.obtener_estadisticas_usuario(usuario_id)
+    assert reconstruidas['puntaje_maximo'] == 9.75
+    assert reconstruidas['promedio_puntaje'] == 5.75
+
+
+def test_referencias_de_sesion():
+    """cargar_ultimo_resultado y /resultados aceptan solo referencias ['bd'|'memoria', valor]"""
+    from app.models import Resultado
+    from app.routes import cargar_ultimo_resultado, recordar_resultado, resultados_recientes
+
+    predictor = ProcrastinationPredictor(tamano_cache=0)
+    resultado = predictor.predecir(FORMULARIOS[0])
+    usuario_id = _crear_usuario()
+    resultado_id = Resultado.guardar_resultado(
+        usuario_id, resultado['nivel'], resultado['prediccion'], FORMULARIOS[0],
+        resultado['recomendaciones'], resultado['factores_riesgo'], resultado['version_modelo']
+    )
+
+    referencia = recordar_resultado(usuario_id, resultado, resultado_id)
+    assert referencia == ['bd', resultado_id]
+    assert cargar_ultimo_resultado(usuario_id, referencia) == resultado
+
+    # Fuera del almacen (otro proceso o desalojado) se reconstruye desde la base
+    resultados_recientes.limpiar()
+    for forma in (['bd', resultado_id], ('bd', resultado_id)):
+        reconstruido = cargar_ultimo_resultado(usuario_id, forma)
+        for clave in ('prediccion', 'nivel', 'color', 'recomendaciones', 'factores_riesgo', 'version_modelo'):
+            assert reconstruido[clave] == resultado[clave], clave
+    assert cargar_ultimo_resultado(usuario_id + 1000, ['bd', resultado_id]) is None
+
+    # Usuarios de prueba: solo existen en memoria
+    en_memoria = recordar_resultado(0, resultado)
+    assert en_memoria[0] == 'memoria'
+    assert cargar_ultimo_resultado(0, en_memoria) == resultado
+    assert cargar_ultimo_resultado(0, ['memoria', 'otra']) is None
+    resultados_recientes.limpiar()
+    assert cargar_ultimo_resultado(0, en_memoria) is None
+
+    # Cookies anteriores (resultado completo como dict) y formas mal armadas
+    invalidas = [None, {}, {'nivel': 'Alto', 'prediccion': 8.0}, 'bd', ['bd'],
+                 ['bd', resultado_id, 'x'], ['trabajo', 'abc']]
+    for forma in invalidas:
+        assert cargar_ultimo_resultado(usuario_id, forma) is None, forma
+
+    cliente = app.test_client()
+    for forma in invalidas:
+        with cliente.session_transaction() as sesion:
+            sesion['usuario_id'] = usuario_id
+            sesion['ultimo_resultado'] = forma
+        respuesta = cliente.get('/resultados')
+        assert respuesta.status_code == 302 and respuesta.location.endswith('/formulario'), forma
+    with cliente.session_transaction() as sesion:
+        sesion['ultimo_resultado'] = ['bd', resultado_id]
+    assert cliente.get('/resultados').status_code == 200
+
+
+def test_cola_backpressure_y_vencimiento():
+    """La cola rechaza por encima del maximo, entrega cada trabajo una vez y purga los vencidos"""
+    from concurrent.futures import ThreadPoolExecutor
+    from app.cola_predicciones import ColaPredicciones, ColaLlenaError, PENDIENTE, LISTO
+    from app.models import Trabajo
+
+    usuario_id = _crear_usuario()
+    cola = ColaPredicciones(workers=1, maximo_pendientes=2, ttl=0.2)
+    # Hilos en lugar de procesos para controlar cuando termina cada trabajo
+    cola._executor = ThreadPoolExecutor(max_workers=1)
+    bloqueo = threading.Event()
+    cola._executor.submit(bloqueo.wait)
+    try:
+        real = cola.enviar(usuario_id, FORMULARIOS[0])
+        prueba = cola.enviar(0, FORMULARIOS[1])
+        try:
+            cola.enviar(usuario_id, FORMULARIOS[2])
+            assert False, "se esperaba ColaLlenaError"
+        except ColaLlenaError:
+            pass
+        assert cola.metricas()['rechazados'] == 1
+
+        assert cola.obtener(real, usuario_id) == (PENDIENTE, None)
+        assert cola.obtener(real, usuario_id + 1000) == (None, None)
+        assert Trabajo.obtener(real, usuario_id) == {'estado': PENDIENTE, 'resultado_id': None}
+
+        # Otro proceso web solo ve la tabla trabajos: obtiene el resultado_id
+        bloqueo.set()
+        otra = ColaPredicciones()
+        estado, (resultado, resultado_id) = otra.obtener(real, usuario_id, espera=30)
+        assert estado == LISTO and resultado is None
+        assert db.fetch_query("SELECT usuario_id FROM resultados WHERE id = ?", (resultado_id,)) == [
+            {'usuario_id': usuario_id}
+        ]
+        assert Trabajo.obtener(real, usuario_id) is None
+
+        # En el proceso que lo recibio el resultado viene completo, una sola vez
+        tercero = cola.enviar(usuario_id, FORMULARIOS[0])
+        estado, (resultado, resultado_id) = cola.obtener(tercero, usuario_id, espera=30)
+        assert estado == LISTO and resultado['nivel'] and resultado_id is not None
+        assert cola.obtener(tercero, usuario_id) == (None, None)
+
+        # El trabajo del usuario de prueba termino y nadie lo consulto: vence con el TTL
+        assert cola.metricas()['sin_consultar'] == 2
+        time.sleep(0.25)
+        cola.obtener(cola.enviar(0, FORMULARIOS[1]), 0, espera=30)
+        assert cola.obtener(prueba, 0) == (None, None)
+        assert cola.metricas()['completados'] == 4
+    finally:
+        bloqueo.set()
+        cola.cerrar()
+
+    # Filas de trabajos abandonados en la tabla (proceso web caido)
+    Trabajo.crear('viejo', usuario_id, PENDIENTE)
+    Trabajo.crear('nuevo', usuario_id, PENDIENTE)
+    db.execute_query("UPDATE trabajos SET fecha_creacion = datetime('now', '-2 hours') WHERE id = 'viejo'")
+    Trabajo.purgar(3600)
+    assert Trabajo.obtener('viejo', usuario_id) is None
+    assert Trabajo.obtener('nuevo', usuario_id) is not None
+
+
+def test_versiones_y_recarga_del_modelo():
+    """guardar_version/activar_version publican versiones y recargar las cambia o conserva la activa"""
+    import joblib
+    from sklearn.ensemble import RandomForestRegressor
+    import versiones_modelo
+
+    feature_names = joblib.load('ml/models/feature_names.pkl')
+    label_encoders = joblib.load('ml/models/label_encoders.pkl')
+    X = np.random.default_rng(0).uniform(0, 10, size=(50, len(feature_names)))
+
+    def modelo_constante(valor):
+        return RandomForestRegressor(n_estimators=3, random_state=0).fit(X, np.full(len(X), valor))
+
+    rutas = {nombre: getattr(versiones_modelo, nombre)
+             for nombre in ('MODELOS_DIR', 'VERSIONES_DIR', 'PUNTERO_ACTUAL')}
+    modelos = Path(tempfile.mkdtemp())
+    versiones_modelo.MODELOS_DIR = modelos
+    versiones_modelo.VERSIONES_DIR = modelos / 'versiones'
+    versiones_modelo.PUNTERO_ACTUAL = modelos / 'ACTUAL'
+    try:
+        bajo, directorio_bajo = versiones_modelo.guardar_version(
+            modelo_constante(2.0), label_encoders, feature_names, {'r2': 0.5})
+        alto, _ = versiones_modelo.guardar_version(
+            modelo_constante(9.0), label_encoders, feature_names, {'r2': 0.6}, activar=False)
+        assert versiones_modelo.version_activa() == bajo
+        assert versiones_modelo.listar_versiones() == sorted([bajo, alto])
+        manifiesto = versiones_modelo.leer_manifiesto(directorio_bajo)
+        assert manifiesto['hash_modelo'] == versiones_modelo.hash_archivo(directorio_bajo / 'random_forest_model.pkl')
+        assert manifiesto['feature_names'] == list(feature_names)
+
+        predictor = ProcrastinationPredictor(tamano_cache=16)
+        resultado = predictor.predecir(FORMULARIOS[0])
+        assert (resultado['prediccion'], resultado['version_modelo']) == (2.0, bajo)
+
+        versiones_modelo.activar_version(alto)
+        assert predictor.recargar()
+        resultado = predictor.predecir(FORMULARIOS[0])
+        assert (resultado['prediccion'], resultado['version_modelo']) == (9.0, alto)
+        assert predictor.info_modelo()['manifiesto']['metricas'] == {'r2': 0.6}
+
+        # Una version inexistente o incompleta no reemplaza a la activa
+        try:
+            versiones_modelo.activar_version('no-existe')
+            assert False, "se esperaba ValueError"
+        except ValueError:
+            pass
+        assert versiones_modelo.version_activa() == alto
+        incompleta = versiones_modelo.VERSIONES_DIR / 'incompleta'
+        incompleta.mkdir()
+        assert not predictor.recargar(incompleta)
+        assert predictor.predecir(FORMULARIOS[0])['version_modelo'] == alto
+
+        # Volver a la version anterior
+        versiones_modelo.activar_version(bajo)
+        assert predictor.recargar()
+        assert predictor.predecir(FORMULARIOS[0])['prediccion'] == 2.0
+    finally:
+        for nombre, ruta in rutas.items():
+            setattr(versiones_modelo, nombre, ruta)
+
+
+def test_reentrenamiento_etiquetas_y_punto_control():
+    """Solo se leen resultados con etiqueta observada y el punto de control avanza al activar"""
+    import reentrenar
+    from app.models import Resultado
+
+    predictor = ProcrastinationPredictor()
+    artefactos = predictor.cargar_artefactos()
+    punto_control_original = reentrenar.PUNTO_CONTROL
+    reentrenar.PUNTO_CONTROL = Path(tempfile.mkdtemp()) / 'reentrenamiento.json'
+    try:
+        with _otra_base(str(Path(tempfile.mkdtemp()) / 'etiquetas.db')):
+            usuario_id = _crear_usuario()
+            ids = Resultado.guardar_lote([_resultado(usuario_id, p, datos)
+                                          for p, datos in zip((3.0, 6.0, 8.0, 5.0), FORMULARIOS * 4)])
+
+            # Sin la columna de etiqueta no se lee nada
+            try:
+                Resultado.obtener_para_entrenamiento(0, 10, 'puntaje_observado')
+                assert False, "se esperaba ValueError"
+            except ValueError:
+                pass
+
+            db.execute_query("ALTER TABLE resultados ADD COLUMN puntaje_observado REAL")
+            for resultado_id, observado in ((ids[0], 4.0), (ids[2], 7.5)):
+                db.execute_query("UPDATE resultados SET puntaje_observado = ? WHERE id = ?",
+                                 (observado, resultado_id))
+
+            tiempos = {'lectura': 0.0, 'conversion': 0.0}
+            punto_control = reentrenar.leer_punto_control()
+            assert punto_control == {'ultimo_id': 0, 'historial': []}
+            X, y, ultimo_id, descartadas = reentrenar.leer_nuevos(
+                predictor, artefactos, punto_control['ultimo_id'], 1, 'puntaje_observado', tiempos)
+            # Las etiquetas son las observadas, no el puntaje del modelo
+            assert y.tolist() == [4.0, 7.5] and ultimo_id == ids[2] and descartadas == 0
+            assert X.shape == (2, len(artefactos.feature_names)) and X.dtype == np.float32
+
+            # Version sin activar: el punto de control no se mueve
+            reentrenar.registrar_reentrenamiento(punto_control, {'version': 'a', 'activada': False}, ultimo_id)
+            reentrenar.guardar_punto_control(punto_control)
+            punto_control = reentrenar.leer_punto_control()
+            assert punto_control['ultimo_id'] == 0 and len(punto_control['historial']) == 1
+
+            # Version activada: avanza y los mismos resultados no se vuelven a leer
+            reentrenar.registrar_reentrenamiento(punto_control, {'version': 'b', 'activada': True}, ultimo_id)
+            reentrenar.guardar_punto_control(punto_control)
+            punto_control = reentrenar.leer_punto_control()
+            assert punto_control['ultimo_id'] == ids[2]
+            assert [r['version'] for r in punto_control['historial']] == ['a', 'b']
+            X, y, ultimo_id, _ = reentrenar.leer_nuevos(
+                predictor, artefactos, punto_control['ultimo_id'], 1, 'puntaje_observado', tiempos)
+            assert len(X) == 0 and ultimo_id == ids[2]
+
+            db.execute_query("UPDATE resultados SET puntaje_observado = 6.5 WHERE id = ?", (ids[3],))
+            _, y, ultimo_id, _ = reentrenar.leer_nuevos(
+                predictor, artefactos, punto_control['ultimo_id'], 1, 'puntaje_observado', tiempos)
+            assert y.tolist() == [6.5] and ultimo_id == ids[3]
+    finally:
+        reentrenar.PUNTO_CONTROL = punto_control_original
+
+
+def test_puntuar_lote_reanuda_en_orden():
+    """leer_csv(desde=...) retoma tras el ultimo bloque escrito y la salida queda en orden de entrada"""
+    import csv
+    from itertools import islice
+    import puntuar_lote
+
+    directorio = Path(tempfile.mkdtemp())
+    entrada = directorio / 'encuestas.csv'
+    filas = [{'daily_usage': str(horas), 'sleephours': '6', 'apps_daily': 'whatsapp,tiktok',
+              'edad': '16' if horas % 2 else ''} for horas in range(1, 8)]
+    with open(entrada, 'w', newline='', encoding='utf-8') as f:
+        escritor = csv.DictWriter(f, fieldnames=['daily_usage', 'sleephours', 'apps_daily', 'edad'])
+        escritor.writeheader()
+        escritor.writerows(filas)
+
+    bloques = list(puntuar_lote.leer_csv(entrada, 3))
+    assert [offset for offset, _ in bloques] == [3, 6, 7]
+    assert [ref for _, bloque in bloques for ref, _, _ in bloque] == list(range(1, 8))
+    assert [ref for _, bloque in puntuar_lote.leer_csv(entrada, 3, desde=4) for ref, _, _ in bloque] == [5, 6, 7]
+    assert list(puntuar_lote.leer_csv(entrada, 3, desde=7)) == []
+
+    # Una primera corrida que se detiene tras el primer bloque
+    salida = directorio / 'puntajes.ndjson'
+    progreso = directorio / 'puntajes.ndjson.progreso'
+    escritor = puntuar_lote.EscritorNDJSON(salida, continuar=False)
+    estado = puntuar_lote.procesar(islice(puntuar_lote.leer_csv(entrada, 3), 1), escritor, 0, progreso)
+    escritor.cerrar()
+    assert estado['offset'] == 3 and puntuar_lote.leer_progreso(progreso) == 3
+
+    # Se reanuda en un pool con varios bloques en vuelo
+    desde = puntuar_lote.leer_progreso(progreso)
+    escritor = puntuar_lote.EscritorNDJSON(salida, continuar=True)
+    estado = puntuar_lote.procesar(puntuar_lote.leer_csv(entrada, 1, desde), escritor, 1, progreso)
+    escritor.cerrar()
+    assert (estado['filas'], estado['errores'], estado['offset']) == (4, 0, 7)
+    assert puntuar_lote.leer_progreso(progreso) == 7
+
+    with open(salida, encoding='utf-8') as f:
+        lineas = [json.loads(linea) for linea in f]
+    assert [linea['referencia'] for linea in lineas] == list(range(1, 8))
+    predictor = ProcrastinationPredictor()
+    for linea, fila in zip(lineas, filas):
+        esperado = predictor.predecir(*puntuar_lote.formulario_desde_csv(fila))
+        assert linea['prediccion'] == esperado['prediccion'], linea['referencia']
+
+
+def test_trazas_y_histograma_deslizante():
+    predictor = ProcrastinationPredictor(tamano_cache=0)
+    predictor.asegurar_cargado()
+    predictor.trazas = trazas
+
+    # Sin traza activa los tramos no anotan nada
+    predictor.predecir(FORMULARIOS[0])
+    assert trazas.actual() is None
+
+    traza = trazas.iniciar()
+    try:
+        predictor.predecir(FORMULARIOS[0])
+        with trazas.tramo('db'):
+            with trazas.tramo('db'):
+                pass
+        # Cada execute del cursor de Database es una consulta
+        db.fetch_query("SELECT 1")
+        with db.transaccion() as cursor:
+            cursor.execute("SELECT 1")
+    finally:
+        assert trazas.terminar() is traza
+    assert traza.conteos == {'prediccion': 1, 'modelo': 1, 'db': 4}
+    assert traza.tiempos['modelo'] <= traza.tiempos['prediccion']
+
+    # Con micro-lotes el modelo corre en el hilo de fondo y su tiempo vuelve
+    # a la traza de la petición que esperaba el lote
+    agrupador = MicroLoteador(predictor, ventana=0.001)
+    traza = trazas.iniciar()
+    try:
+        agrupador.predecir(FORMULARIOS[0])
+    finally:
+        trazas.terminar()
+    assert traza.conteos == {'prediccion': 1, 'modelo': 1}
+    assert 0 < traza.tiempos['modelo'] <= traza.tiempos['prediccion']
+
+    # Ventana de 6 s en 3 partes: las observaciones viejas salen del resumen
+    reloj = [0.0]
+    histograma = HistogramaDeslizante([1, 2, 5], ventana=6, partes=3, reloj=lambda: reloj[0])
+    for valor in (1, 1, 3):
+        histograma.observar(valor)
+    reloj[0] = 2.5
+    histograma.observar(5)
+    assert histograma.resumen()['total'] == 4 and histograma.percentil(50) == 1
+    reloj[0] = 6.1
+    assert histograma.resumen()['total'] == 1 and histograma.percentil(50) == 5
+
+
+if __name__ == '__main__':
+    print("=" * 60)
+    print("PRUEBAS DEL PREDICTOR")
+    print("=" * 60)
+
+    for prueba in [test_vector_compilado_igual_a_dataframe,
+                   test_lote_compilado_igual_a_dataframe,
+                   test_predecir_lote_igual_a_predecir,
+                   test_bosque_plano_igual_a_sklearn,
+                   test_cache_lru_desaloja_y_expira,
+                   test_resultados_de_cache_independientes,
+                   test_micro_lotes_igual_a_predecir,
+                   test_reglas_lote_igual_a_fila,
+                   test_reglas_igual_a_if_original,
+                   test_pool_una_conexion_por_contexto,
+                   test_perfiles_sqlite_aplicados,
+                   test_guardar_lote_ids_y_estadisticas,
+                   test_migracion_003_ida_y_vuelta,
+                   test_proyeccion_y_decodificacion_diferida,
+                   test_index_incluye_datos_de_las_graficas,
+                   test_estadisticas_incrementales_igual_a_reconstruidas,
+                   test_referencias_de_sesion,
+                   test_cola_backpressure_y_vencimiento,
+                   test_versiones_y_recarga_del_modelo,
+                   test_reentrenamiento_etiquetas_y_punto_control,
+                   test_puntuar_lote_reanuda_en_orden,
+                   test_trazas_y_histograma_deslizante]:
+        try:
+            prueba()
+            print(f"✓ {prueba.__name__}")
+        except AssertionError as e:
+            print(f"✗ {prueba.__name__}: {e}")